@@ -0,0 +1,384 @@
+import argparse
+import math
+from itertools import combinations
+
+import numpy as np
+
+from protocol import zone_bounds
+from simulator import REJECTION_POLICIES
+from workload import UniformDistribution
+
+
+# Sub-states of a zone, in the order they are processed at each capacity level
+# (same-level transitions only ever go to a later sub-state):
+#   BOTH_UNSENT   - both zone parties active, neither has sent
+#   FIRST_SENT    - both active, only one (X) has sent; Y's capacity is one higher
+#   Y_ONLY        - X dropped out before Y sent; Y active alone
+#   ALONE_UNSENT  - one party active, its partner never sends (free pads = c + d + 1)
+#   BOTH_SENT     - both active and both have sent (free pads = c + d)
+#   ALONE_SENT    - one party active, its partner has sent (free pads = c + d)
+BOTH_UNSENT, FIRST_SENT, Y_ONLY, ALONE_UNSENT, BOTH_SENT, ALONE_SENT = range(6)
+NUM_STATES = 6
+
+# Above this many bulk levels the bulk is crossed with a matrix power instead of level by level
+MATRIX_POWER_THRESHOLD = 4096
+
+
+class _ZoneChain:
+    """
+    Exact Markov chain of one zone's common capacity under a rejection policy.
+    
+    Capacities only shrink, so the chain is solved level by level from the
+    starting capacity down to 0, pushing probability mass from each level to
+    the levels a message can reach. Only the levels at most max length below
+    the current one can hold pending mass, so the state is a window of
+    NUM_STATES x (high + 1) masses.
+    """
+    
+    def __init__(self, distribution, d, policy):
+        self.low = distribution.low
+        self.high = distribution.high
+        self.probabilities = distribution.probabilities
+        self.cdf = np.cumsum(distribution.probabilities)
+        self.d = d
+        self.policy = policy
+        self.width = self.high + 1
+    
+    def _move(self, window, c, capacity, mass, target, reject, terminal):
+        """
+        One send attempt by a party with the given capacity (>= low) at level c.
+        
+        Accepted lengths move mass to `target` at level capacity - L. A length
+        that does not fit is redrawn (retry), sends everything left (truncate,
+        to level 0) or goes to `reject` (drop): ('state', s) at the same level,
+        or ('stop', free_pads).
+        
+        Returns:
+            Expected number of messages sent
+        """
+        top = min(self.high, capacity)
+        probs = self.probabilities[:top - self.low + 1]
+        accepted = self.cdf[top - self.low]
+        scale = 1 / accepted if self.policy == 'retry' else 1.0
+        
+        base = c - capacity
+        window[target, base + self.low:base + top + 1] += (mass * scale) * probs
+        sends = mass * accepted * scale
+        
+        overflow = mass * (1 - accepted)
+        if self.policy != 'retry' and top < self.high and overflow > 0:
+            if self.policy == 'truncate':
+                window[target, c] += overflow
+                sends += overflow
+            else:
+                kind, value = reject
+                if kind == 'state':
+                    window[value, 0] += overflow
+                else:
+                    terminal[value] = terminal.get(value, 0.0) + overflow
+        return sends
+    
+    def process_level(self, window, c, terminal):
+        """
+        Resolve all mass at level c (window[:, 0]), adding finished executions to terminal.
+        
+        Returns:
+            Expected number of messages sent from this level
+        """
+        low, d = self.low, self.d
+        sends = 0.0
+        
+        def stop(free_pads, mass):
+            terminal[free_pads] = terminal.get(free_pads, 0.0) + mass
+        
+        mass = window[BOTH_UNSENT, 0]
+        if mass > 0:
+            if c < low:
+                stop(c + d + 1, mass)
+            else:
+                # Whoever sends first becomes X
+                sends += self._move(window, c, c, mass, FIRST_SENT, ('state', ALONE_UNSENT), terminal)
+        
+        mass = window[FIRST_SENT, 0]
+        if mass > 0:
+            half = mass / 2
+            # X chosen: capacity c; dropping out leaves Y alone
+            if c < low:
+                window[Y_ONLY, 0] += half
+            else:
+                sends += self._move(window, c, c, half, FIRST_SENT, ('state', Y_ONLY), terminal)
+            # Y chosen: capacity c + 1; its first send makes the capacity common
+            if c + 1 < low:
+                window[ALONE_UNSENT, 0] += half
+            else:
+                sends += self._move(window, c, c + 1, half, BOTH_SENT, ('state', ALONE_UNSENT), terminal)
+        
+        mass = window[Y_ONLY, 0]
+        if mass > 0:
+            if c + 1 < low:
+                stop(c + d + 1, mass)
+            else:
+                sends += self._move(window, c, c + 1, mass, ALONE_SENT, ('stop', c + d + 1), terminal)
+        
+        mass = window[ALONE_UNSENT, 0]
+        if mass > 0:
+            if c < low:
+                stop(c + d + 1, mass)
+            else:
+                sends += self._move(window, c, c, mass, ALONE_UNSENT, ('stop', c + d + 1), terminal)
+        
+        mass = window[BOTH_SENT, 0]
+        if mass > 0:
+            if c < low:
+                stop(c + d, mass)
+            else:
+                sends += self._move(window, c, c, mass, BOTH_SENT, ('state', ALONE_SENT), terminal)
+        
+        mass = window[ALONE_SENT, 0]
+        if mass > 0:
+            if c < low:
+                stop(c + d, mass)
+            else:
+                sends += self._move(window, c, c, mass, ALONE_SENT, ('stop', c + d), terminal)
+        
+        return sends
+    
+    def _bulk_matrix(self, states):
+        """
+        Matrix of one level step while capacity >= max length.
+        
+        There no length is ever rejected, so the step is the same linear map at
+        every level. The vector holds the window of the given sub-states plus
+        an accumulator of expected sends.
+        """
+        size = len(states) * self.width + 1
+        matrix = np.zeros((size, size))
+        matrix[-1, -1] = 1.0
+        
+        for column in range(size - 1):
+            window = np.zeros((NUM_STATES, self.width))
+            window[states[column // self.width], column % self.width] = 1.0
+            terminal = {}
+            sends = self.process_level(window, self.high, terminal)
+            assert not terminal, "bulk levels never terminate"
+            window = _shift(window)
+            matrix[:-1, column] = window[states].ravel()
+            matrix[-1, column] = sends
+        return matrix
+    
+    def solve(self, capacity, state, bulk_states):
+        """
+        Run the chain from one starting capacity and sub-state.
+        
+        Args:
+            capacity: Starting capacity
+            state: Starting sub-state
+            bulk_states: Sub-states that can hold mass while capacity >= max length
+        
+        Returns:
+            Tuple (free_pads, expected_sends): {free pads left in the zone: probability}
+            and the expected number of messages sent
+        """
+        window = np.zeros((NUM_STATES, self.width))
+        window[state, 0] = 1.0
+        terminal = {}
+        sends = 0.0
+        c = capacity
+        
+        # Levels c >= high: constant-coefficient recurrence
+        bulk_levels = c - self.high + 1
+        if bulk_levels > MATRIX_POWER_THRESHOLD:
+            vector = np.append(window[bulk_states].ravel(), 0.0)
+            vector = np.linalg.matrix_power(self._bulk_matrix(bulk_states), bulk_levels) @ vector
+            window = np.zeros((NUM_STATES, self.width))
+            window[bulk_states] = vector[:-1].reshape(len(bulk_states), self.width)
+            sends = vector[-1]
+            c -= bulk_levels
+        
+        while c >= 0:
+            sends += self.process_level(window, c, terminal)
+            window = _shift(window)
+            c -= 1
+        
+        return terminal, sends
+
+
+def _shift(window):
+    """Move a window down one level: slot j becomes slot j - 1."""
+    shifted = np.zeros_like(window)
+    shifted[:, :-1] = window[:, 1:]
+    return shifted
+
+
+def _convolve(a, b):
+    """Distribution of the sum of two independent {value: probability} distributions."""
+    result = {}
+    for x, p in a.items():
+        for y, q in b.items():
+            result[x + y] = result.get(x + y, 0.0) + p * q
+    return result
+
+
+def _mix(target, distribution, weight):
+    """Add weight * distribution into target ({value: probability} dicts)."""
+    for value, p in distribution.items():
+        target[value] = target.get(value, 0.0) + weight * p
+
+
+def waste_distribution(n, d, active=1, min_msg_length=1, max_msg_length=50, distribution=None,
+                       policy='retry', m=4, zone_sizes=None):
+    """
+    Exact distribution of wasted pads for scenario S.1 or S.2.
+    
+    A party's capacity only depends on the lengths it and its zone partner
+    have sent, so every zone is a Markov chain on its remaining capacity:
+    S.1 is one such chain, S.2 with both parties in one zone is a chain of
+    the pair, and S.2 across zones is two independent single-party chains
+    (each party draws its own i.i.d. lengths, whatever the interleaving).
+    Each chain is solved by dynamic programming over capacity levels in
+    O(gap x max length); while the capacity is at least the max length no
+    length is ever rejected, so that bulk is crossed with a matrix power in
+    O(max length^3 x log gap) instead.
+    
+    Args:
+        n: Total number of pads
+        d: Gap parameter
+        active: Number of active parties (1 or 2)
+        min_msg_length: Minimum message length
+        max_msg_length: Maximum message length
+        distribution: Optional workload.LengthDistribution (default: uniform on the length range)
+        policy: Handling of lengths that do not fit (see REJECTION_POLICIES)
+        m: Number of parties (even)
+        zone_sizes: Optional list of m/2 zone sizes summing to n
+    
+    Returns:
+        Tuple (waste, expected_messages): {wasted pads: probability} and the
+        expected number of messages sent
+    """
+    if policy not in REJECTION_POLICIES:
+        raise ValueError(f"Unknown rejection policy: {policy}")
+    if active not in (1, 2):
+        raise ValueError(f"The analytic engine covers S.1 and S.2 only, got {active} active parties")
+    if distribution is None:
+        distribution = UniformDistribution(min_msg_length, max_msg_length)
+    
+    chain = _ZoneChain(distribution, d, policy)
+    sizes = [zone_max - zone_min for zone_min, zone_max in zone_bounds(n, m // 2, zone_sizes)]
+    single_cache = {}
+    
+    def single(size):
+        """Free pads left by one party sending alone in a zone of the given size."""
+        if size not in single_cache:
+            start = size - d - 1
+            if start < distribution.low:
+                single_cache[size] = ({size: 1.0}, 0.0)
+            else:
+                single_cache[size] = chain.solve(start, ALONE_UNSENT, [ALONE_UNSENT])
+        return single_cache[size]
+    
+    def pair(size):
+        """Free pads left by both parties of a zone of the given size sending."""
+        start = size - d - 1
+        if start < distribution.low:
+            return {size: 1.0}, 0.0
+        return chain.solve(start, BOTH_UNSENT, [BOTH_UNSENT, FIRST_SENT, BOTH_SENT])
+    
+    waste = {}
+    expected_messages = 0.0
+    
+    if active == 1:
+        # The sender is one of the m parties, two per zone
+        for size in sizes:
+            free, sends = single(size)
+            _mix(waste, {n - size + g: p for g, p in free.items()}, 1 / len(sizes))
+            expected_messages += sends / len(sizes)
+        return waste, expected_messages
+    
+    # Two distinct parties: same zone (one pair per zone) or one party in each of two zones
+    pairs = math.comb(m, 2)
+    for size in sizes:
+        free, sends = pair(size)
+        _mix(waste, {n - size + g: p for g, p in free.items()}, 1 / pairs)
+        expected_messages += sends / pairs
+    for size_a, size_b in combinations(sizes, 2):
+        (free_a, sends_a), (free_b, sends_b) = single(size_a), single(size_b)
+        free = _convolve(free_a, free_b)
+        # Four party pairs per pair of zones
+        _mix(waste, {n - size_a - size_b + g: p for g, p in free.items()}, 4 / pairs)
+        expected_messages += 4 * (sends_a + sends_b) / pairs
+    return waste, expected_messages
+
+
+def distribution_statistics(n, waste, expected_messages):
+    """
+    Summarize an exact waste distribution with the metrics of main.calculate_statistics.
+    
+    Args:
+        n: Total number of pads
+        waste: {wasted pads: probability}
+        expected_messages: Expected number of messages sent
+    
+    Returns:
+        Dictionary with the same keys as main.calculate_statistics (executions is 'exact')
+    """
+    mean = sum(w * p for w, p in waste.items())
+    variance = sum((w - mean) ** 2 * p for w, p in waste.items())
+    support = [w for w, p in waste.items() if p > 0]
+    return {
+        'avg_wasted': float(mean),
+        'std_wasted': math.sqrt(variance),
+        'min_wasted': min(support),
+        'max_wasted': max(support),
+        'avg_waste_pct': float(mean) / n * 100,
+        'std_waste_pct': math.sqrt(variance) / n * 100,
+        'avg_messages': float(expected_messages),
+        'avg_used': n - float(mean),
+        'executions': 'exact'
+    }
+
+
+def main():
+    """Compare the exact waste distribution with a Monte Carlo estimate."""
+    import random
+    from simulator import run_scenario
+    
+    parser = argparse.ArgumentParser(description='Exact S.1/S.2 waste distribution vs Monte Carlo')
+    parser.add_argument('--n', type=int, default=1000, help='Total number of pads (default: 1000)')
+    parser.add_argument('--d', type=int, default=10, help='Gap parameter (default: 10)')
+    parser.add_argument('--min-msg-len', type=int, default=1, help='Minimum message length (default: 1)')
+    parser.add_argument('--max-msg-len', type=int, default=50, help='Maximum message length (default: 50)')
+    parser.add_argument('--policy', choices=REJECTION_POLICIES, default='retry',
+                       help='Rejection policy (default: retry)')
+    parser.add_argument('--m', type=int, default=4, help='Number of parties, even (default: 4)')
+    parser.add_argument('--executions', type=int, default=20000,
+                       help='Monte Carlo executions per scenario (default: 20000)')
+    parser.add_argument('--seed', type=int, default=0, help='Monte Carlo seed (default: 0)')
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    for active in (1, 2):
+        waste, messages = waste_distribution(args.n, args.d, active, args.min_msg_len, args.max_msg_len,
+                                             policy=args.policy, m=args.m)
+        exact = distribution_statistics(args.n, waste, messages)
+        
+        counts = {}
+        total_messages = 0
+        for _ in range(args.executions):
+            result = run_scenario(args.n, args.d, active, m=args.m, min_msg_length=args.min_msg_len,
+                                  max_msg_length=args.max_msg_len, rng=rng, policy=args.policy, audit='off')
+            counts[result['wasted_pads']] = counts.get(result['wasted_pads'], 0) + 1
+            total_messages += result['messages_sent']
+        empirical = {w: c / args.executions for w, c in counts.items()}
+        mc_mean = sum(w * p for w, p in empirical.items())
+        mc_std = math.sqrt(sum((w - mc_mean) ** 2 * p for w, p in empirical.items()))
+        distance = sum(abs(waste.get(w, 0.0) - empirical.get(w, 0.0)) for w in waste.keys() | empirical.keys()) / 2
+        
+        print(f"S.{active}: exact mean {exact['avg_wasted']:.3f} ± {exact['std_wasted']:.3f} pads, "
+              f"{exact['avg_messages']:.3f} messages")
+        print(f"     Monte Carlo mean {mc_mean:.3f} ± {mc_std:.3f} pads, "
+              f"{total_messages / args.executions:.3f} messages ({args.executions} executions)")
+        print(f"     total variation distance: {distance:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+import argparse
+import functools
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from instrumentation import Instrumentation
+from protocol import Party, Protocol, zone_bounds
+from simulator import run_scenario_1, run_scenario_2, run_scenario_4
+
+
+# Bump when benchmark definitions change, so old baselines are not compared blindly
+BENCHMARK_VERSION = 1
+
+# Operations per timed batch for the micro-benchmarks
+BATCH_OPS = 1000
+
+
+def bench_party_can_send(n, d, min_msg_length, max_msg_length, rng):
+    """Party.can_send for a rightward party in mid-zone, over random lengths."""
+    party = Party("Alice", 0, +1, 0, n // 2)
+    party.current_index = n // 8
+    partner_last = n // 2 - 1
+    lengths = [rng.randint(min_msg_length, max_msg_length) for _ in range(BATCH_OPS)]
+    
+    def batch():
+        for length in lengths:
+            party.can_send(length, partner_last, d, True)
+        return len(lengths)
+    
+    return batch
+
+
+def bench_party_consume_pads(n, d, min_msg_length, max_msg_length, rng):
+    """
+    Party.consume_pads, restarting the party when its zone cannot hold another batch.
+    
+    Raises:
+        ValueError: If Alice's zone is too small for one batch of BATCH_OPS messages
+    """
+    zone_min, zone_max = zone_bounds(n, 2)[0]
+    party = Party("Alice", zone_min, +1, zone_min, zone_max)
+    lengths = [rng.randint(min_msg_length, max_msg_length) for _ in range(BATCH_OPS)]
+    # Last start index from which a whole batch still fits in the zone
+    limit = zone_max - sum(lengths)
+    if limit < zone_min:
+        raise ValueError(f"zone of {zone_max - zone_min} pads cannot hold {BATCH_OPS} messages "
+                         f"({sum(lengths)} pads)")
+    
+    def batch():
+        if party.current_index > limit:
+            party.current_index = zone_min
+        for length in lengths:
+            party.consume_pads(length)
+        return len(lengths)
+    
+    return batch
+
+
+def bench_protocol_attempt_send(n, d, min_msg_length, max_msg_length, rng, make_instrumentation=None):
+    """
+    Protocol.attempt_send from random parties, with a fresh protocol once terminated.
+    
+    Rejected attempts count as operations, so at small n, where a protocol
+    terminates within a batch, the rate mixes sends and cheap rejections.
+    """
+    def new_protocol():
+        instrumentation = make_instrumentation() if make_instrumentation is not None else None
+        return Protocol(n=n, d=d, instrumentation=instrumentation)
+    
+    state = {'protocol': new_protocol()}
+    names = list(state['protocol'].parties)
+    sends = [(rng.choice(names), rng.randint(min_msg_length, max_msg_length)) for _ in range(BATCH_OPS)]
+    
+    def batch():
+        protocol = state['protocol']
+        if protocol.is_terminated():
+            protocol = state['protocol'] = new_protocol()
+        for name, length in sends:
+            protocol.attempt_send(name, length)
+        return len(sends)
+    
+    return batch
+
+
+def bench_protocol_attempt_send_instrumented(n, d, min_msg_length, max_msg_length, rng):
+    """Protocol.attempt_send as above, with counters and a shortfall histogram (no trace)."""
+    return bench_protocol_attempt_send(n, d, min_msg_length, max_msg_length, rng,
+                                       functools.partial(Instrumentation, gap_histogram=True))
+
+
+def _half_used_protocol(n, d, min_msg_length, max_msg_length, rng):
+    """Return a protocol in which random parties have sent until about half the pads are used."""
+    protocol = Protocol(n=n, d=d)
+    names = list(protocol.parties)
+    while protocol.get_used_pads() < n // 2 and not protocol.is_terminated():
+        protocol.attempt_send(rng.choice(names), rng.randint(min_msg_length, max_msg_length))
+    return protocol
+
+
+def bench_protocol_is_terminated(n, d, min_msg_length, max_msg_length, rng):
+    """Protocol.is_terminated on a protocol in mid-run."""
+    protocol = _half_used_protocol(n, d, min_msg_length, max_msg_length, rng)
+    
+    def batch():
+        for _ in range(BATCH_OPS):
+            protocol.is_terminated()
+        return BATCH_OPS
+    
+    return batch
+
+
+def bench_protocol_get_statistics(n, d, min_msg_length, max_msg_length, rng):
+    """Protocol.get_statistics on a protocol in mid-run."""
+    protocol = _half_used_protocol(n, d, min_msg_length, max_msg_length, rng)
+    
+    def batch():
+        for _ in range(BATCH_OPS):
+            protocol.get_statistics()
+        return BATCH_OPS
+    
+    return batch
+
+
+def _scenario_bench(scenario_func):
+    """Build a benchmark timing one full execution of a scenario per batch."""
+    def factory(n, d, min_msg_length, max_msg_length, rng):
+        def batch():
+            scenario_func(n, d, min_msg_length, max_msg_length, rng=rng)
+            return 1
+        return batch
+    
+    factory.__doc__ = f"One execution of {scenario_func.__name__}."
+    return factory
+
+
+# name -> factory(n, d, min_msg_length, max_msg_length, rng) returning a batch function;
+# each call of the batch function performs some operations and returns how many
+BENCHMARKS = {
+    'party.can_send': bench_party_can_send,
+    'party.consume_pads': bench_party_consume_pads,
+    'protocol.attempt_send': bench_protocol_attempt_send,
+    'protocol.attempt_send.instrumented': bench_protocol_attempt_send_instrumented,
+    'protocol.is_terminated': bench_protocol_is_terminated,
+    'protocol.get_statistics': bench_protocol_get_statistics,
+    'run_scenario_1': _scenario_bench(run_scenario_1),
+    'run_scenario_2': _scenario_bench(run_scenario_2),
+    'run_scenario_4': _scenario_bench(run_scenario_4),
+}
+
+
+def percentile(sorted_values, q):
+    """Return the q-th percentile (0-100) of a sorted list, by nearest rank."""
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def measure(factory, n, d, min_msg_length, max_msg_length, seed=0, min_time=0.2, min_batches=5):
+    """
+    Time one benchmark case and measure its peak memory.
+    
+    Batches run until both min_time seconds and min_batches batches have
+    passed. Latency percentiles are per operation, taken over batches (for the
+    scenario benchmarks a batch is one execution). Peak memory is measured in a
+    separate run under tracemalloc, covering setup and one batch.
+    
+    Args:
+        factory: Benchmark factory from BENCHMARKS
+        n: Total number of pads
+        d: Gap parameter
+        min_msg_length: Minimum message length
+        max_msg_length: Maximum message length
+        seed: Seed for the benchmark's random inputs
+        min_time: Minimum timed duration in seconds
+        min_batches: Minimum number of timed batches
+    
+    Returns:
+        Dictionary with ops, seconds, ops_per_sec, p50_us, p90_us, p99_us and peak_kb
+    """
+    batch = factory(n, d, min_msg_length, max_msg_length, random.Random(seed))
+    
+    latencies = []
+    total_ops = 0
+    total_time = 0.0
+    while total_time < min_time or len(latencies) < min_batches:
+        start = time.perf_counter()
+        ops = batch()
+        elapsed = time.perf_counter() - start
+        total_ops += ops
+        total_time += elapsed
+        latencies.append(elapsed / ops)
+    latencies.sort()
+    
+    tracemalloc.start()
+    try:
+        factory(n, d, min_msg_length, max_msg_length, random.Random(seed))()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    
+    return {
+        'ops': total_ops,
+        'seconds': total_time,
+        'ops_per_sec': total_ops / total_time,
+        'p50_us': percentile(latencies, 50) * 1e6,
+        'p90_us': percentile(latencies, 90) * 1e6,
+        'p99_us': percentile(latencies, 99) * 1e6,
+        'peak_kb': peak / 1024,
+    }
+
+
+def case_key(name, n, d, min_msg_length, max_msg_length):
+    """Return the baseline key of one benchmark case, e.g. 'run_scenario_1[n=1000,d=10,len=1:50]'."""
+    return f"{name}[n={n},d={d},len={min_msg_length}:{max_msg_length}]"
+
+
+def run_suite(names, n_values, d_values, length_ranges, seed=0, min_time=0.2, verbose=True):
+    """
+    Run every selected benchmark over the grid of n, d and message-length ranges.
+    
+    Cases whose benchmark cannot run with the given parameters (it raises
+    ValueError) are skipped.
+    
+    Returns:
+        Dictionary mapping case_key() to measure() results
+    """
+    results = {}
+    for name in names:
+        for n in n_values:
+            for d in d_values:
+                for min_msg_length, max_msg_length in length_ranges:
+                    key = case_key(name, n, d, min_msg_length, max_msg_length)
+                    if verbose:
+                        print(f"  {key:<60}", end=" ", flush=True)
+                    try:
+                        result = measure(BENCHMARKS[name], n, d, min_msg_length, max_msg_length, seed, min_time)
+                    except ValueError as e:
+                        # The case does not fit these parameters; compare() lists it as missing
+                        if verbose:
+                            print(f"skipped: {e}")
+                        continue
+                    results[key] = result
+                    if verbose:
+                        print(f"{result['ops_per_sec']:>14,.0f} ops/s  "
+                              f"p50 {result['p50_us']:>10.2f} us  "
+                              f"p99 {result['p99_us']:>10.2f} us  "
+                              f"peak {result['peak_kb']:>10.1f} KB")
+    return results
+
+
+def environment():
+    """Describe the machine and interpreter a baseline was recorded on."""
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+    }
+
+
+def compare(baseline, results, threshold):
+    """
+    Compare results with a saved baseline.
+    
+    A case regresses when its throughput drops, or its peak memory grows, by
+    more than the threshold fraction. Cases missing from either side are
+    listed but never fail.
+    
+    Args:
+        baseline: Baseline dictionary as written by --save
+        results: Current results from run_suite()
+        threshold: Allowed relative change (0.25 = 25%)
+    
+    Returns:
+        List of keys of regressed cases
+    """
+    if baseline.get('version') != BENCHMARK_VERSION:
+        print(f"Warning: baseline is from benchmark version {baseline.get('version')}, "
+              f"current is {BENCHMARK_VERSION}")
+    if baseline.get('environment') != environment():
+        print("Warning: baseline was recorded on a different machine or interpreter")
+    
+    old_results = baseline['results']
+    regressions = []
+    
+    print(f"\n{'Case':<60} {'Ops/s change':>13} {'Memory change':>14}  Status")
+    print("-" * 100)
+    for key, result in results.items():
+        old = old_results.get(key)
+        if old is None:
+            print(f"{key:<60} {'':>13} {'':>14}  new")
+            continue
+        speed = result['ops_per_sec'] / old['ops_per_sec'] - 1
+        memory = (result['peak_kb'] + 1) / (old['peak_kb'] + 1) - 1
+        status = "ok"
+        if speed < -threshold or memory > threshold:
+            status = "REGRESSION"
+            regressions.append(key)
+        print(f"{key:<60} {speed:>+12.1%} {memory:>+13.1%}  {status}")
+    for key in sorted(old_results.keys() - results.keys()):
+        print(f"{key:<60} {'':>13} {'':>14}  missing")
+    
+    return regressions
+
+
+def parse_length_range(text):
+    """Parse a message-length range 'MIN:MAX'."""
+    low, _, high = text.partition(':')
+    try:
+        low, high = int(low), int(high)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid length range: {text} (expected MIN:MAX)")
+    if not 1 <= low <= high:
+        raise argparse.ArgumentTypeError(f"invalid length range: {text} (need 1 <= MIN <= MAX)")
+    return low, high
+
+
+def main():
+    """Run the benchmark suite from the command line."""
+    parser = argparse.ArgumentParser(description='Benchmarks for the OTP protocol and simulator hot paths')
+    parser.add_argument('--bench', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                       help='Benchmarks to run (default: all)')
+    parser.add_argument('--n', type=int, nargs='+', default=[10**3, 10**4, 10**5, 10**6],
+                       help='Pad counts to benchmark (default: 10^3 to 10^6)')
+    parser.add_argument('--full', action='store_true',
+                       help='Benchmark n from 10^3 to 10^8 (slow: one S.4 execution at 10^8 takes many seconds)')
+    parser.add_argument('--d', type=int, nargs='+', default=[10],
+                       help='Gap parameters to benchmark (default: 10)')
+    parser.add_argument('--msg-len', type=parse_length_range, nargs='+', default=[(1, 50)],
+                       help='Message length ranges MIN:MAX (default: 1:50)')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                       help='Minimum timed seconds per case (default: 0.2)')
+    parser.add_argument('--seed', type=int, default=0,
+                       help='Seed for benchmark inputs (default: 0)')
+    parser.add_argument('--save', metavar='FILE',
+                       help='Write results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE',
+                       help='Compare with a JSON baseline; exit with status 1 on any regression')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                       help='Allowed slowdown or memory growth before a case regresses (default: 0.25)')
+    
+    args = parser.parse_args()
+    if args.full:
+        args.n = [10**k for k in range(3, 9)]
+    
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    
+    print(f"Running {len(args.bench)} benchmarks over n={args.n}, d={args.d}, "
+          f"lengths={[f'{a}:{b}' for a, b in args.msg_len]}")
+    results = run_suite(args.bench, args.n, args.d, args.msg_len, args.seed, args.min_time)
+    
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'version': BENCHMARK_VERSION, 'environment': environment(), 'results': results},
+                      f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.save}")
+    
+    if baseline is not None:
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"\nFAILED: {len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+
+# Bump when the on-disk layout changes
+FORMAT_VERSION = 2
+
+SCHEMA_FILE = 'schema.json'
+
+# Types of the numeric result fields; other numeric fields get int64 or float64
+COLUMN_DTYPES = {
+    'total_pads': '<i8',
+    'used_pads': '<i8',
+    'wasted_pads': '<i8',
+    'waste_percentage': '<f8',
+    'messages_sent': '<i8',
+    'messages_attempted': '<i8',
+    'collisions': '<i8',
+    'collided_pads': '<i8',
+    'blocked_sends': '<i8',
+    'max_in_flight': '<i4',
+    'events': '<i8',
+    'sim_time': '<f8',
+    'rebalances': '<i4',
+}
+
+# Rows without a value in a column hold its fill value
+FILL_VALUES = {'i': -1, 'f': np.nan}
+
+# Rows per pass when aggregating, so memory stays bounded for any table size
+AGGREGATE_CHUNK = 1 << 22
+
+
+class ColumnarWriter:
+    """
+    Writes execution results as typed binary columns in a directory.
+    
+    Layout (all little-endian):
+        schema.json              - row count, column types and dictionaries
+        scenario.bin             - uint8 code per row into the scenario dictionary
+        rebalanced.bin           - uint8 per row, 1 if the execution ran with zone rebalancing
+        active_parties.offsets   - int64, rows + 1 offsets into the values
+        active_parties.values    - uint16 code per active party into the party dictionary
+        <field>.bin              - one value per row for every numeric field
+    
+    'active_party' (S.1) and 'active_parties' both go to the active_parties
+    list column. A result from a rebalancing run (one with a 'rebalances'
+    count, see simulator.run_scenario) is flagged in the rebalanced column,
+    so it is never summarized together with static-split runs of the same
+    scenario. Results are buffered and appended in chunks; the schema is
+    rewritten after every chunk, so an interrupted run leaves a readable
+    table of the rows written so far. A numeric field first seen after some
+    rows were written is backfilled with its fill value (-1, or NaN for
+    floats), as are later rows without it.
+    """
+    
+    def __init__(self, path, chunk_size=65536):
+        """
+        Args:
+            path: Output directory (created if needed; an existing table is replaced)
+            chunk_size: Results buffered before they are appended to the files
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.rows = 0
+        self.dtypes = {}
+        self.scenarios = []
+        self.parties = []
+        self._scenario_codes = {}
+        self._party_codes = {}
+        self._buffer = []
+        self._files = {}
+        
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name == SCHEMA_FILE or name.endswith(('.bin', '.offsets', '.values')):
+                os.remove(os.path.join(path, name))
+        self._open('scenario.bin')
+        self._open('rebalanced.bin')
+        self._open('active_parties.offsets').write(np.zeros(1, '<i8').tobytes())
+        self._open('active_parties.values')
+        self._offset = 0
+        self._write_schema()
+    
+    def _open(self, name):
+        """Open a column file of the table for appending."""
+        self._files[name] = open(os.path.join(self.path, name), 'ab')
+        return self._files[name]
+    
+    def write(self, result):
+        """Buffer one result dictionary, flushing a full chunk to disk."""
+        self._buffer.append(result)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+    
+    def record(self, results):
+        """Write every result of an iterable while passing it through (a generator)."""
+        for result in results:
+            self.write(result)
+            yield result
+    
+    def flush(self):
+        """Append the buffered results to the column files and update the schema."""
+        buffer = self._buffer
+        if not buffer:
+            return
+        self._buffer = []
+        
+        scenarios = np.fromiter((self._code(self._scenario_codes, self.scenarios, r['scenario']) for r in buffer),
+                                np.uint8, len(buffer))
+        self._files['scenario.bin'].write(scenarios.tobytes())
+        rebalanced = np.fromiter(('rebalances' in r for r in buffer), np.uint8, len(buffer))
+        self._files['rebalanced.bin'].write(rebalanced.tobytes())
+        
+        lengths = np.empty(len(buffer), np.int64)
+        codes = []
+        for i, result in enumerate(buffer):
+            active = result['active_parties'] if 'active_parties' in result else [result['active_party']]
+            lengths[i] = len(active)
+            codes.extend(self._code(self._party_codes, self.parties, name) for name in active)
+        offsets = self._offset + np.cumsum(lengths)
+        self._offset = int(offsets[-1])
+        self._files['active_parties.offsets'].write(offsets.astype('<i8').tobytes())
+        self._files['active_parties.values'].write(np.array(codes, '<u2').tobytes())
+        
+        fields = set()
+        for result in buffer:
+            fields.update(result)
+        fields -= {'scenario', 'active_party', 'active_parties'}
+        for field in sorted(fields):
+            if field not in self.dtypes:
+                self._add_column(field, buffer)
+        
+        for field, dtype in self.dtypes.items():
+            fill = FILL_VALUES[np.dtype(dtype).kind]
+            column = np.array([result.get(field, fill) for result in buffer], dtype)
+            self._files[f"{field}.bin"].write(column.tobytes())
+        
+        self.rows += len(buffer)
+        for f in self._files.values():
+            f.flush()
+        self._write_schema()
+    
+    def _code(self, codes, dictionary, value):
+        """Return the dictionary code of a value, adding it on first sight."""
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(dictionary)
+            dictionary.append(value)
+            if dictionary is self.scenarios and code > np.iinfo(np.uint8).max:
+                raise ValueError("Too many distinct scenarios for a uint8 column")
+        return code
+    
+    def _add_column(self, field, buffer):
+        """Start a numeric column, backfilling the rows already written."""
+        dtype = COLUMN_DTYPES.get(field)
+        if dtype is None:
+            sample = next(result[field] for result in buffer if field in result)
+            if isinstance(sample, (bool, str)) or not isinstance(sample, (int, float)):
+                raise ValueError(f"Cannot store field {field!r} of type {type(sample).__name__}")
+            dtype = '<i8' if isinstance(sample, int) else '<f8'
+        self.dtypes[field] = dtype
+        f = self._open(f"{field}.bin")
+        f.write(np.full(self.rows, FILL_VALUES[np.dtype(dtype).kind], dtype).tobytes())
+    
+    def _write_schema(self):
+        """Atomically rewrite schema.json for the rows written so far."""
+        schema = {
+            'version': FORMAT_VERSION,
+            'rows': self.rows,
+            'scenarios': self.scenarios,
+            'parties': self.parties,
+            'columns': self.dtypes,
+        }
+        temp_path = os.path.join(self.path, f"{SCHEMA_FILE}.tmp")
+        with open(temp_path, 'w') as f:
+            json.dump(schema, f, indent=2)
+        os.replace(temp_path, os.path.join(self.path, SCHEMA_FILE))
+    
+    def close(self):
+        """Flush the remaining results and close the files."""
+        self.flush()
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ColumnarTable:
+    """
+    Read-only view of a table written by ColumnarWriter.
+    
+    Columns are memory-mapped, so opening a table costs nothing and
+    aggregations read only the columns they use.
+    """
+    
+    def __init__(self, path):
+        """
+        Args:
+            path: Table directory
+        """
+        with open(os.path.join(path, SCHEMA_FILE)) as f:
+            schema = json.load(f)
+        if schema.get('version') != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported format version {schema.get('version')}")
+        self.path = path
+        self.rows = schema['rows']
+        self.scenarios = schema['scenarios']
+        self.parties = schema['parties']
+        self.dtypes = schema['columns']
+        self.scenario = self._map('scenario.bin', np.uint8, self.rows)
+        self.rebalanced = self._map('rebalanced.bin', np.uint8, self.rows)
+        self.offsets = self._map('active_parties.offsets', '<i8', self.rows + 1)
+        self.party_codes = self._map('active_parties.values', '<u2', int(self.offsets[-1]))
+    
+    def _map(self, name, dtype, count):
+        """Memory-map the first `count` values of a column file."""
+        # Files may hold a partly written chunk past the rows in the schema
+        if count == 0:
+            return np.empty(0, dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode='r', shape=(count,))
+    
+    def __len__(self):
+        return self.rows
+    
+    def column(self, field):
+        """Return a numeric column as a read-only memory-mapped array."""
+        if field not in self.dtypes:
+            raise KeyError(f"No column {field!r} (available: {', '.join(self.dtypes)})")
+        return self._map(f"{field}.bin", self.dtypes[field], self.rows)
+    
+    def active_parties(self, row):
+        """Return the names of the active parties of one row."""
+        start, stop = self.offsets[row], self.offsets[row + 1]
+        return [self.parties[code] for code in self.party_codes[start:stop]]
+    
+    def scenario_code(self, scenario):
+        """Return the dictionary code of a scenario name."""
+        return self.scenarios.index(scenario)
+    
+    def iter_results(self, start=0, stop=None):
+        """
+        Yield rows as result dictionaries, like those the engines return.
+        
+        Fill values of absent fields are left out.
+        """
+        stop = self.rows if stop is None else min(stop, self.rows)
+        columns = {field: self.column(field) for field in self.dtypes}
+        for row in range(start, stop):
+            result = {'scenario': self.scenarios[self.scenario[row]]}
+            active = self.active_parties(row)
+            if len(active) == 1:
+                result['active_party'] = active[0]
+            else:
+                result['active_parties'] = active
+            for field, column in columns.items():
+                value = column[row].item()
+                if value == -1 or value != value:
+                    continue
+                result[field] = value
+            yield result
+    
+    def aggregate(self, field, by='scenario'):
+        """
+        Count, mean and standard deviation of a numeric column per group.
+        
+        Rebalanced and static-split runs always form separate groups. Reads the columns in chunks of AGGREGATE_CHUNK rows, so memory stays
+        bounded for tables of any size. Rows holding the fill value are skipped.
+        
+        Args:
+            field: Numeric column to summarize
+            by: 'scenario', or 'active' to group by the number of active parties
+        
+        Returns:
+            Dictionary mapping each group (scenario name or active count, as
+            '<group> rebalanced' for rebalanced runs) to (count, mean, std) of
+            the column
+        """
+        values = self.column(field)
+        # Group g of the rows' scenario or active count is key 2g, or 2g + 1 for rebalanced rows
+        groups = 2 * (len(self.scenarios) if by == 'scenario' else max(1, len(self.parties)) + 1)
+        counts = np.zeros(groups, np.int64)
+        means = np.zeros(groups)
+        m2 = np.zeros(groups)  # Sum of squared deviations from the group mean
+        for start in range(0, self.rows, AGGREGATE_CHUNK):
+            stop = min(start + AGGREGATE_CHUNK, self.rows)
+            if by == 'scenario':
+                keys = np.asarray(self.scenario[start:stop], np.intp)
+            elif by == 'active':
+                keys = np.diff(np.asarray(self.offsets[start:stop + 1]))
+            else:
+                raise ValueError(f"Unknown grouping: {by}")
+            keys = 2 * keys + self.rebalanced[start:stop]
+            chunk = np.asarray(values[start:stop], np.float64)
+            valid = (chunk != -1) & ~np.isnan(chunk)
+            keys, chunk = keys[valid], chunk[valid]
+            
+            # Per-chunk group moments, merged with the running ones (Chan et al.)
+            chunk_counts = np.bincount(keys, minlength=groups)
+            present = chunk_counts > 0
+            chunk_means = np.zeros(groups)
+            chunk_means[present] = np.bincount(keys, chunk, groups)[present] / chunk_counts[present]
+            chunk_m2 = np.bincount(keys, (chunk - chunk_means[keys]) ** 2, groups)
+            total = counts + chunk_counts
+            delta = chunk_means - means
+            weight = np.divide(chunk_counts, total, out=np.zeros(groups), where=total > 0)
+            m2 += chunk_m2 + delta * delta * counts * weight
+            means += delta * weight
+            counts = total
+        
+        summary = {}
+        for group in np.flatnonzero(counts):
+            count = int(counts[group])
+            std = float(np.sqrt(m2[group] / (count - 1))) if count > 1 else 0.0
+            key = self.scenarios[group // 2] if by == 'scenario' else int(group // 2)
+            if group % 2:
+                key = f"{key} rebalanced"
+            summary[key] = (count, float(means[group]), std)
+        return summary
+
+
+def load(path):
+    """Open a table written by ColumnarWriter (see ColumnarTable)."""
+    return ColumnarTable(path)
+
+
+def main():
+    """Summarize numeric columns of a table per scenario or active-party count."""
+    parser = argparse.ArgumentParser(description='Summarize a columnar table of execution results')
+    parser.add_argument('path', help='Table directory written by main.py --output')
+    parser.add_argument('--column', nargs='+', default=['waste_percentage', 'messages_sent'],
+                        help='Numeric columns to summarize (default: waste_percentage messages_sent)')
+    parser.add_argument('--by', choices=['scenario', 'active'], default='scenario',
+                        help='Group rows by scenario name or number of active parties (default: scenario)')
+    args = parser.parse_args()
+    
+    table = load(args.path)
+    print(f"{args.path}: {len(table)} rows, columns {', '.join(table.dtypes)}")
+    for field in args.column:
+        start = time.perf_counter()
+        summary = table.aggregate(field, args.by)
+        print(f"\n{field} ({time.perf_counter() - start:.3f}s)")
+        print(f"{'Group':<16} {'Rows':>12} {'Mean':>14} {'Std Dev':>14}")
+        for group, (count, mean, std) in summary.items():
+            print(f"{str(group):<16} {count:>12} {mean:>14.4f} {std:>14.4f}")
+
+
+if __name__ == "__main__":
+    main()
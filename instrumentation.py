@@ -0,0 +1,163 @@
+import time
+
+
+# Why Protocol rejected a send attempt
+REJECT_LENGTH = 'length'  # Message length below 1
+REJECT_ZONE = 'zone'      # The message would cross the party's zone bound
+REJECT_GAP = 'gap'        # The message fits the zone but would come within d pads of the partner
+REJECTION_REASONS = (REJECT_LENGTH, REJECT_ZONE, REJECT_GAP)
+
+# Trace event kinds passed to the trace callback
+EVENT_SEND = 'send'
+EVENT_REJECT = 'reject'
+EVENT_REBALANCE = 'rebalance'
+
+
+class Instrumentation:
+    """
+    Per-party counters and optional tracing for a Protocol.
+    
+    Pass an instance as Protocol(..., instrumentation=...). The protocol only
+    reports to it on accepted runs, rejections and zone handoffs, behind a
+    single `is not None` check, so a protocol without instrumentation runs
+    at full speed.
+    
+    Counters (lists indexed by party id):
+        attempts, accepts    - send attempts and accepted messages
+        pads                 - pads consumed
+        rejections[reason]   - rejected attempts per reason (see REJECTION_REASONS)
+        handoffs             - zone handoffs of the party's pair (see Protocol.rebalance),
+                               counted for both partners whichever one ran out
+    
+    With gap_histogram=True, every rejection also records its shortfall, the
+    message length minus the party's capacity at that moment, as
+    {shortfall: count} per party and reason.
+    
+    A trace callback, if given, is called as trace(event, party_id, length,
+    start, stop, timestamp_ns) for every event, where (start, stop) is the
+    consumed pad range of a send (both None for a rejection) and the donor
+    zone's range for a rebalance.
+    """
+    
+    def __init__(self, gap_histogram=False, trace=None):
+        """
+        Args:
+            gap_histogram: Record the shortfall of every rejected attempt
+            trace: Optional event callback (see the class docstring)
+        """
+        self.gap_histogram = gap_histogram
+        self.trace = trace
+        self.names = []
+        self.attempts = []
+        self.accepts = []
+        self.pads = []
+        self.handoffs = []
+        self.rejections = {reason: [] for reason in REJECTION_REASONS}
+        self.shortfalls = {reason: [] for reason in REJECTION_REASONS}
+    
+    def attach(self, protocol):
+        """Size the counters for a protocol's parties (called by Protocol)."""
+        m = protocol.m
+        self.names = [party.name for party in protocol.party_list]
+        self.attempts = [0] * m
+        self.accepts = [0] * m
+        self.pads = [0] * m
+        self.handoffs = [0] * m
+        self.rejections = {reason: [0] * m for reason in REJECTION_REASONS}
+        self.shortfalls = {reason: [{} for _ in range(m)] for reason in REJECTION_REASONS}
+    
+    def record_send(self, party_id, count, start, stop):
+        """Record `count` accepted messages that consumed pads [start, stop)."""
+        self.attempts[party_id] += count
+        self.accepts[party_id] += count
+        self.pads[party_id] += stop - start
+        if self.trace is not None:
+            self.trace(EVENT_SEND, party_id, stop - start, start, stop, time.perf_counter_ns())
+    
+    def record_batch(self, party_id, ranges):
+        """Record messages accepted together by Protocol.attempt_send_batch, one (start, stop) per message."""
+        if self.trace is not None:
+            for start, stop in ranges:
+                self.record_send(party_id, 1, start, stop)
+            return
+        count = len(ranges)
+        self.attempts[party_id] += count
+        self.accepts[party_id] += count
+        self.pads[party_id] += sum(stop - start for start, stop in ranges)
+    
+    def record_reject(self, party, party_id, message_length, capacity):
+        """
+        Record a rejected attempt and classify why it failed.
+        
+        Args:
+            party: The Party that tried to send
+            party_id: Its id
+            message_length: Requested length
+            capacity: The party's capacity at the time (Protocol.get_capacity)
+        """
+        if message_length < 1:
+            reason = REJECT_LENGTH
+        else:
+            # Capacity allowed by the zone bound alone; the gap limit is the rest
+            if party.direction > 0:
+                zone_capacity = party.zone_max - party.current_index
+            else:
+                zone_capacity = party.current_index - party.zone_min + 1
+            reason = REJECT_ZONE if message_length > zone_capacity else REJECT_GAP
+        self.attempts[party_id] += 1
+        self.rejections[reason][party_id] += 1
+        if self.gap_histogram:
+            histogram = self.shortfalls[reason][party_id]
+            shortfall = message_length - capacity
+            histogram[shortfall] = histogram.get(shortfall, 0) + 1
+        if self.trace is not None:
+            self.trace(EVENT_REJECT, party_id, message_length, None, None, time.perf_counter_ns())
+    
+    def record_rebalance(self, party_id, donor_start, donor_stop):
+        """Record a zone handoff of party_id's pair into pads [donor_start, donor_stop)."""
+        # Both partners move, so both count it
+        self.handoffs[party_id] += 1
+        self.handoffs[party_id ^ 1] += 1
+        if self.trace is not None:
+            self.trace(EVENT_REBALANCE, party_id, 0, donor_start, donor_stop, time.perf_counter_ns())
+    
+    def totals(self):
+        """
+        Return the counters summed over all parties.
+        
+        Returns:
+            Dictionary with attempts, accepts, pads, handoffs (one per pair
+            moved) and one 'rejected_<reason>' entry per rejection reason
+        """
+        totals = {
+            'attempts': sum(self.attempts),
+            'accepts': sum(self.accepts),
+            'pads': sum(self.pads),
+            'handoffs': sum(self.handoffs) // 2,  # Each handoff is counted for both partners
+        }
+        for reason, counts in self.rejections.items():
+            totals[f'rejected_{reason}'] = sum(counts)
+        return totals
+    
+    def export(self):
+        """
+        Return all counters as plain dictionaries, keyed by party name.
+        
+        Returns:
+            Dictionary with 'parties' ({name: counters}) and 'totals' (see totals());
+            each party's counters include 'shortfalls' when gap_histogram is on
+        """
+        parties = {}
+        for party_id, name in enumerate(self.names):
+            counters = {
+                'attempts': self.attempts[party_id],
+                'accepts': self.accepts[party_id],
+                'pads': self.pads[party_id],
+                'handoffs': self.handoffs[party_id],
+                'rejections': {reason: counts[party_id] for reason, counts in self.rejections.items()},
+            }
+            if self.gap_histogram:
+                counters['shortfalls'] = {reason: dict(sorted(histograms[party_id].items()))
+                                          for reason, histograms in self.shortfalls.items()}
+            parties[name] = counters
+        return {'parties': parties, 'totals': self.totals()}
@@ -0,0 +1,384 @@
+import argparse
+import json
+import mmap
+import os
+import random
+import shutil
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+from protocol import Protocol
+
+
+# Durability levels: when journal records are forced to stable storage
+#   none  - never explicitly; the records live in the shared memory map, so they
+#           survive a process crash, and the OS writes them back in its own time
+#   batch - group commit: msync after every batch_size records or batch_interval seconds
+#   sync  - msync after every record
+DURABILITY_LEVELS = ('none', 'batch', 'sync')
+
+LOG_FILE = 'journal.log'
+SNAPSHOT_FILE = 'snapshot.json'
+
+MAGIC = b'OTPJRNL1'
+# Log header: magic, generation (bumped by every snapshot), record capacity
+LOG_HEADER = struct.Struct('<8sQQ')
+HEADER_SIZE = mmap.PAGESIZE
+
+# One position advance: party id, messages sent, check word, party's new current_index
+RECORD = struct.Struct('<HHIq')
+RECORD_DTYPE = np.dtype([('party', '<u2'), ('count', '<u2'), ('check', '<u4'), ('index', '<i8')])
+MAX_COUNT = 0xFFFF
+
+# Records checked by the first recovery pass; each further pass checks twice as many
+RECOVERY_BLOCK = 1024
+
+# Odd 64-bit constants for the record check word
+_K1 = 0x9E3779B97F4A7C15
+_K2 = 0xC2B2AE3D27D4EB4F
+_K3 = 0x165667B19E3779F9
+_K4 = 0xD6E8FEB86659FD93
+_MASK = (1 << 64) - 1
+
+
+def record_check(generation, ordinal, party, count, index):
+    """
+    Check word binding a record to its content, its slot and the log generation.
+    
+    A torn or stale record (e.g. left over from before the last snapshot)
+    fails the check, so recovery stops at the first record that does.
+    """
+    x = ((index & _MASK) * _K1) & _MASK
+    x ^= (((party << 16) | count) * _K2) & _MASK
+    x ^= (((generation << 32) | ordinal) * _K3) & _MASK
+    x ^= x >> 29
+    return ((x * _K4) & _MASK) >> 32
+
+
+def _record_checks(generation, records, first=0):
+    """record_check() for every record of an array holding log slots first, first + 1, ..., with NumPy."""
+    ordinal = np.arange(first, first + len(records), dtype=np.uint64)
+    index = records['index'].astype(np.int64).view(np.uint64)
+    key = (records['party'].astype(np.uint64) << np.uint64(16)) | records['count'].astype(np.uint64)
+    x = index * np.uint64(_K1)
+    x ^= key * np.uint64(_K2)
+    x ^= ((np.uint64(generation) << np.uint64(32)) | ordinal) * np.uint64(_K3)
+    x ^= x >> np.uint64(29)
+    return ((x * np.uint64(_K4)) >> np.uint64(32)).astype(np.uint32)
+
+
+class Journal:
+    """
+    Crash-safe record of a Protocol's party positions.
+    
+    A journal directory holds a snapshot (the full Protocol.get_state(),
+    written atomically) and a memory-mapped append-only log. Every accepted
+    send appends one 16-byte record with the sender's new position; a zone
+    handoff, or a full log, writes a new snapshot and starts a new log
+    generation in place, so the log never grows beyond its capacity and
+    recovery replays at most one log's worth of records.
+    
+    Create a journal for a new protocol with Protocol(..., journal=Journal(path));
+    after a crash, Journal(path).recover() rebuilds the protocol.
+    """
+    
+    def __init__(self, path, durability='batch', batch_size=1024, batch_interval=0.01, capacity=1 << 20):
+        """
+        Args:
+            path: Journal directory
+            durability: One of DURABILITY_LEVELS
+            batch_size: Records per group commit ('batch' level)
+            batch_interval: Longest time in seconds a record waits for its group commit ('batch' level;
+                checked when the next record is appended)
+            capacity: Log records between snapshots
+        """
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability level: {durability}")
+        self.path = path
+        self.durability = durability
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.capacity = capacity
+        self.protocol = None
+        self.generation = 0
+        self.records = 0
+        self.snapshots = 0
+        self._map = None
+        self._file = None
+        self._pending = 0
+        self._synced_offset = HEADER_SIZE
+        self._last_sync = time.monotonic()
+    
+    def attach(self, protocol):
+        """
+        Start journaling a new protocol (called by Protocol).
+        
+        Raises:
+            FileExistsError: If the directory already holds a journal (use recover())
+        """
+        if os.path.exists(os.path.join(self.path, SNAPSHOT_FILE)):
+            raise FileExistsError(f"{self.path} already holds a journal; use Journal.recover()")
+        os.makedirs(self.path, exist_ok=True)
+        self.protocol = protocol
+        self._open_log(create=True)
+        self.snapshot()
+    
+    def _open_log(self, create=False):
+        """Map the log file, creating it at full capacity or reading an existing header."""
+        log_path = os.path.join(self.path, LOG_FILE)
+        size = HEADER_SIZE + self.capacity * RECORD.size
+        self._file = open(log_path, 'w+b' if create else 'r+b')
+        if create:
+            self._file.truncate(size)
+        else:
+            magic, self.generation, capacity = LOG_HEADER.unpack(self._file.read(LOG_HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{log_path}: not a journal log")
+            self.capacity = capacity
+        self._map = mmap.mmap(self._file.fileno(), 0)
+    
+    def record(self, party_id, count, index):
+        """
+        Append a position advance (called by Protocol after every accepted send).
+        
+        Args:
+            party_id: Sending party
+            count: Messages the advance covers
+            index: The party's current_index after the send
+        """
+        if self.records + -(-count // MAX_COUNT) > self.capacity:
+            # Compaction: the protocol already includes this advance, so the snapshot covers it
+            self.snapshot()
+            return
+        while count > MAX_COUNT:
+            self._append(party_id, MAX_COUNT, index)
+            count -= MAX_COUNT
+        self._append(party_id, count, index)
+    
+    def _append(self, party_id, count, index):
+        """Write one record at the next log slot and apply the durability level."""
+        ordinal = self.records
+        offset = HEADER_SIZE + ordinal * RECORD.size
+        RECORD.pack_into(self._map, offset, party_id, count,
+                         record_check(self.generation, ordinal, party_id, count, index), index)
+        self.records = ordinal + 1
+        
+        if self.durability == 'sync':
+            self._sync(offset + RECORD.size)
+        elif self.durability == 'batch':
+            self._pending += 1
+            if self._pending >= self.batch_size or time.monotonic() - self._last_sync >= self.batch_interval:
+                self._sync(offset + RECORD.size)
+    
+    def _sync(self, end):
+        """msync the log from the last synced page up to `end`."""
+        start = self._synced_offset // mmap.PAGESIZE * mmap.PAGESIZE
+        self._map.flush(start, end - start)
+        self._synced_offset = end
+        self._pending = 0
+        self._last_sync = time.monotonic()
+    
+    def commit(self):
+        """Force every record appended so far to stable storage."""
+        self._sync(HEADER_SIZE + self.records * RECORD.size)
+    
+    def snapshot(self):
+        """
+        Write the protocol's state as a new snapshot and restart the log.
+        
+        The snapshot is written to a temporary file, synced and renamed over
+        the old one. Only then does the log move to the next generation,
+        which invalidates its old records without rewriting them.
+        """
+        generation = self.generation + 1
+        state = dict(self.protocol.get_state(), generation=generation, audit=self.protocol.audit)
+        snapshot_path = os.path.join(self.path, SNAPSHOT_FILE)
+        temp_path = f"{snapshot_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, snapshot_path)
+        _sync_directory(self.path)
+        
+        self.generation = generation
+        LOG_HEADER.pack_into(self._map, 0, MAGIC, generation, self.capacity)
+        self._map.flush(0, HEADER_SIZE)
+        self.records = 0
+        self._synced_offset = HEADER_SIZE
+        self._pending = 0
+        self.snapshots += 1
+    
+    def recover(self, audit=None):
+        """
+        Rebuild the journaled protocol after a restart or crash.
+        
+        Loads the snapshot, then applies the log's valid records, the
+        prefix of the current generation whose check words match (see
+        _valid_records), with NumPy: each party ends at the position in its
+        last record. Later
+        sends continue the same log.
+        
+        Args:
+            audit: Audit level of the rebuilt protocol (default: the journaled one)
+        
+        Returns:
+            The Protocol, with this journal attached
+        """
+        with open(os.path.join(self.path, SNAPSHOT_FILE)) as f:
+            state = json.load(f)
+        self._open_log()
+        if self.generation != state['generation']:
+            # Crash between the snapshot rename and the log header update: the log predates the snapshot.
+            # Finish the update now, or the next recovery would discard the records appended from here on
+            self.generation = state['generation']
+            LOG_HEADER.pack_into(self._map, 0, MAGIC, self.generation, self.capacity)
+            self._map.flush(0, HEADER_SIZE)
+            records = np.empty(0, RECORD_DTYPE)
+        else:
+            records = np.frombuffer(self._map, RECORD_DTYPE, self._valid_records(), HEADER_SIZE).copy()
+        
+        if len(records):
+            parties = records['party'].astype(np.int64)
+            if parties.max() >= state['m']:
+                raise ValueError("Journal record for an unknown party")
+            reversed_ids, last_reversed = np.unique(parties[::-1], return_index=True)
+            for party_id, last in zip(reversed_ids.tolist(), (len(records) - 1 - last_reversed).tolist()):
+                party = state['parties'][party_id]
+                party[1] = int(records['index'][last])
+                party[4] = True
+            sent = int(records['count'].sum(dtype=np.int64))
+            state['messages_sent'] += sent
+            state['messages_attempted'] += sent
+        self.records = len(records)
+        self._synced_offset = HEADER_SIZE + self.records * RECORD.size
+        self.snapshots = 1
+        
+        protocol = Protocol(n=state['n'], d=state['d'], audit=audit or state['audit'], m=state['m'])
+        protocol.set_state(state)
+        protocol.journal = self
+        self.protocol = protocol
+        return protocol
+    
+    def _valid_records(self):
+        """
+        Return the length of the log's valid prefix.
+        
+        Checks growing blocks of slots and stops at the first record whose
+        check word does not match (or that is empty: every record has count
+        >= 1), so the cost follows the records written, not the capacity.
+        """
+        valid = 0
+        block = RECOVERY_BLOCK
+        while valid < self.capacity:
+            count = min(block, self.capacity - valid)
+            records = np.frombuffer(self._map, RECORD_DTYPE, count, HEADER_SIZE + valid * RECORD.size)
+            invalid = (records['count'] == 0) | (_record_checks(self.generation, records, valid) != records['check'])
+            if invalid.any():
+                return valid + int(invalid.argmax())
+            valid += count
+            block *= 2
+        return valid
+    
+    def close(self):
+        """Commit outstanding records and release the log."""
+        if self._map is not None:
+            if self.durability != 'none':
+                self.commit()
+            self._map.close()
+            self._file.close()
+            self._map = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _sync_directory(path):
+    """fsync a directory so a rename in it is durable (no-op where unsupported)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def benchmark(n, d, sends, durability, directory, seed=0):
+    """
+    Time random sends through a journaled protocol, then its recovery.
+    
+    Args:
+        n: Total number of pads
+        d: Gap parameter
+        sends: Number of send attempts
+        durability: One of DURABILITY_LEVELS, or None for no journal
+        directory: Empty scratch directory for the journal
+        seed: Seed for senders and lengths
+    
+    Returns:
+        (sends per second, recovery seconds or None)
+    """
+    rng = random.Random(seed)
+    journal = None if durability is None else Journal(directory, durability)
+    protocol = Protocol(n=n, d=d, audit='off', journal=journal)
+    attempts = [(rng.randrange(protocol.m), rng.randint(1, 50)) for _ in range(sends)]
+    
+    start = time.perf_counter()
+    for party_id, length in attempts:
+        protocol.attempt_send(party_id, length)
+    elapsed = time.perf_counter() - start
+    if journal is None:
+        return sends / elapsed, None
+    
+    expected = protocol.get_state()
+    journal.close()
+    start = time.perf_counter()
+    recovered = Journal(directory, durability).recover()
+    recovery = time.perf_counter() - start
+    state = recovered.get_state()
+    # Attempt counts are not journaled: recovery counts only the accepted ones
+    state['messages_attempted'] = expected['messages_attempted']
+    if state != expected:
+        raise AssertionError("Recovered state differs from the journaled protocol")
+    recovered.journal.close()
+    return sends / elapsed, recovery
+
+
+def main():
+    """Benchmark sends per second at each durability level and the recovery time."""
+    parser = argparse.ArgumentParser(description='Journaled protocol: sends/sec per durability level and recovery')
+    parser.add_argument('--n', type=int, default=10**9, help='Total number of pads (default: 10^9)')
+    parser.add_argument('--d', type=int, default=10, help='Gap parameter (default: 10)')
+    parser.add_argument('--sends', type=int, default=200000, help='Send attempts per level (default: 200000)')
+    parser.add_argument('--sync-sends', type=int, default=2000,
+                        help="Send attempts for the 'sync' level, which msyncs every record (default: 2000)")
+    parser.add_argument('--dir', default=None, help='Directory for the journals (default: a temporary one)')
+    args = parser.parse_args()
+    
+    base = args.dir or tempfile.mkdtemp(prefix='journal-bench-')
+    try:
+        print(f"{'Durability':<12} {'Sends':>10} {'Sends/sec':>14} {'Recovery':>12}")
+        for durability in (None,) + DURABILITY_LEVELS:
+            sends = args.sync_sends if durability == 'sync' else args.sends
+            directory = os.path.join(base, durability or 'off')
+            shutil.rmtree(directory, ignore_errors=True)
+            rate, recovery = benchmark(args.n, args.d, sends, durability, directory)
+            recovered = '-' if recovery is None else f"{recovery * 1000:.2f} ms"
+            print(f"{durability or 'no journal':<12} {sends:>10} {rate:>14,.0f} {recovered:>12}")
+    finally:
+        if args.dir is None:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
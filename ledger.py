@@ -0,0 +1,228 @@
+from bisect import bisect_right
+
+
+def _collision(pad_idx):
+    """Build the error raised when a pad would be used twice."""
+    return AssertionError(f"COLLISION: Pad {pad_idx} was already used! Perfect secrecy violated!")
+
+
+class IntervalLedger:
+    """
+    Tracks used pads as a sorted list of disjoint half-open runs [start, stop).
+    
+    Parties consume contiguous runs, and each new run is merged with the run it
+    touches, so the ledger holds a handful of intervals no matter how large n is.
+    """
+    
+    def __init__(self, n):
+        """
+        Initialize an empty ledger.
+        
+        Args:
+            n: Total number of pads in the sequence
+        """
+        self.n = n
+        self.starts = []
+        self.stops = []
+        self.used = 0
+    
+    def mark(self, start, stop):
+        """
+        Mark pads [start, stop) as used.
+        
+        Args:
+            start: First pad index (inclusive)
+            stop: Last pad index (exclusive)
+        
+        Raises:
+            AssertionError: If any pad in the run was already used
+        """
+        if stop <= start:
+            return
+        
+        starts = self.starts
+        stops = self.stops
+        i = bisect_right(starts, start)
+        
+        # Overlap with the run starting at or before `start`, or the next one
+        if i > 0 and stops[i - 1] > start:
+            raise _collision(start)
+        if i < len(starts) and starts[i] < stop:
+            raise _collision(starts[i])
+        
+        merge_left = i > 0 and stops[i - 1] == start
+        merge_right = i < len(starts) and starts[i] == stop
+        
+        if merge_left and merge_right:
+            stops[i - 1] = stops[i]
+            del starts[i]
+            del stops[i]
+        elif merge_left:
+            stops[i - 1] = stop
+        elif merge_right:
+            starts[i] = start
+        else:
+            starts.insert(i, start)
+            stops.insert(i, stop)
+        
+        self.used += stop - start
+    
+    def is_used(self, pad_idx):
+        """Return True if the given pad has been used."""
+        i = bisect_right(self.starts, pad_idx)
+        return i > 0 and self.stops[i - 1] > pad_idx
+    
+    def intervals(self):
+        """Return the used runs as a list of (start, stop) tuples."""
+        return list(zip(self.starts, self.stops))
+    
+    def __repr__(self):
+        return f"IntervalLedger(n={self.n}, used={self.used}, runs={len(self.starts)})"
+
+
+class BitmapLedger:
+    """
+    Tracks used pads with one bit per pad.
+    
+    Every pad of a run is checked against the bitmap, as the original
+    per-pad audit did, but whole bytes are checked and set with slice
+    operations. It needs n/8 bytes, and its cost does not depend on how
+    fragmented the usage is.
+    """
+    
+    def __init__(self, n):
+        """
+        Initialize an empty ledger.
+        
+        Args:
+            n: Total number of pads in the sequence
+        """
+        self.n = n
+        self.bits = bytearray((n + 7) // 8)
+        self.used = 0
+    
+    def mark(self, start, stop):
+        """
+        Mark pads [start, stop) as used.
+        
+        Args:
+            start: First pad index (inclusive)
+            stop: Last pad index (exclusive)
+        
+        Raises:
+            AssertionError: If any pad in the run was already used
+        """
+        if stop <= start:
+            return
+        
+        bits = self.bits
+        # Whole bytes covered by the run; the edges are handled bit by bit
+        first_byte = -(-start // 8)
+        last_byte = stop // 8
+        if first_byte >= last_byte:
+            first_byte = last_byte = stop // 8
+            head = range(start, stop)
+            tail = range(0)
+        else:
+            head = range(start, first_byte * 8)
+            tail = range(last_byte * 8, stop)
+        
+        # Check in index order so the lowest reused pad is reported
+        for pad_idx in head:
+            if self.is_used(pad_idx):
+                raise _collision(pad_idx)
+        if any(bits[first_byte:last_byte]):
+            for pad_idx in range(first_byte * 8, last_byte * 8):
+                if self.is_used(pad_idx):
+                    raise _collision(pad_idx)
+        for pad_idx in tail:
+            if self.is_used(pad_idx):
+                raise _collision(pad_idx)
+        
+        for pad_idx in head:
+            bits[pad_idx >> 3] |= 1 << (pad_idx & 7)
+        bits[first_byte:last_byte] = b'\xff' * (last_byte - first_byte)
+        for pad_idx in tail:
+            bits[pad_idx >> 3] |= 1 << (pad_idx & 7)
+        
+        self.used += stop - start
+    
+    def is_used(self, pad_idx):
+        """Return True if the given pad has been used."""
+        return bool(self.bits[pad_idx >> 3] & (1 << (pad_idx & 7)))
+    
+    def intervals(self):
+        """Return the used runs as a list of (start, stop) tuples."""
+        runs = []
+        run_start = None
+        for pad_idx in range(self.n):
+            if self.is_used(pad_idx):
+                if run_start is None:
+                    run_start = pad_idx
+            elif run_start is not None:
+                runs.append((run_start, pad_idx))
+                run_start = None
+        if run_start is not None:
+            runs.append((run_start, self.n))
+        return runs
+    
+    def __repr__(self):
+        return f"BitmapLedger(n={self.n}, used={self.used})"
+
+
+class CountingLedger:
+    """
+    Keeps only the count of used pads.
+    
+    Used when auditing is off: Protocol then relies on an O(1) check that each
+    new run stays inside the sender's zone and clear of its partner's run
+    (see check_run), which still catches any real overlap.
+    """
+    
+    def __init__(self, n):
+        """
+        Initialize an empty ledger.
+        
+        Args:
+            n: Total number of pads in the sequence
+        """
+        self.n = n
+        self.used = 0
+    
+    def mark(self, start, stop):
+        """Count pads [start, stop) as used."""
+        if stop > start:
+            self.used += stop - start
+    
+    def __repr__(self):
+        return f"CountingLedger(n={self.n}, used={self.used})"
+
+
+def check_run(start, stop, zone_min, zone_max, other_start, other_stop):
+    """
+    O(1) collision check for a run against its zone and one other run.
+    
+    Args:
+        start: First pad index of the new run (inclusive)
+        stop: Last pad index of the new run (exclusive)
+        zone_min: Minimum index of the sender's zone (inclusive)
+        zone_max: Maximum index of the sender's zone (exclusive)
+        other_start: First pad index used by the partner (inclusive)
+        other_stop: Last pad index used by the partner (exclusive)
+    
+    Raises:
+        AssertionError: If the run leaves the zone or overlaps the other run
+    """
+    if start < zone_min or stop > zone_max:
+        pad_idx = start if start < zone_min else zone_max
+        raise AssertionError(f"COLLISION: Pad {pad_idx} is outside the sender's zone! Perfect secrecy violated!")
+    if start < other_stop and other_start < stop:
+        raise _collision(max(start, other_start))
+
+
+# Collision audit levels, from cheapest to most literal
+AUDIT_LEVELS = {
+    'off': CountingLedger,
+    'interval': IntervalLedger,
+    'full': BitmapLedger,
+}
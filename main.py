@@ -1,52 +1,109 @@
 import argparse
-import statistics
-from simulator import run_scenario_1, run_scenario_2, run_scenario_4, run_multiple_executions
+import functools
+import random
+import sys
+import time
+from simulator import run_scenario, iter_executions, scenario_name, REJECTION_POLICIES
+from stats import ScenarioStatistics
 
 
-def calculate_statistics(results):
+def calculate_statistics(results, histogram_bins=20, target_ci=None, batch_size=100, confidence=0.95):
     """
     Calculate statistical metrics from multiple execution results.
     
+    Results are consumed one at a time into online accumulators, so any
+    iterable (including a generator of 10^7 executions) is summarized in
+    constant memory.
+    
+    With target_ci set, results are consumed in batches of batch_size, and
+    consumption stops after the first batch at which the confidence interval
+    of the average waste percentage is at most target_ci wide on each side.
+    The remaining results are never drawn.
+    
     Args:
-        results: List of result dictionaries from scenario executions
+        results: Iterable of result dictionaries from scenario executions
+        histogram_bins: Number of bins for the waste percentage histogram
+        target_ci: Stop once the interval half-width (in percentage points) is this small
+        batch_size: Executions between interval checks
+        confidence: Confidence level of the interval
     
     Returns:
         Dictionary with statistical metrics
     """
-    wasted_pads = [r['wasted_pads'] for r in results]
-    waste_percentages = [r['waste_percentage'] for r in results]
-    messages_sent = [r['messages_sent'] for r in results]
-    used_pads = [r['used_pads'] for r in results]
-    
-    return {
-        'avg_wasted': statistics.mean(wasted_pads),
-        'std_wasted': statistics.stdev(wasted_pads) if len(wasted_pads) > 1 else 0,
-        'min_wasted': min(wasted_pads),
-        'max_wasted': max(wasted_pads),
-        'avg_waste_pct': statistics.mean(waste_percentages),
-        'std_waste_pct': statistics.stdev(waste_percentages) if len(waste_percentages) > 1 else 0,
-        'avg_messages': statistics.mean(messages_sent),
-        'avg_used': statistics.mean(used_pads),
-        'executions': len(results)
-    }
+    accumulator = ScenarioStatistics(histogram_bins)
+    for count, result in enumerate(results, 1):
+        accumulator.add(result)
+        if (target_ci is not None and count % batch_size == 0
+                and accumulator.waste_pct.confidence_half_width(confidence) <= target_ci):
+            break
+    return accumulator.summary(confidence)
+
+
+def with_progress(results, total, stream=sys.stderr, interval=0.5):
+    """
+    Pass results through while showing a running count on an interactive stream.
+    
+    The count is written in place (using backspaces) at most every `interval`
+    seconds and erased at the end, so redirected output is unaffected.
+    
+    Args:
+        results: Iterable of results
+        total: Expected number of results
+        stream: Stream for the progress display (shown only if it is a terminal)
+        interval: Minimum seconds between updates
+    
+    Yields:
+        The results, unchanged
+    """
+    if not stream.isatty():
+        yield from results
+        return
+    
+    shown = ""
+    last = time.monotonic()
+    for done, result in enumerate(results, 1):
+        yield result
+        now = time.monotonic()
+        if now - last >= interval:
+            last = now
+            text = f"{done}/{total} ({done / total:.0%})"
+            stream.write("\b" * len(shown) + text + " " * max(0, len(shown) - len(text))
+                         + "\b" * max(0, len(shown) - len(text)))
+            stream.flush()
+            shown = text
+    if shown:
+        stream.write("\b" * len(shown) + " " * len(shown) + "\b" * len(shown))
+        stream.flush()
+
+
+def static_baseline(m):
+    """Waste percentage of a static m-way partition when only one party sends."""
+    return (m - 1) / m * 100
 
 
-def print_header():
+def scenario_title(active, m):
+    """Return the long title of a scenario, e.g. 'Scenario S.2 (2 active parties)'."""
+    parties = "party" if active == 1 else "parties"
+    return f"Scenario {scenario_name(active, m)} ({active} active {parties})"
+
+
+def print_header(m=4):
     """Print the header for the simulation."""
     print("\n" + "=" * 80)
     print("Multi-Party One-Time Pad Protocol Simulation")
-    print("Protocol: Parallel Pairs (m=4)")
+    print(f"Protocol: Parallel Pairs (m={m})")
     print("=" * 80)
 
 
-def print_configuration(n, d, executions, min_msg_len, max_msg_len):
+def print_configuration(n, d, executions, min_msg_len, max_msg_len, policy, m=4):
     """Print the simulation configuration."""
     print("\nConfiguration:")
     print(f"  Total pads (n): {n}")
     print(f"  Gap parameter (d): {d}")
     print(f"  Executions per scenario: {executions}")
     print(f"  Message length range: [{min_msg_len}, {max_msg_len}]")
-    print(f"  Static partition baseline (worst case): 75.0%")
+    print(f"  Rejection policy: {policy}")
+    print(f"  Static partition baseline (worst case): {static_baseline(m):.1f}%")
 
 
 def print_scenario_results(scenario_name, stats, n):
@@ -58,46 +115,221 @@ def print_scenario_results(scenario_name, stats, n):
     print(f"  Wasted pads range: [{stats['min_wasted']}, {stats['max_wasted']}]")
     print(f"  Average waste percentage: {stats['avg_waste_pct']:.2f}% ± {stats['std_waste_pct']:.2f}%")
     print(f"  Average messages sent: {stats['avg_messages']:.1f}")
+    if 'avg_collisions' in stats:
+        print(f"  Average collisions: {stats['avg_collisions']:.2f} messages, {stats['avg_collided_pads']:.1f} pads")
+        print(f"  Max messages in flight on a link: {stats['max_in_flight']}")
+    if 'avg_rebalances' in stats:
+        print(f"  Average zone handoffs: {stats['avg_rebalances']:.2f}")
+    if 'avg_rejected_zone' in stats:
+        print(f"  Average rejected attempts: {stats['avg_rejected_zone']:.2f} at the zone bound, "
+              f"{stats['avg_rejected_gap']:.2f} at the partner gap")
 
 
-def print_summary_table(s1_stats, s2_stats, s4_stats):
-    """Print a summary table comparing all scenarios."""
+def print_histogram(stats, width=40):
+    """Print waste percentage quantiles and a text histogram for one scenario."""
+    quantiles = ", ".join(f"p{q * 100:g} {value:.2f}%" for q, value in stats['waste_pct_quantiles'].items())
+    print(f"  Waste percentage quantiles (estimated): {quantiles}")
+    
+    histogram = stats['histogram']
+    edges = histogram.edges()
+    peak = max(histogram.counts)
+    for i, count in enumerate(histogram.counts):
+        if count:
+            bar = "#" * max(1, round(width * count / peak))
+            print(f"    {edges[i]:>5.1f}% - {edges[i + 1]:>5.1f}%  {count:>10}  {bar}")
+
+
+def print_summary_table(scenario_stats, m=4):
+    """
+    Print a summary table comparing all scenarios.
+    
+    Args:
+        scenario_stats: List of (active, stats) tuples, one per scenario
+        m: Number of parties
+    """
     print("\n" + "=" * 80)
     print("Summary Table")
     print("=" * 80)
     print(f"{'Scenario':<12} {'Avg Wasted':<15} {'Std Dev':<12} {'Min':<8} {'Max':<8} {'Waste %':<12}")
     print("-" * 80)
     
-    # S.1
-    print(f"{'S.1 (x=1)':<12} "
-          f"{s1_stats['avg_wasted']:>8.1f} pads   "
-          f"{s1_stats['std_wasted']:>8.1f}    "
-          f"{s1_stats['min_wasted']:>6}  "
-          f"{s1_stats['max_wasted']:>6}  "
-          f"{s1_stats['avg_waste_pct']:>6.2f}%")
-    
-    # S.2
-    print(f"{'S.2 (x=2)':<12} "
-          f"{s2_stats['avg_wasted']:>8.1f} pads   "
-          f"{s2_stats['std_wasted']:>8.1f}    "
-          f"{s2_stats['min_wasted']:>6}  "
-          f"{s2_stats['max_wasted']:>6}  "
-          f"{s2_stats['avg_waste_pct']:>6.2f}%")
-    
-    # S.4
-    print(f"{'S.4 (x=4)':<12} "
-          f"{s4_stats['avg_wasted']:>8.1f} pads   "
-          f"{s4_stats['std_wasted']:>8.1f}    "
-          f"{s4_stats['min_wasted']:>6}  "
-          f"{s4_stats['max_wasted']:>6}  "
-          f"{s4_stats['avg_waste_pct']:>6.2f}%")
+    for active, stats in scenario_stats:
+        label = f"{scenario_name(active, m)} (x={active})"
+        print(f"{label:<12} "
+              f"{stats['avg_wasted']:>8.1f} pads   "
+              f"{stats['std_wasted']:>8.1f}    "
+              f"{stats['min_wasted']:>6}  "
+              f"{stats['max_wasted']:>6}  "
+              f"{stats['avg_waste_pct']:>6.2f}%")
     
     print("-" * 80)
-    print(f"{'Baseline':<12} {'(static partition worst case)':>45} {'75.00%':>12}")
+    print(f"{'Baseline':<12} {'(static partition worst case)':>45} {f'{static_baseline(m):.2f}%':>12}")
+    print("=" * 80)
+
+
+def print_rebalance_table(scenario_stats, rebalanced_stats, m=4):
+    """
+    Print static-split and rebalanced waste side by side.
+    
+    Args:
+        scenario_stats: List of (active, stats) tuples for the static split
+        rebalanced_stats: List of (active, stats) tuples with rebalancing, same order
+        m: Number of parties
+    """
+    print("\n" + "=" * 80)
+    print("Static Split vs Dynamic Rebalancing")
+    print("=" * 80)
+    print(f"{'Scenario':<12} {'Static Wasted':<16} {'Static %':<11} {'Rebal. Wasted':<16} {'Rebal. %':<11} {'Handoffs':<8}")
+    print("-" * 80)
+    
+    for (active, static), (_, rebalanced) in zip(scenario_stats, rebalanced_stats):
+        label = f"{scenario_name(active, m)} (x={active})"
+        print(f"{label:<12} "
+              f"{static['avg_wasted']:>8.1f} pads    "
+              f"{static['avg_waste_pct']:>6.2f}%    "
+              f"{rebalanced['avg_wasted']:>8.1f} pads    "
+              f"{rebalanced['avg_waste_pct']:>6.2f}%    "
+              f"{rebalanced['avg_rebalances']:>6.2f}")
+    
     print("=" * 80)
 
+
+def print_precision_table(scenario_stats, args, label=""):
+    """
+    Print how many executions each scenario needed to reach the target interval.
+    
+    Args:
+        scenario_stats: List of (active, stats) tuples
+        args: Parsed command-line arguments (target_ci, confidence, max_executions, m)
+        label: Suffix for the table title (e.g. ", rebalanced")
+    """
+    print("\n" + "=" * 80)
+    print(f"Adaptive Sampling{label}: target ±{args.target_ci:g}% at {args.confidence:.0%} confidence")
+    print("=" * 80)
+    print(f"{'Scenario':<12} {'Executions':>12} {'Avg Waste %':>14} {'CI Half-Width':>16}   Status")
+    print("-" * 80)
+    
+    for active, stats in scenario_stats:
+        label = f"{scenario_name(active, args.m)} (x={active})"
+        status = "reached" if stats['ci_waste_pct'] <= args.target_ci else "budget exhausted"
+        print(f"{label:<12} {stats['executions']:>12} {stats['avg_waste_pct']:>13.2f}% "
+              f"{'±':>7}{stats['ci_waste_pct']:.3f}%   {status}")
+    
+    total = sum(stats['executions'] for _, stats in scenario_stats)
+    print("-" * 80)
+    print(f"{'Total':<12} {total:>12}   (fixed budget: {args.max_executions * len(scenario_stats)})")
+    print("=" * 80)
+
+
+def run_executions(args, active, rebalance=False):
+    """
+    Run one scenario with the engine selected on the command line.
+    
+    Args:
+        args: Parsed command-line arguments
+        active: Number of active parties (x) out of args.m
+        rebalance: Run with dynamic zone rebalancing (scalar engine only)
+    
+    Returns:
+        Iterator over the results of each execution (args.max_executions of
+        them when sampling adaptively, else args.executions)
+    """
+    num_executions = args.executions if args.target_ci is None else args.max_executions
+    if args.engine == 'numpy':
+        import vectorized
+        return vectorized.iter_executions(
+            active, num_executions, args.n, args.d,
+            args.min_msg_len, args.max_msg_len, seed=args.seed, policy=args.policy,
+            m=args.m, zone_sizes=args.zone_sizes, distribution=args.distribution
+        )
+    
+    scenario_func = run_scenario
+    scenario_kwargs = {
+        'active': active,
+        'm': args.m,
+        'zone_sizes': args.zone_sizes,
+        'policy': args.policy,
+    }
+    if args.engine == 'event':
+        from network import run_network_scenario
+        scenario_func = run_network_scenario
+        scenario_kwargs.update(latency=args.latency, send_rate=args.send_rate,
+                               max_in_flight=args.max_in_flight)
+    else:
+        scenario_kwargs['audit'] = args.audit
+        if rebalance:
+            scenario_kwargs['rebalance'] = True
+        if args.instrument:
+            scenario_kwargs['instrument'] = True
+        if args.recorder is not None:
+            scenario_kwargs['recorder'] = args.recorder
+    
+    if args.workers is not None:
+        from parallel import iter_parallel_executions
+        if args.distribution is not None:
+            from workload import Workload
+            scenario_kwargs['rng_factory'] = functools.partial(Workload, args.distribution, block_size=4096)
+        return iter_parallel_executions(
+            scenario_func, num_executions, args.n, args.d,
+            args.min_msg_len, args.max_msg_len,
+            seed=args.seed, workers=args.workers,
+            stream=scenario_name(active, args.m), **scenario_kwargs
+        )
+    
+    rng = None
+    if args.distribution is not None:
+        # One block-drawn workload for the whole scenario, seeded per scenario
+        from parallel import derive_seed
+        from workload import Workload
+        seed = None if args.seed is None else derive_seed(args.seed, 0, f"workload:{scenario_name(active, args.m)}")
+        rng = Workload(args.distribution, seed)
+    
+    return iter_executions(
+        scenario_func, num_executions, args.n, args.d,
+        args.min_msg_len, args.max_msg_len, rng=rng, **scenario_kwargs
+    )
+
+
+def scenario_statistics(args, active, rebalance=False, writer=None):
+    """
+    Run one scenario and summarize its results as they come in.
+    
+    Args:
+        args: Parsed command-line arguments
+        active: Number of active parties (x) out of args.m
+        rebalance: Run with dynamic zone rebalancing
+        writer: Optional columnar.ColumnarWriter that also stores every result
+    
+    Returns:
+        Statistics dictionary from calculate_statistics()
+    """
+    if args.engine == 'analytic':
+        from analytic import waste_distribution, distribution_statistics
+        waste, messages = waste_distribution(
+            args.n, args.d, active, args.min_msg_len, args.max_msg_len, distribution=args.distribution,
+            policy=args.policy, m=args.m, zone_sizes=args.zone_sizes
+        )
+        return distribution_statistics(args.n, waste, messages)
+    
+    total = args.executions if args.target_ci is None else args.max_executions
+    results = run_executions(args, active, rebalance)
+    stream = results if writer is None else writer.record(results)
+    try:
+        return calculate_statistics(with_progress(stream, total), args.histogram_bins,
+                                    args.target_ci, args.executions, args.confidence)
+    finally:
+        # Stops any executions still pending when adaptive sampling ends early
+        results.close()
+
+
 def main():
     """Main function to run the simulation."""
+    if sys.argv[1:2] == ['sweep']:
+        # Parameter grid with cached results: python main.py sweep n=1000,10000 ...
+        from sweep import main as sweep_main
+        sweep_main(sys.argv[2:])
+        return
+    
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description='Multi-Party OTP Protocol Simulator')
     parser.add_argument('--n', type=int, default=1000, 
@@ -112,62 +344,199 @@ def main():
                        help='Maximum message length (default: 50)')
     parser.add_argument('--seed', type=int, default=None,
                        help='Random seed for reproducibility (default: None)')
+    parser.add_argument('--m', type=int, default=4,
+                       help='Number of parties, even (default: 4)')
+    parser.add_argument('--active', type=int, nargs='+', default=None,
+                       help='Numbers of active parties x to simulate (default: 1 2 4, or 1 m/2 m)')
+    parser.add_argument('--zone-sizes', type=int, nargs='+', default=None,
+                       help='Sizes of the m/2 zones, summing to n (default: even split)')
+    parser.add_argument('--engine', choices=['scalar', 'numpy', 'event', 'analytic'], default='scalar',
+                       help='Simulation engine: scalar reference loop, batched NumPy, '
+                            'discrete-event network with delivery latency, '
+                            'or exact waste distribution for S.1/S.2 (default: scalar)')
+    parser.add_argument('--latency', default='exp:1.0',
+                       help='Event engine message latency: const:T, exp:MEAN, uniform:LOW:HIGH '
+                            'or lognormal:MU:SIGMA (default: exp:1.0)')
+    parser.add_argument('--send-rate', type=float, default=1.0,
+                       help='Event engine send attempts per time unit per active party (default: 1.0)')
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                       help='Event engine cap on undelivered messages per link (default: no cap)')
+    parser.add_argument('--distribution', default=None,
+                       help='Message length distribution, drawn in NumPy blocks: uniform, geometric[:P], '
+                            'zipf[:S], bimodal[:W] or empirical:PATH (default: uniform via the random module)')
+    parser.add_argument('--policy', choices=REJECTION_POLICIES, default='retry',
+                       help='Handling of message lengths that do not fit: retry, truncate or drop (default: retry)')
+    parser.add_argument('--audit', choices=['off', 'interval', 'full'], default='interval',
+                       help='Collision audit level for the scalar engine (default: interval)')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Run executions across N processes with per-execution seeds (default: serial)')
+    parser.add_argument('--target-ci', type=float, default=None,
+                       help='Adaptive sampling: run batches of --executions until the confidence interval '
+                            'of average waste %% is within ±TARGET_CI percentage points (default: fixed count)')
+    parser.add_argument('--confidence', type=float, default=0.95,
+                       help='Confidence level for --target-ci (default: 0.95)')
+    parser.add_argument('--max-executions', type=int, default=100000,
+                       help='Execution budget per scenario for --target-ci (default: 100000)')
+    parser.add_argument('--histogram', action='store_true',
+                       help='Print waste percentage quantiles and a histogram per scenario')
+    parser.add_argument('--histogram-bins', type=int, default=20,
+                       help='Number of waste percentage histogram bins (default: 20)')
+    parser.add_argument('--instrument', action='store_true',
+                       help='Count rejected send attempts by reason, zone bound or partner gap (scalar engine)')
+    parser.add_argument('--record', default=None, metavar='TRACE',
+                       help='Record every send attempt to a binary trace file '
+                            '(replay with: python tracefile.py TRACE; scalar engine, serial)')
+    parser.add_argument('--output', default=None,
+                       help='Also write every execution result as binary columns to this directory '
+                            '(summarize with: python columnar.py DIR)')
+    parser.add_argument('--rebalance', action='store_true',
+                       help='Also run each scenario with dynamic zone rebalancing and compare it '
+                            'with the static split (scalar engine)')
     
     args = parser.parse_args()
     
+    if args.m < 2 or args.m % 2:
+        parser.error("--m must be a positive even number")
+    if args.active is None and args.engine == 'analytic':
+        args.active = [1, 2]
+    elif args.active is None:
+        args.active = sorted({1, args.m // 2, args.m}) if args.m != 4 else [1, 2, 4]
+    if any(not 1 <= x <= args.m for x in args.active):
+        parser.error(f"--active values must be between 1 and {args.m}")
+    if args.zone_sizes is not None and (len(args.zone_sizes) != args.m // 2 or sum(args.zone_sizes) != args.n
+                                        or min(args.zone_sizes) < 1):
+        parser.error(f"--zone-sizes needs {args.m // 2} positive sizes summing to n")
+    if not 1 <= args.min_msg_len <= args.max_msg_len:
+        parser.error("message lengths must satisfy 1 <= --min-msg-len <= --max-msg-len")
+    
+    if args.engine == 'event':
+        from network import make_latency
+        try:
+            make_latency(args.latency)
+        except ValueError as e:
+            parser.error(str(e))
+    
+    if args.engine == 'analytic':
+        if any(x not in (1, 2) for x in args.active):
+            parser.error("the analytic engine covers S.1 and S.2 only (--active 1 2)")
+        if args.workers is not None or args.rebalance or args.target_ci is not None or args.histogram:
+            parser.error("--workers, --rebalance, --target-ci and --histogram need a simulation engine")
+    
+    if args.distribution is not None:
+        if args.engine == 'event':
+            parser.error("--distribution is not supported with the event engine")
+        from workload import make_distribution
+        try:
+            args.distribution = make_distribution(args.distribution, args.min_msg_len, args.max_msg_len)
+        except ValueError as e:
+            parser.error(str(e))
+        # An empirical distribution brings its own length range
+        args.min_msg_len, args.max_msg_len = args.distribution.low, args.distribution.high
+    
+    if args.workers is not None:
+        if args.workers < 1:
+            parser.error("--workers must be at least 1")
+        if args.engine == 'numpy':
+            parser.error("--workers is not supported with the numpy engine")
+    if args.executions < 1:
+        parser.error("--executions must be at least 1")
+    if args.target_ci is not None:
+        if args.target_ci <= 0:
+            parser.error("--target-ci must be positive")
+        if not 0 < args.confidence < 1:
+            parser.error("--confidence must be between 0 and 1")
+        if args.max_executions < args.executions:
+            parser.error("--max-executions must be at least --executions")
+    if args.histogram_bins < 1:
+        parser.error("--histogram-bins must be at least 1")
+    if args.output is not None and args.engine == 'analytic':
+        parser.error("--output needs a simulation engine")
+    if args.instrument and args.engine != 'scalar':
+        parser.error("--instrument is only supported with the scalar engine")
+    if args.record is not None and (args.engine != 'scalar' or args.workers is not None):
+        parser.error("--record needs the serial scalar engine")
+    if args.rebalance and args.engine != 'scalar':
+        parser.error("--rebalance is only supported with the scalar engine")
+    
     # Set random seed if provided
     if args.seed is not None:
-        import random
         random.seed(args.seed)
         print(f"Random seed set to: {args.seed}")
+    elif args.workers is not None:
+        # Parallel runs derive every execution's seed from one base seed
+        args.seed = random.SystemRandom().randrange(2**32)
+        print(f"Random seed chosen: {args.seed}")
     
     # Print header and configuration
-    print_header()
-    print_configuration(args.n, args.d, args.executions, args.min_msg_len, args.max_msg_len)
+    print_header(args.m)
+    print_configuration(args.n, args.d, args.executions, args.min_msg_len, args.max_msg_len, args.policy, args.m)
+    if args.target_ci is not None:
+        print(f"  Adaptive sampling: batches of {args.executions} until ±{args.target_ci:g}% "
+              f"at {args.confidence:.0%} confidence (max {args.max_executions})")
+    if args.distribution is not None:
+        print(f"  Length distribution: {args.distribution.name} (mean {args.distribution.mean():.1f})")
     
     print("\n" + "=" * 80)
     print("Running simulations...")
     print("=" * 80)
     
-    # Run Scenario S.1
-    print("\nRunning Scenario S.1 (1 active party)...", end=" ", flush=True)
-    s1_results = run_multiple_executions(
-        run_scenario_1, args.executions, args.n, args.d, 
-        args.min_msg_len, args.max_msg_len
-    )
-    s1_stats = calculate_statistics(s1_results)
-    print("Done")
-    
-    # Run Scenario S.2
-    print("Running Scenario S.2 (2 active parties)...", end=" ", flush=True)
-    s2_results = run_multiple_executions(
-        run_scenario_2, args.executions, args.n, args.d,
-        args.min_msg_len, args.max_msg_len
-    )
-    s2_stats = calculate_statistics(s2_results)
-    print("Done")
-    
-    # Run Scenario S.4
-    print("Running Scenario S.4 (4 active parties)...", end=" ", flush=True)
-    s4_results = run_multiple_executions(
-        run_scenario_4, args.executions, args.n, args.d,
-        args.min_msg_len, args.max_msg_len
-    )
-    s4_stats = calculate_statistics(s4_results)
-    print("Done")
+    args.recorder = None
+    if args.record is not None:
+        from tracefile import TraceWriter
+        args.recorder = TraceWriter(args.record)
+    
+    writer = None
+    if args.output is not None:
+        from columnar import ColumnarWriter
+        writer = ColumnarWriter(args.output)
+    
+    print()
+    scenario_stats = []
+    for active in args.active:
+        print(f"Running {scenario_title(active, args.m)}...", end=" ", flush=True)
+        scenario_stats.append((active, scenario_statistics(args, active, writer=writer)))
+        print("Done")
+    
+    rebalanced_stats = []
+    if args.rebalance:
+        # Same seed for both passes, so they start from the same party choices
+        if args.seed is not None:
+            random.seed(args.seed)
+        for active in args.active:
+            print(f"Running {scenario_title(active, args.m)} with rebalancing...", end=" ", flush=True)
+            rebalanced_stats.append((active, scenario_statistics(args, active, rebalance=True, writer=writer)))
+            print("Done")
+    
+    if writer is not None:
+        writer.close()
+        print(f"\n{writer.rows} execution results written to {args.output}")
+    if args.recorder is not None:
+        args.recorder.close()
+        print(f"\n{args.recorder.records} trace records written to {args.record}")
     
     # Print detailed results
     print("\n" + "=" * 80)
     print("Detailed Results")
     print("=" * 80)
     
-    print_scenario_results("Scenario S.1 (1 active party)", s1_stats, args.n)
-    print_scenario_results("Scenario S.2 (2 active parties)", s2_stats, args.n)
-    print_scenario_results("Scenario S.4 (4 active parties)", s4_stats, args.n)
+    for active, stats in scenario_stats:
+        print_scenario_results(scenario_title(active, args.m), stats, args.n)
+        if args.histogram:
+            print_histogram(stats)
+    for active, stats in rebalanced_stats:
+        print_scenario_results(f"{scenario_title(active, args.m)}, rebalanced", stats, args.n)
+        if args.histogram:
+            print_histogram(stats)
     
     # Print summary table
-    print_summary_table(s1_stats, s2_stats, s4_stats)
-
+    print_summary_table(scenario_stats, args.m)
+    if rebalanced_stats:
+        print_rebalance_table(scenario_stats, rebalanced_stats, args.m)
+    if args.target_ci is not None:
+        print_precision_table(scenario_stats, args)
+        if rebalanced_stats:
+            print_precision_table(rebalanced_stats, args, ", rebalanced")
+    
     print("Simulation complete!")
 
 if __name__ == "__main__":
@@ -0,0 +1,208 @@
+import heapq
+import math
+import random
+
+from protocol import Protocol, party_names
+from simulator import REJECTION_POLICIES, scenario_name
+
+
+# Event kinds, ordered so a delivery and a send at the same instant deliver first
+# (queue entries are (time, kind, seq, party, value): seq only breaks ties within a kind)
+DELIVER = 0
+SEND = 1
+
+
+def make_latency(spec):
+    """
+    Build a latency sampler from a textual spec.
+    
+    Supported specs:
+        'const:T'             - every message takes T
+        'exp:MEAN'            - exponential with the given mean
+        'uniform:LOW:HIGH'    - uniform on [LOW, HIGH]
+        'lognormal:MU:SIGMA'  - log-normal with parameters MU, SIGMA
+    
+    Args:
+        spec: Latency spec string
+    
+    Returns:
+        Function taking a random.Random-like generator and returning a latency
+    """
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(':')] if params else []
+    
+    if kind == 'const' and len(values) == 1:
+        delay = values[0]
+        return lambda rng: delay
+    if kind == 'exp' and len(values) == 1:
+        rate = 1.0 / values[0]
+        return lambda rng: rng.expovariate(rate)
+    if kind == 'uniform' and len(values) == 2:
+        low, high = values
+        return lambda rng: rng.uniform(low, high)
+    if kind == 'lognormal' and len(values) == 2:
+        mu, sigma = values
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    
+    raise ValueError(f"Invalid latency spec: {spec}")
+
+
+def run_network_scenario(n, d, min_msg_length=1, max_msg_length=50, rng=None, active=4, m=4, zone_sizes=None,
+                         latency='exp:1.0', send_rate=1.0, max_in_flight=None, policy='retry'):
+    """
+    Scenario S.x with message delivery modelled by a discrete-event simulation.
+    
+    Each active party sends at Poisson times (rate send_rate). Every message
+    carries the sender's new last used index to its zone partner and arrives
+    after a random latency. A party checks safety against the latest position
+    it has received from its partner, which may be stale, so pads can collide;
+    collisions are counted rather than raised. Parties and their zones come
+    from Protocol, so the layout matches the synchronous simulator.
+    
+    Args:
+        n: Total number of pads
+        d: Gap parameter
+        min_msg_length: Minimum message length
+        max_msg_length: Maximum message length
+        rng: Random number generator (default: the global random module)
+        active: Number of active parties (x)
+        m: Number of parties (even)
+        zone_sizes: Optional list of m/2 zone sizes summing to n
+        latency: Latency spec for make_latency(), or a sampler function
+        send_rate: Send attempts per unit of time for each active party
+        max_in_flight: Maximum undelivered messages per link; a party with that
+            many messages in flight waits for its next send time (default: no limit)
+        policy: Handling of lengths that do not fit (see REJECTION_POLICIES)
+    
+    Returns:
+        Dictionary with simulation results, including collision and in-flight counts
+    """
+    if policy not in REJECTION_POLICIES:
+        raise ValueError(f"Unknown rejection policy: {policy}")
+    if not 1 <= active <= m:
+        raise ValueError(f"Number of active parties must be between 1 and {m}, got {active}")
+    if rng is None:
+        rng = random
+    sample_latency = make_latency(latency) if isinstance(latency, str) else latency
+    
+    layout = Protocol(n=n, d=d, audit='off', m=m, zone_sizes=zone_sizes)
+    parties = layout.party_list
+    all_parties = party_names(m)
+    
+    # Randomly select the active parties, as in simulator.run_scenario
+    if active == 1:
+        active_parties = [rng.choice(all_parties)]
+    elif active == m:
+        active_parties = all_parties
+    else:
+        active_parties = rng.sample(all_parties, active)
+    
+    # view[p]: partner's last used index as last delivered to p
+    view = [parties[p ^ 1].get_last_used_index() for p in range(m)]
+    # in_flight[p]: undelivered messages on the link from p to its partner
+    in_flight = [0] * m
+    max_seen_in_flight = 0
+    
+    messages_sent = 0
+    messages_attempted = 0
+    blocked_sends = 0
+    collisions = 0
+    events = 0
+    
+    queue = []
+    seq = 0
+    for name in active_parties:
+        heapq.heappush(queue, (rng.expovariate(send_rate), SEND, seq, layout.party_ids[name], 0))
+        seq += 1
+    
+    # Hot-loop locals
+    now = 0.0
+    heappush = heapq.heappush
+    heappop = heapq.heappop
+    uniform01 = rng.random
+    log = math.log
+    mean_gap = 1.0 / send_rate
+    
+    while queue:
+        now, kind, _, p, value = heappop(queue)
+        events += 1
+        
+        if kind == DELIVER:
+            in_flight[p] -= 1
+            # Keep the most advanced position (messages may arrive out of order)
+            partner = p ^ 1
+            if (value - view[partner]) * parties[p].direction > 0:
+                view[partner] = value
+            continue
+        
+        party = parties[p]
+        if max_in_flight is not None and in_flight[p] >= max_in_flight:
+            blocked_sends += 1
+            heappush(queue, (now - mean_gap * log(1.0 - uniform01()), SEND, seq, p, 0))
+            seq += 1
+            continue
+        
+        # The view only moves towards us, so a party below the minimum is done
+        capacity = party.get_capacity(view[p], d)
+        if capacity < min_msg_length:
+            continue
+        
+        msg_length = rng.randint(min_msg_length, max_msg_length)
+        messages_attempted += 1
+        if msg_length > capacity:
+            if policy == 'truncate':
+                msg_length = capacity
+            elif policy == 'retry':
+                while msg_length > capacity:
+                    msg_length = rng.randint(min_msg_length, max_msg_length)
+                    messages_attempted += 1
+            else:
+                continue
+        
+        start, stop = party.consume_range(msg_length)
+        messages_sent += 1
+        
+        # Compare against the partner's true consumed run
+        partner_start, partner_stop = parties[p ^ 1].get_used_range()
+        if start < partner_stop and partner_start < stop:
+            collisions += 1
+        
+        pending = in_flight[p] + 1
+        in_flight[p] = pending
+        if pending > max_seen_in_flight:
+            max_seen_in_flight = pending
+        
+        heappush(queue, (now + sample_latency(rng), DELIVER, seq, p, party.get_last_used_index()))
+        heappush(queue, (now - mean_gap * log(1.0 - uniform01()), SEND, seq + 1, p, 0))
+        seq += 2
+    
+    # Pads claimed by both partners count once as used and once as collided
+    consumed = 0
+    collided_pads = 0
+    for zone in range(m // 2):
+        right_start, right_stop = parties[2 * zone].get_used_range()
+        left_start, left_stop = parties[2 * zone + 1].get_used_range()
+        consumed += (right_stop - right_start) + (left_stop - left_start)
+        collided_pads += max(0, min(right_stop, left_stop) - max(right_start, left_start))
+    used = consumed - collided_pads
+    
+    result = {'scenario': scenario_name(active, m)}
+    if active == 1:
+        result['active_party'] = active_parties[0]
+    else:
+        result['active_parties'] = active_parties
+    result.update({
+        'total_pads': n,
+        'used_pads': used,
+        'wasted_pads': n - used,
+        'waste_percentage': ((n - used) / n) * 100,
+        'messages_sent': messages_sent,
+        'messages_attempted': messages_attempted,
+        'collisions': collisions,
+        'collided_pads': collided_pads,
+        'blocked_sends': blocked_sends,
+        'max_in_flight': max_seen_in_flight,
+        'events': events,
+        'sim_time': now
+    })
+    return result
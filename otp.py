@@ -0,0 +1,341 @@
+import argparse
+import mmap
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from protocol import Protocol
+
+
+# Bytes written per call when creating a pad file
+CREATE_CHUNK = 1 << 24
+
+# Buffers below this size are XORed as Python integers, which beats NumPy's per-call overhead
+SMALL_XOR = 512
+
+
+def create_pad_file(path, n, pad_size=1):
+    """
+    Write a pad file of n pads of fresh random key material (os.urandom).
+    
+    Args:
+        path: Output file (replaced)
+        n: Number of pads
+        pad_size: Bytes per pad
+    """
+    remaining = n * pad_size
+    with open(path, 'wb') as f:
+        while remaining > 0:
+            chunk = min(remaining, CREATE_CHUNK)
+            f.write(os.urandom(chunk))
+            remaining -= chunk
+
+
+def xor_into(out, data, pad):
+    """
+    XOR two equal-length buffers into out, without copying the inputs.
+    
+    Small buffers are XORed as two Python integers; larger ones with NumPy
+    on 8-byte words where possible, then on the remaining bytes.
+    
+    Args:
+        out: Writable buffer (bytearray, memoryview or NumPy array) of len(data) bytes
+        data: Message buffer
+        pad: Key material buffer (e.g. a PadFile slice)
+    
+    Returns:
+        out
+    """
+    size = len(data)
+    if len(pad) != size or len(out) != size:
+        raise ValueError(f"Buffer sizes differ: data {size}, pad {len(pad)}, out {len(out)}")
+    if size < SMALL_XOR:
+        out[:] = (int.from_bytes(data, 'little') ^ int.from_bytes(pad, 'little')).to_bytes(size, 'little')
+        return out
+    words = size // 8 * 8
+    data_bytes = np.frombuffer(data, np.uint8)
+    pad_bytes = np.frombuffer(pad, np.uint8)
+    out_bytes = np.frombuffer(out, np.uint8)
+    if words:
+        np.bitwise_xor(data_bytes[:words].view(np.uint64), pad_bytes[:words].view(np.uint64),
+                       out=out_bytes[:words].view(np.uint64))
+    if words < size:
+        np.bitwise_xor(data_bytes[words:], pad_bytes[words:], out=out_bytes[words:])
+    return out
+
+
+class PadFile:
+    """
+    Read-only memory map of a file of one-time pads.
+    
+    Pad i is bytes [i * pad_size, (i + 1) * pad_size) of the file. Slices are
+    memoryviews into the map, so no key material is copied; the OS pages it
+    in on first use.
+    """
+    
+    def __init__(self, path, pad_size=1):
+        """
+        Args:
+            path: Pad file (its size must be a multiple of pad_size)
+            pad_size: Bytes per pad
+        """
+        self.path = path
+        self.pad_size = pad_size
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0 or size % pad_size:
+            self._file.close()
+            raise ValueError(f"{path}: size {size} is not a positive multiple of the pad size {pad_size}")
+        self.n = size // pad_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+    
+    def pads(self, start, stop):
+        """Return pads [start, stop) as a memoryview (no copy)."""
+        if not 0 <= start <= stop <= self.n:
+            raise IndexError(f"Pad range [{start}, {stop}) outside [0, {self.n})")
+        return self._view[start * self.pad_size:stop * self.pad_size]
+    
+    def pad_indices(self, indices):
+        """
+        Return the pads of a contiguous list of indices, e.g. from Party.consume_pads.
+        
+        Args:
+            indices: Consecutive ascending pad indices
+        
+        Returns:
+            memoryview over those pads (no copy)
+        """
+        if not indices:
+            return self._view[0:0]
+        start, stop = indices[0], indices[-1] + 1
+        if stop - start != len(indices):
+            raise ValueError("Pad indices are not a contiguous ascending run")
+        return self.pads(start, stop)
+    
+    def close(self):
+        """Release the map; slices handed out must no longer be in use."""
+        self._view.release()
+        self._map.close()
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class OTPChannel:
+    """
+    One-time-pad encryption with pads allocated by the Parallel Pairs protocol.
+    
+    A message of B bytes takes ceil(B / pad_size) pads. The sender's pads
+    come from Protocol.attempt_send_batch, so the protocol's gap rule and
+    audit guarantee that no pad is used twice; the unused tail of the last
+    pad is discarded. The ciphertext travels with the index of its first
+    pad, which is all the receiver (holding a copy of the pad file) needs to
+    decrypt.
+    """
+    
+    def __init__(self, protocol, pad_file):
+        """
+        Args:
+            protocol: Protocol allocating the pads (its n must match the pad file)
+            pad_file: PadFile with the shared key material
+        """
+        if protocol.n != pad_file.n:
+            raise ValueError(f"Protocol has {protocol.n} pads, pad file has {pad_file.n}")
+        self.protocol = protocol
+        self.pad_file = pad_file
+    
+    def pads_needed(self, size):
+        """Return the number of pads a message of `size` bytes takes."""
+        return -(-size // self.pad_file.pad_size)
+    
+    def encrypt(self, party, plaintext, out=None):
+        """
+        Encrypt one message from a party.
+        
+        Args:
+            party: Name or id of the sending party
+            plaintext: Message bytes (any buffer)
+            out: Optional writable buffer of len(plaintext) bytes for the ciphertext
+        
+        Returns:
+            (first_pad, ciphertext), or None if the protocol rejects the
+            message (the party has too few safe pads left)
+        """
+        size = len(plaintext)
+        pads = max(1, self.pads_needed(size))
+        protocol = self.protocol
+        party_id = protocol.party_ids.get(party, party)
+        sender = protocol.party_list[party_id]
+        origin = sender.current_index
+        if not protocol.attempt_send(party_id, pads):
+            return None
+        # Same run as Party.consume_range just took
+        start, stop = (origin, origin + pads) if sender.direction > 0 else (origin + 1 - pads, origin + 1)
+        if out is None:
+            out = bytearray(size)
+        pad = self.pad_file.pads(start, stop)[:size]
+        try:
+            xor_into(out, plaintext, pad)
+        finally:
+            pad.release()
+        return start, out
+    
+    def encrypt_many(self, party, messages):
+        """
+        Encrypt a sequence of messages from one party with a single allocation.
+        
+        Messages are encrypted in order until the first one the protocol
+        rejects (see Protocol.attempt_send_batch).
+        
+        Args:
+            party: Name or id of the sending party
+            messages: Sequence of message buffers
+        
+        Returns:
+            List of (first_pad, ciphertext) for the accepted prefix
+        """
+        lengths = [max(1, self.pads_needed(len(message))) for message in messages]
+        accepted, ranges = self.protocol.attempt_send_batch(party, lengths)
+        results = []
+        for message, (start, stop) in zip(messages[:accepted], ranges):
+            pad = self.pad_file.pads(start, stop)[:len(message)]
+            try:
+                results.append((start, xor_into(bytearray(len(message)), message, pad)))
+            finally:
+                pad.release()
+        return results
+    
+    def decrypt(self, first_pad, ciphertext, out=None):
+        """
+        Decrypt a message with the pads starting at first_pad.
+        
+        Args:
+            first_pad: Pad index returned by encrypt()
+            ciphertext: Ciphertext bytes
+            out: Optional writable buffer of len(ciphertext) bytes for the plaintext
+        
+        Returns:
+            The plaintext buffer
+        """
+        size = len(ciphertext)
+        if out is None:
+            out = bytearray(size)
+        pad = self.pad_file.pads(first_pad, first_pad + self.pads_needed(size))[:size]
+        try:
+            return xor_into(out, ciphertext, pad)
+        finally:
+            pad.release()
+
+
+def benchmark_throughput(pad_file, sizes, min_time=0.5, d=10):
+    """
+    Measure encryption and decryption throughput for each message size.
+    
+    Alice encrypts messages into preallocated buffers until the protocol
+    runs out of pads, then starts over on a fresh protocol; decryption reads
+    the same pads back. Pads are touched once before timing, so both
+    measure memory bandwidth rather than page faults.
+    
+    Args:
+        pad_file: PadFile to encrypt with
+        sizes: Message sizes in bytes, each within Alice's capacity on a fresh protocol
+        min_time: Minimum timed seconds per size and direction
+        d: Gap parameter of the allocating protocol
+    
+    Returns:
+        List of (size, encrypt GB/s, decrypt GB/s)
+    
+    Raises:
+        ValueError: If a size does not fit Alice's capacity, so it could never be encrypted
+    """
+    capacity = Protocol(n=pad_file.n, d=d, audit='off').capacity[0] * pad_file.pad_size
+    too_large = [size for size in sizes if size > capacity]
+    if too_large:
+        raise ValueError(f"Message sizes {too_large} exceed Alice's capacity of {capacity} bytes")
+    
+    warm = pad_file.pads(0, pad_file.n)
+    np.frombuffer(warm, np.uint8).sum(dtype=np.uint64)
+    warm.release()
+    
+    rows = []
+    for size in sizes:
+        message = os.urandom(size)
+        buffer = bytearray(size)
+        channel = OTPChannel(Protocol(n=pad_file.n, d=d, audit='off'), pad_file)
+        
+        processed = 0
+        starts = []
+        begin = time.perf_counter()
+        while time.perf_counter() - begin < min_time:
+            sent = channel.encrypt('Alice', message, buffer)
+            if sent is None:
+                channel = OTPChannel(Protocol(n=pad_file.n, d=d, audit='off'), pad_file)
+                continue
+            starts.append(sent[0])
+            processed += size
+        encrypt_rate = processed / (time.perf_counter() - begin) / 1e9
+        
+        processed = 0
+        begin = time.perf_counter()
+        while time.perf_counter() - begin < min_time:
+            for start in starts:
+                channel.decrypt(start, message, buffer)
+            processed += size * len(starts)
+        decrypt_rate = processed / (time.perf_counter() - begin) / 1e9
+        rows.append((size, encrypt_rate, decrypt_rate))
+    return rows
+
+
+def main():
+    """Round-trip check and encrypt/decrypt throughput benchmark."""
+    parser = argparse.ArgumentParser(description='One-time-pad encryption over a memory-mapped pad file')
+    parser.add_argument('--pad-file', default=None,
+                        help='Existing pad file to use (default: a temporary random file)')
+    parser.add_argument('--pad-mb', type=int, default=256,
+                        help='Size of the temporary pad file in MB (default: 256)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 1024, 16384, 262144, 1 << 20, 16 << 20],
+                        help='Message sizes in bytes (default: 64 B to 16 MB)')
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help='Minimum timed seconds per size and direction (default: 0.5)')
+    args = parser.parse_args()
+    
+    temp_path = None
+    path = args.pad_file
+    if path is None:
+        fd, temp_path = tempfile.mkstemp(suffix='.pads')
+        os.close(fd)
+        print(f"Creating {args.pad_mb} MB pad file...")
+        create_pad_file(temp_path, args.pad_mb << 20)
+        path = temp_path
+    
+    try:
+        with PadFile(path) as pad_file:
+            channel = OTPChannel(Protocol(n=pad_file.n, d=10), pad_file)
+            message = b"Parallel Pairs one-time pad"
+            first_pad, ciphertext = channel.encrypt('Bob', message)
+            assert bytes(channel.decrypt(first_pad, ciphertext)) == message
+            print(f"Round trip OK (Bob used pads from {first_pad})")
+            
+            # Larger messages never fit, even on a fresh protocol
+            capacity = Protocol(n=pad_file.n, d=10, audit='off').capacity[0] * pad_file.pad_size
+            sizes = [size for size in args.sizes if size <= capacity]
+            if len(sizes) < len(args.sizes):
+                print(f"Skipping message sizes above Alice's capacity of {capacity:,} bytes: "
+                      f"{', '.join(str(size) for size in args.sizes if size > capacity)}")
+            print(f"\n{'Message size':>14} {'Encrypt GB/s':>14} {'Decrypt GB/s':>14}")
+            for size, encrypt_rate, decrypt_rate in benchmark_throughput(pad_file, sizes, args.min_time):
+                print(f"{size:>12} B {encrypt_rate:>14.2f} {decrypt_rate:>14.2f}")
+    finally:
+        if temp_path is not None:
+            os.remove(temp_path)
+
+
+if __name__ == "__main__":
+    main()
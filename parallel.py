@@ -0,0 +1,123 @@
+import hashlib
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def derive_seed(base_seed, index, stream=""):
+    """
+    Derive an independent seed for one execution.
+    
+    The seed depends only on the base seed, the stream name and the execution
+    index, so an execution always sees the same random numbers no matter which
+    worker runs it or in what order.
+    
+    Args:
+        base_seed: Seed for the whole run
+        index: Execution index within the stream
+        stream: Stream name separating scenarios (e.g. the scenario function name)
+    
+    Returns:
+        64-bit integer seed
+    """
+    digest = hashlib.sha256(f"{base_seed}:{stream}:{index}".encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+def _run_chunk(scenario_func, start, stop, base_seed, stream, n, d, min_msg_length, max_msg_length,
+               scenario_kwargs, rng_factory=random.Random):
+    """Run executions [start, stop) with per-execution generators (worker entry point)."""
+    results = []
+    
+    for i in range(start, stop):
+        rng = rng_factory(derive_seed(base_seed, i, stream))
+        results.append(scenario_func(n=n, d=d, min_msg_length=min_msg_length,
+                                     max_msg_length=max_msg_length, rng=rng, **scenario_kwargs))
+    
+    return results
+
+
+def iter_parallel_executions(scenario_func, num_executions, n, d, min_msg_length=1, max_msg_length=50,
+                             seed=0, workers=1, chunk_size=None, stream=None, rng_factory=random.Random,
+                             **scenario_kwargs):
+    """
+    Run a scenario across worker processes, yielding results in execution order.
+    
+    Same results as run_parallel_executions. At most a few chunks per worker
+    are pending at any time, so memory does not grow with num_executions.
+    
+    Args:
+        scenario_func: The scenario function to run (run_scenario_1, run_scenario_2, run_scenario_4, or run_scenario)
+        num_executions: Number of times to run the scenario
+        n: Total number of pads
+        d: Gap parameter
+        min_msg_length: Minimum message length
+        max_msg_length: Maximum message length
+        seed: Base seed from which per-execution seeds are derived
+        workers: Number of worker processes (1 runs in-process)
+        chunk_size: Executions per task (default: spread evenly, ~4 tasks per worker, at most 1000)
+        stream: Seed stream name (default: the scenario function name)
+        rng_factory: Builds each execution's generator from its seed (default: random.Random;
+            e.g. functools.partial(workload.Workload, distribution)); must be picklable
+        **scenario_kwargs: Extra keyword arguments for the scenario (e.g. policy, audit, or active and m for run_scenario)
+    
+    Yields:
+        Result dictionary of each execution, in execution order
+    """
+    if stream is None:
+        stream = scenario_func.__name__
+    
+    if chunk_size is None:
+        chunk_size = min(1000, max(1, -(-num_executions // (max(workers, 1) * 4))))
+    starts = range(0, num_executions, chunk_size)
+    
+    if workers <= 1:
+        for start in starts:
+            yield from _run_chunk(scenario_func, start, min(start + chunk_size, num_executions), seed, stream,
+                                  n, d, min_msg_length, max_msg_length, scenario_kwargs, rng_factory)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for start in starts:
+            pending.append(executor.submit(_run_chunk, scenario_func, start, min(start + chunk_size, num_executions),
+                                           seed, stream, n, d, min_msg_length, max_msg_length, scenario_kwargs,
+                                           rng_factory))
+            # Collect in submission order so results stay in execution order
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def run_parallel_executions(scenario_func, num_executions, n, d, min_msg_length=1, max_msg_length=50,
+                            seed=0, workers=1, chunk_size=None, stream=None, rng_factory=random.Random,
+                            **scenario_kwargs):
+    """
+    Run a scenario multiple times across a pool of worker processes.
+    
+    Every execution gets its own generator seeded with derive_seed(), so the
+    returned list is bit-identical for any number of workers. It differs from
+    simulator.run_multiple_executions, which draws every execution from one
+    shared generator and remains the serial reference.
+    
+    Args:
+        scenario_func: The scenario function to run (run_scenario_1, run_scenario_2, run_scenario_4, or run_scenario)
+        num_executions: Number of times to run the scenario
+        n: Total number of pads
+        d: Gap parameter
+        min_msg_length: Minimum message length
+        max_msg_length: Maximum message length
+        seed: Base seed from which per-execution seeds are derived
+        workers: Number of worker processes (1 runs in-process)
+        chunk_size: Executions per task (default: spread evenly, ~4 tasks per worker, at most 1000)
+        stream: Seed stream name (default: the scenario function name)
+        rng_factory: Builds each execution's generator from its seed (default: random.Random;
+            e.g. functools.partial(workload.Workload, distribution)); must be picklable
+        **scenario_kwargs: Extra keyword arguments for the scenario (e.g. policy, audit, or active and m for run_scenario)
+    
+    Returns:
+        List of results from each execution, in execution order
+    """
+    return list(iter_parallel_executions(scenario_func, num_executions, n, d, min_msg_length, max_msg_length,
+                                         seed, workers, chunk_size, stream, rng_factory, **scenario_kwargs))
@@ -1,3 +1,55 @@
+from bisect import bisect_right
+from itertools import accumulate, islice
+
+from ledger import AUDIT_LEVELS, check_run
+
+
+# Party names for the classic m=4 layout; larger layouts use P0, P1, ...
+PARTY_NAMES = ["Alice", "Bob", "Charlie", "Dave"]
+
+
+def party_names(m):
+    """
+    Return the names of the m parties, in party id order.
+    
+    Args:
+        m: Number of parties
+    
+    Returns:
+        List of names (Alice, Bob, Charlie, Dave for m=4; P0..P{m-1} otherwise)
+    """
+    if m == len(PARTY_NAMES):
+        return list(PARTY_NAMES)
+    return [f"P{i}" for i in range(m)]
+
+
+def zone_bounds(n, k, zone_sizes=None):
+    """
+    Split the pad sequence into k consecutive zones.
+    
+    Args:
+        n: Total number of pads in the sequence
+        k: Number of zones
+        zone_sizes: Optional list of k zone sizes summing to n
+            (default: even split, zone z is [z*n//k, (z+1)*n//k))
+    
+    Returns:
+        List of (zone_min, zone_max) tuples, zone_max exclusive
+    """
+    if zone_sizes is None:
+        edges = [z * n // k for z in range(k + 1)]
+    else:
+        if len(zone_sizes) != k:
+            raise ValueError(f"Expected {k} zone sizes, got {len(zone_sizes)}")
+        if sum(zone_sizes) != n or min(zone_sizes) < 1:
+            raise ValueError("Zone sizes must be positive and sum to n")
+        edges = [0]
+        for size in zone_sizes:
+            edges.append(edges[-1] + size)
+    
+    return list(zip(edges[:-1], edges[1:]))
+
+
 class Party:
     """
     Represents a party in the protocol.
@@ -9,7 +61,7 @@ class Party:
         Initialize a party.
         
         Args:
-            name: Party name (Alice, Bob, Charlie, Dave)
+            name: Party name (Alice, Bob, Charlie, Dave, or P0, P1, ... for other m)
             start_index: Starting pad index
             direction: +1 for rightward movement, -1 for leftward movement
             zone_min: Minimum index in this party's zone (inclusive)
@@ -73,7 +125,7 @@ class Party:
                 # Partner hasn't sent; check against their starting position
                 if not (next_end < partner_last_index - d):
                     return False
-                    
+        
         else:  # Moving left (direction < 0)
             next_start = self.current_index - message_length + 1
             next_end = self.current_index
@@ -94,7 +146,42 @@ class Party:
         
         return True
     
-    def consume_pads(self, message_length):
+    def get_capacity(self, partner_last_index, d):
+        """
+        Largest message length this party could send right now.
+        
+        can_send(L, ...) is True exactly when 1 <= L <= get_capacity(...).
+        
+        Args:
+            partner_last_index: Last pad index used by partner in same zone
+            d: Safety gap parameter
+        
+        Returns:
+            Maximum sendable message length (0 if the party is blocked)
+        """
+        if self.direction > 0:
+            # Last pad must stay inside the zone and below partner_last_index - d
+            last_allowed = min(self.zone_max - 1, partner_last_index - d - 1)
+            capacity = last_allowed - self.current_index + 1
+        else:
+            # First pad must stay inside the zone and above partner_last_index + d
+            first_allowed = max(self.zone_min, partner_last_index + d + 1)
+            capacity = self.current_index - first_allowed + 1
+        
+        return max(capacity, 0)
+    
+    def get_used_range(self):
+        """
+        Return the contiguous run of pads this party has consumed so far.
+        
+        Returns:
+            Tuple (start, stop) of used pad indices [start, stop), empty if nothing was sent
+        """
+        if self.direction > 0:
+            return self.start_index, self.current_index
+        return self.current_index + 1, self.start_index + 1
+    
+    def consume_range(self, message_length):
         """
         Consume pads for sending a message and advance position.
         
@@ -102,19 +189,52 @@ class Party:
             message_length: Number of pads to consume
         
         Returns:
-            List of pad indices that were consumed
+            Tuple (start, stop) of the consumed pad indices [start, stop)
         """
         if self.direction > 0:
             # Rightward: consume [current_index, current_index + L - 1]
-            pads_used = list(range(self.current_index, self.current_index + message_length))
+            start = self.current_index
             self.current_index += message_length
+            stop = self.current_index
         else:
             # Leftward: consume [current_index - L + 1, current_index]
-            pads_used = list(range(self.current_index - message_length + 1, self.current_index + 1))
+            stop = self.current_index + 1
             self.current_index -= message_length
+            start = self.current_index + 1
         
         self.has_sent = True
-        return pads_used
+        return start, stop
+    
+    def relocate(self, start_index, zone_min, zone_max):
+        """
+        Restart this party from a fresh position in a new zone.
+        
+        Used by zone handoffs (see Protocol.rebalance). Pads consumed before the
+        move stay used; the party simply stops extending that run.
+        
+        Args:
+            start_index: New starting pad index
+            zone_min: Minimum index of the new zone (inclusive)
+            zone_max: Maximum index of the new zone (exclusive)
+        """
+        self.start_index = start_index
+        self.current_index = start_index
+        self.zone_min = zone_min
+        self.zone_max = zone_max
+        self.has_sent = False
+    
+    def consume_pads(self, message_length):
+        """
+        Consume pads for sending a message and advance position.
+        
+        Args:
+            message_length: Number of pads to consume
+        
+        Returns:
+            List of pad indices that were consumed
+        """
+        start, stop = self.consume_range(message_length)
+        return list(range(start, stop))
     
     def __repr__(self):
         return f"{self.name}(pos={self.current_index}, dir={'->' if self.direction > 0 else '<-'})"
@@ -122,85 +242,378 @@ class Party:
 
 class Protocol:
     """
-    Implements the Parallel Pairs protocol for 4-party OTP communication.
-    Parties are divided into two teams, each operating in their own zone.
+    Implements the Parallel Pairs protocol for m-party OTP communication.
+    Parties are divided into m/2 teams, each operating in their own zone.
+    
+    Party state is indexed by integer party id: zone z holds the rightward
+    party 2z and the leftward party 2z+1, so a party's partner is id ^ 1.
+    Methods taking a party accept either its name or its id.
     """
     
-    def __init__(self, n, d=10):
+    def __init__(self, n, d=10, audit='interval', m=4, zone_sizes=None, instrumentation=None, journal=None):
         """
         Initialize the protocol.
         
         Args:
             n: Total number of pads in the sequence
             d: Gap parameter (max undelivered messages)
+            audit: Collision audit level:
+                'off' - count pads only; O(1) zone/partner overlap check per message
+                'interval' - check each run against the sorted used runs, O(log k)
+                'full' - check every pad of each run against a bitmap, O(L)
+            m: Number of parties (even; m/2 zones)
+            zone_sizes: Optional list of m/2 zone sizes summing to n (default: even split)
+            instrumentation: Optional instrumentation.Instrumentation to receive per-party
+                counters and trace events (default: none, at no cost)
+            journal: Optional journal.Journal that persists every position advance
+                (default: none, state lives in memory only)
         """
+        if audit not in AUDIT_LEVELS:
+            raise ValueError(f"Unknown audit level: {audit}")
+        if m < 2 or m % 2:
+            raise ValueError(f"Number of parties must be a positive even number, got {m}")
+        
         self.n = n
         self.d = d
-        self.pad_usage = [False] * n
+        self.audit = audit
+        self.ledger = AUDIT_LEVELS[audit](n)
         
-        # Split pad sequence into two zones
-        zone_split = n // 2
+        self.m = m
+        self.zones = zone_bounds(n, m // 2, zone_sizes)
         
-        # Team 1: Alice & Bob (Zone 1: [0, zone_split))
-        self.alice = Party("Alice", 0, +1, 0, zone_split)
-        self.bob = Party("Bob", zone_split - 1, -1, 0, zone_split)
+        # Each zone: rightward party from its low end, leftward party from its high end
+        # (m=4: Alice & Bob in Zone 1 [0, n/2), Charlie & Dave in Zone 2 [n/2, n))
+        names = party_names(m)
+        self.party_list = []
+        for zone, (zone_min, zone_max) in enumerate(self.zones):
+            self.party_list.append(Party(names[2 * zone], zone_min, +1, zone_min, zone_max))
+            self.party_list.append(Party(names[2 * zone + 1], zone_max - 1, -1, zone_min, zone_max))
         
-        # Team 2: Charlie & Dave (Zone 2: [zone_split, n))
-        self.charlie = Party("Charlie", zone_split, +1, zone_split, n)
-        self.dave = Party("Dave", n - 1, -1, zone_split, n)
+        if m == len(PARTY_NAMES):
+            self.alice, self.bob, self.charlie, self.dave = self.party_list
         
-        # Dictionary for easy access
-        self.parties = {
-            "Alice": self.alice,
-            "Bob": self.bob,
-            "Charlie": self.charlie,
-            "Dave": self.dave
-        }
+        # Name lookups for callers that address parties by name
+        self.party_ids = {party.name: i for i, party in enumerate(self.party_list)}
+        self.parties = {party.name: party for party in self.party_list}
         
         # Define partner pairs (same zone)
-        self.pairs = {
-            "Alice": self.bob,
-            "Bob": self.alice,
-            "Charlie": self.dave,
-            "Dave": self.charlie
-        }
+        self.pairs = {party.name: self.party_list[i ^ 1] for i, party in enumerate(self.party_list)}
+        
+        # Remaining sendable capacity per party id, refreshed only when the party
+        # or its partner moves, plus the number of parties that can still send
+        self.capacity = [0] * m
+        self.sendable_parties = 0
+        for party_id in range(m):
+            self._update_capacity(party_id)
         
         # Statistics
         self.messages_sent = 0
         self.messages_attempted = 0
+        self.rebalances = 0
+        
+        # Runs left behind by parties that moved zones (see rebalance())
+        self.retired_runs = []
+        
+        self.instrumentation = instrumentation
+        if instrumentation is not None:
+            instrumentation.attach(self)
+        
+        self.journal = journal
+        if journal is not None:
+            journal.attach(self)
     
-    def attempt_send(self, party_name, message_length):
+    def _id(self, party):
+        """Map a party name or id to its id."""
+        return self.party_ids.get(party, party)
+    
+    def _update_capacity(self, party_id):
+        """Recompute a party's capacity and the count of parties that can send."""
+        party = self.party_list[party_id]
+        partner = self.party_list[party_id ^ 1]
+        
+        old = self.capacity[party_id]
+        new = party.get_capacity(partner.get_last_used_index(), self.d)
+        self.capacity[party_id] = new
+        self.sendable_parties += (new > 0) - (old > 0)
+    
+    def _record_run(self, party_id, start, stop):
+        """Mark a consumed run in the ledger, raising on any pad reuse."""
+        if self.audit == 'off':
+            party = self.party_list[party_id]
+            partner_start, partner_stop = self.party_list[party_id ^ 1].get_used_range()
+            check_run(start, stop, party.zone_min, party.zone_max, partner_start, partner_stop)
+        self.ledger.mark(start, stop)
+    
+    def get_capacity(self, party):
+        """
+        Return the largest message length a party could send right now.
+        
+        Args:
+            party: Name or id of the party
+        
+        Returns:
+            Maximum sendable message length (0 if the party is blocked)
+        """
+        return self.capacity[self._id(party)]
+    
+    def get_capacities(self):
+        """Return a dictionary of every party's current capacity, keyed by name."""
+        return {party.name: capacity for party, capacity in zip(self.party_list, self.capacity)}
+    
+    def can_send(self, party, message_length):
+        """
+        Check if a party could send a message of given length right now.
+        
+        Args:
+            party: Name or id of the party
+            message_length: Length of message in pads
+        
+        Returns:
+            True if the message would be accepted, False otherwise
+        """
+        return 1 <= message_length <= self.capacity[self._id(party)]
+    
+    def attempt_send(self, party, message_length):
         """
         Attempt to send a message from the given party.
         
         Args:
-            party_name: Name of the party attempting to send
+            party: Name or id of the party attempting to send
             message_length: Length of message in pads
         
         Returns:
             True if message was sent successfully, False otherwise
         """
         self.messages_attempted += 1
+        party_id = self.party_ids.get(party, party)
         
-        party = self.parties[party_name]
-        partner = self.pairs[party_name]
-        
-        # Check safety condition
-        if not party.can_send(message_length, partner.get_last_used_index(), self.d, partner.has_sent):
+        # Check safety condition (capacity encodes Party.can_send for this party)
+        if not 1 <= message_length <= self.capacity[party_id]:
+            if self.instrumentation is not None:
+                self.instrumentation.record_reject(self.party_list[party_id], party_id, message_length,
+                                                   self.capacity[party_id])
             return False
         
         # Consume pads
-        pads_used = party.consume_pads(message_length)
+        start, stop = self.party_list[party_id].consume_range(message_length)
         
         # Mark pads as used and verify no reuse (perfect secrecy check)
-        for pad_idx in pads_used:
-            assert not self.pad_usage[pad_idx], \
-                f"COLLISION: Pad {pad_idx} was already used! Perfect secrecy violated!"
-            self.pad_usage[pad_idx] = True
+        self._record_run(party_id, start, stop)
+        
+        # Only this party and its partner are affected by the move
+        self._update_capacity(party_id)
+        self._update_capacity(party_id ^ 1)
         
         self.messages_sent += 1
+        if self.journal is not None:
+            self.journal.record(party_id, 1, self.party_list[party_id].current_index)
+        if self.instrumentation is not None:
+            self.instrumentation.record_send(party_id, 1, start, stop)
+        return True
+    
+    def attempt_send_batch(self, party, message_lengths):
+        """
+        Send a sequence of messages from one party, stopping at the first rejection.
+        
+        Same outcome as calling attempt_send(party, L) for each length in
+        order until one returns False. Only this party moves, so its capacity
+        just shrinks by what it sends: the accepted prefix is found with a
+        binary search over prefix sums of the lengths.
+        
+        Args:
+            party: Name or id of the party sending
+            message_lengths: Sequence (or NumPy array) of message lengths in pads
+        
+        Returns:
+            Tuple (accepted, ranges): the number of messages sent, and a list of
+            (start, stop) pad ranges [start, stop), one per accepted message
+        """
+        # Lengths below 1 are always rejected, so they end the batch
+        total = len(message_lengths)
+        if hasattr(message_lengths, 'cumsum'):
+            # NumPy array: scan and sum without a Python-level loop
+            invalid = message_lengths < 1
+            valid = int(invalid.argmax()) if invalid.any() else total
+            prefix = message_lengths[:valid].cumsum().tolist()
+        else:
+            valid = next((i for i, length in enumerate(message_lengths) if length < 1), total)
+            prefix = list(accumulate(islice(message_lengths, valid)))
+        
+        party_id = self._id(party)
+        accepted = bisect_right(prefix, self.capacity[party_id])
+        self.messages_attempted += accepted + (accepted < total)
+        if accepted == 0:
+            if total and self.instrumentation is not None:
+                self.instrumentation.record_reject(self.party_list[party_id], party_id, int(message_lengths[0]),
+                                                   self.capacity[party_id])
+            return 0, []
+        
+        sender = self.party_list[party_id]
+        origin = sender.current_index
+        
+        # All accepted messages form one contiguous run
+        start, stop = sender.consume_range(prefix[accepted - 1])
+        self._record_run(party_id, start, stop)
+        
+        self._update_capacity(party_id)
+        self._update_capacity(party_id ^ 1)
+        self.messages_sent += accepted
+        if self.journal is not None:
+            self.journal.record(party_id, accepted, sender.current_index)
+        
+        ends = prefix[:accepted]
+        if sender.direction > 0:
+            ranges = [(origin + a, origin + b) for a, b in zip([0] + ends, ends)]
+        else:
+            ranges = [(origin + 1 - b, origin + 1 - a) for a, b in zip([0] + ends, ends)]
+        
+        if self.instrumentation is not None:
+            self.instrumentation.record_batch(party_id, ranges)
+            if accepted < total:
+                self.instrumentation.record_reject(sender, party_id, int(message_lengths[accepted]),
+                                                   self.capacity[party_id])
+        
+        return accepted, ranges
+    
+    def get_free_range(self, zone):
+        """
+        Return the pads of a zone that neither of its parties has used yet.
+        
+        Args:
+            zone: Zone index (parties 2*zone and 2*zone+1)
+        
+        Returns:
+            Tuple (start, stop) of free pad indices [start, stop), empty if the parties have met
+        """
+        right = self.party_list[2 * zone]
+        left = self.party_list[2 * zone + 1]
+        return right.current_index, max(right.current_index, left.current_index + 1)
+    
+    def rebalance(self, party, min_capacity=1):
+        """
+        Hand an exhausted pair a new zone carved from another zone's free pads.
+        
+        The donor is the largest idle zone, one where neither party has sent
+        since it was set up. Its free range is split in half: the donor keeps
+        the lower half, and the pair of `party` takes the upper half as its new
+        zone, with both parties restarting at its ends. The donor's leftward
+        party restarts just below the split. Afterwards the zones are still
+        disjoint and each holds only the runs of its own parties, so the usual
+        gap rule keeps the protocol safe; the ledger still audits every later
+        run. Pads left over in the pair's old zone are abandoned.
+        
+        Busy zones never donate: splitting one would cost both pairs a gap of
+        d pads for little gain.
+        
+        Args:
+            party: Name or id of a party whose capacity is below min_capacity
+            min_capacity: Smallest useful message length; the pair only moves if
+                its new zone and the donor's remaining half both fit one message
+        
+        Returns:
+            True if the pair moved, False if the party can still send or no idle
+            zone has enough free pads to donate
+        """
+        party_id = self._id(party)
+        if self.capacity[party_id] >= min_capacity:
+            return False
+        
+        # A fresh zone of size s gives its parties a capacity of s - d - 1
+        needed = min_capacity + self.d + 1
+        zone = party_id // 2
+        donor, best = None, 0
+        for z in range(len(self.zones)):
+            if z != zone and not (self.party_list[2 * z].has_sent or self.party_list[2 * z + 1].has_sent):
+                start, stop = self.get_free_range(z)
+                if stop - start > best:
+                    donor, best = z, stop - start
+        if best < 2 * needed:
+            return False
+        
+        donor_min = self.zones[donor][0]
+        free_start, free_stop = self.get_free_range(donor)
+        split = free_start + best // 2
+        
+        # Moved parties stop extending their runs; remember them for is_pad_used()
+        moved = (2 * zone, 2 * zone + 1)
+        for p in moved:
+            start, stop = self.party_list[p].get_used_range()
+            if start < stop:
+                self.retired_runs.append((start, stop))
+        
+        self.zones[donor] = (donor_min, split)
+        self.zones[zone] = (split, free_stop)
+        self.party_list[2 * donor].zone_max = split
+        self.party_list[2 * donor + 1].relocate(split - 1, donor_min, split)
+        self.party_list[2 * zone].relocate(split, split, free_stop)
+        self.party_list[2 * zone + 1].relocate(free_stop - 1, split, free_stop)
+        
+        for p in moved + (2 * donor, 2 * donor + 1):
+            self._update_capacity(p)
+        
+        self.rebalances += 1
+        if self.journal is not None:
+            # Handoffs move zones, which journal records do not describe
+            self.journal.snapshot()
+        if self.instrumentation is not None:
+            self.instrumentation.record_rebalance(party_id, free_start, free_stop)
         return True
     
+    def get_state(self):
+        """
+        Return the protocol's full position state as plain data.
+        
+        Returns:
+            Dictionary with n, d, m, the zones, each party's position and
+            zone, the retired runs and the message counters; set_state()
+            restores it
+        """
+        return {
+            'n': self.n,
+            'd': self.d,
+            'm': self.m,
+            'zones': [list(zone) for zone in self.zones],
+            'parties': [[party.start_index, party.current_index, party.zone_min, party.zone_max, party.has_sent]
+                        for party in self.party_list],
+            'retired_runs': [list(run) for run in self.retired_runs],
+            'messages_sent': self.messages_sent,
+            'messages_attempted': self.messages_attempted,
+            'rebalances': self.rebalances,
+        }
+    
+    def set_state(self, state):
+        """
+        Restore a state from get_state() on a protocol with the same n, d and m.
+        
+        The ledger is rebuilt from the parties' runs and the retired runs, so
+        the audit keeps checking later sends against every pad used before.
+        
+        Args:
+            state: Dictionary from get_state()
+        """
+        if (state['n'], state['d'], state['m']) != (self.n, self.d, self.m):
+            raise ValueError("State is for a protocol with different n, d or m")
+        
+        self.zones = [tuple(zone) for zone in state['zones']]
+        for party, (start_index, current_index, zone_min, zone_max, has_sent) in zip(self.party_list,
+                                                                                       state['parties']):
+            party.relocate(start_index, zone_min, zone_max)
+            party.current_index = current_index
+            party.has_sent = has_sent
+        self.retired_runs = [tuple(run) for run in state['retired_runs']]
+        self.messages_sent = state['messages_sent']
+        self.messages_attempted = state['messages_attempted']
+        self.rebalances = state['rebalances']
+        
+        self.ledger = AUDIT_LEVELS[self.audit](self.n)
+        for start, stop in sorted(self.retired_runs + [party.get_used_range() for party in self.party_list]):
+            self.ledger.mark(start, stop)
+        
+        self.capacity = [0] * self.m
+        self.sendable_parties = 0
+        for party_id in range(self.m):
+            self._update_capacity(party_id)
+    
     def is_terminated(self):
         """
         Check if protocol has terminated.
@@ -209,24 +622,24 @@ class Protocol:
         Returns:
             True if protocol is terminated, False otherwise
         """
-        # Check if any party can send a minimal message (length 1)
-        for party_name in self.parties:
-            party = self.parties[party_name]
-            partner = self.pairs[party_name]
-            
-            if party.can_send(1, partner.get_last_used_index(), 
-                            self.d, partner.has_sent):
-                return False  # At least one party can still send
-        
-        return True
+        # A party can send a minimal message (length 1) iff its capacity is positive
+        return self.sendable_parties == 0
     
     def get_wasted_pads(self):
         """Return count of unused pads."""
-        return self.n - sum(self.pad_usage)
+        return self.n - self.ledger.used
     
     def get_used_pads(self):
         """Return count of used pads."""
-        return sum(self.pad_usage)
+        return self.ledger.used
+    
+    def is_pad_used(self, pad_idx):
+        """Return True if the given pad has been used."""
+        if self.audit == 'off':
+            # No ledger: every party's usage is one contiguous run per zone it held
+            runs = [party.get_used_range() for party in self.party_list] + self.retired_runs
+            return any(start <= pad_idx < stop for start, stop in runs)
+        return self.ledger.is_used(pad_idx)
     
     def get_waste_percentage(self):
         """Return percentage of pads wasted."""
@@ -237,20 +650,25 @@ class Protocol:
         Return protocol statistics.
         
         Returns:
-            Dictionary with protocol statistics
+            Dictionary with protocol statistics (plus 'instrumentation', see
+            Instrumentation.export(), when the protocol is instrumented)
         """
-        return {
+        stats = {
             'total_pads': self.n,
             'used_pads': self.get_used_pads(),
             'wasted_pads': self.get_wasted_pads(),
             'waste_percentage': self.get_waste_percentage(),
             'messages_sent': self.messages_sent,
             'messages_attempted': self.messages_attempted,
+            'rebalances': self.rebalances,
             'terminated': self.is_terminated()
         }
+        if self.instrumentation is not None:
+            stats['instrumentation'] = self.instrumentation.export()
+        return stats
     
     def __repr__(self):
-        return (f"Protocol(n={self.n}, d={self.d}, "
+        return (f"Protocol(n={self.n}, d={self.d}, m={self.m}, "
                 f"used={self.get_used_pads()}, "
                 f"wasted={self.get_wasted_pads()}, "
                 f"msgs={self.messages_sent})")
@@ -0,0 +1,301 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from protocol import Protocol
+
+
+# Bump when the manifest layout changes
+MANIFEST_VERSION = 1
+
+# Default bytes per checksummed chunk (rounded down to whole pads)
+CHUNK_BYTES = 64 << 20
+
+# Bytes generated, written, read or hashed per call inside a chunk
+IO_BLOCK = 4 << 20
+
+
+def zone_manifest_path(book_path, zone):
+    """Return the path of a zone's slice manifest: '<book>.zone<z>.json'."""
+    return f"{book_path}.zone{zone}.json"
+
+
+def plan_chunks(zones, pad_size, chunk_bytes=CHUNK_BYTES):
+    """
+    Split every zone into checksummed chunks.
+    
+    Chunks never cross a zone boundary, so each zone's slice can be verified
+    on its own.
+    
+    Args:
+        zones: List of (zone_min, zone_max) pad ranges (see protocol.zone_bounds)
+        pad_size: Bytes per pad
+        chunk_bytes: Target bytes per chunk
+    
+    Returns:
+        List of (zone, pad_start, pad_stop) tuples in file order
+    """
+    chunk_pads = max(1, chunk_bytes // pad_size)
+    return [(zone, start, min(start + chunk_pads, zone_max))
+            for zone, (zone_min, zone_max) in enumerate(zones)
+            for start in range(zone_min, zone_max, chunk_pads)]
+
+
+def _generate_chunk(path, offset, size):
+    """Fill bytes [offset, offset + size) of the book with os.urandom and return their sha256 (worker)."""
+    digest = hashlib.sha256()
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        done = 0
+        while done < size:
+            block = memoryview(os.urandom(min(IO_BLOCK, size - done)))
+            digest.update(block)
+            while block:
+                written = os.pwrite(fd, block, offset + done)
+                block = block[written:]
+                done += written
+    finally:
+        os.close(fd)
+    return digest.hexdigest()
+
+
+def _hash_range(path, offset, size):
+    """Return the sha256 of bytes [offset, offset + size) of a file (worker)."""
+    digest = hashlib.sha256()
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        done = 0
+        while done < size:
+            block = os.pread(fd, min(IO_BLOCK, size - done), offset + done)
+            if not block:
+                break  # Truncated file: the digest will not match
+            digest.update(block)
+            done += len(block)
+    finally:
+        os.close(fd)
+    return digest.hexdigest()
+
+
+def _map_ordered(func, tasks, workers):
+    """Yield func(*task) for each task in order, on up to `workers` processes (1 runs in-process)."""
+    if workers <= 1:
+        for task in tasks:
+            yield func(*task)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(func, *task))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _preallocate(path, size):
+    """Create (or replace) a file of `size` bytes, reserving its blocks where the file system allows."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except (AttributeError, OSError):
+            os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
+def provision(path, n, pad_size=1, m=4, zone_sizes=None, chunk_bytes=CHUNK_BYTES, workers=None, progress=None):
+    """
+    Generate a pad book and one slice manifest per zone.
+    
+    The book is preallocated, then its chunks are filled with os.urandom
+    and checksummed by a process pool, each worker writing its chunk in
+    place with pwrite, so no process holds more than IO_BLOCK bytes of key
+    material. Zone z's manifest (zone_manifest_path) records the zone's pad
+    range and byte range in the book, its two parties' ids, names, start
+    indices and directions exactly as Protocol sets them up, and the
+    sha256 of each of its chunks.
+    
+    Args:
+        path: Book file to create (replaced if it exists)
+        n: Number of pads
+        pad_size: Bytes per pad
+        m: Number of parties (m/2 zones)
+        zone_sizes: Optional list of m/2 zone sizes summing to n (default: even split)
+        chunk_bytes: Target bytes per checksummed chunk
+        workers: Worker processes (default: os.cpu_count())
+        progress: Optional callback(bytes_done, bytes_total) after each chunk
+    
+    Returns:
+        List of the zone manifests (dictionaries, as written)
+    """
+    protocol = Protocol(n=n, audit='off', m=m, zone_sizes=zone_sizes)
+    workers = workers or os.cpu_count() or 1
+    total = n * pad_size
+    # Manifests of the book being replaced, including zones this layout no longer has
+    for old_path in glob.glob(f"{glob.escape(path)}.zone*.json"):
+        os.remove(old_path)
+    _preallocate(path, total)
+    
+    chunks = plan_chunks(protocol.zones, pad_size, chunk_bytes)
+    tasks = [(path, start * pad_size, (stop - start) * pad_size) for _, start, stop in chunks]
+    manifests = []
+    for zone, (zone_min, zone_max) in enumerate(protocol.zones):
+        parties = [protocol.party_list[party_id] for party_id in (2 * zone, 2 * zone + 1)]
+        manifests.append({
+            'version': MANIFEST_VERSION,
+            'book': os.path.basename(path),
+            'n': n,
+            'pad_size': pad_size,
+            'm': m,
+            'zone': zone,
+            'zone_min': zone_min,
+            'zone_max': zone_max,
+            'offset': zone_min * pad_size,
+            'length': (zone_max - zone_min) * pad_size,
+            'parties': [{'id': 2 * zone + i, 'name': party.name, 'start_index': party.start_index,
+                         'direction': party.direction} for i, party in enumerate(parties)],
+            'chunks': [],
+        })
+    
+    done = 0
+    for (zone, start, stop), digest in zip(chunks, _map_ordered(_generate_chunk, tasks, workers)):
+        manifests[zone]['chunks'].append([start, stop, digest])
+        done += (stop - start) * pad_size
+        if progress is not None:
+            progress(done, total)
+    
+    for manifest in manifests:
+        manifest_path = zone_manifest_path(path, manifest['zone'])
+        temp_path = f"{manifest_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(temp_path, manifest_path)
+    return manifests
+
+
+def load_manifest(book_path, zone):
+    """Read a zone's slice manifest."""
+    with open(zone_manifest_path(book_path, zone)) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Zone {zone} manifest: unsupported version {manifest.get('version')}")
+    return manifest
+
+
+def iter_verify(book_path, zones=None, workers=None):
+    """
+    Check a pad book against its zone manifests, one chunk at a time.
+    
+    The manifests are checked right away; chunks are hashed in parallel as
+    the returned iterator is consumed and reported in file order as soon as
+    each is done, so a caller can show progress, stop at the first bad
+    chunk, or check a single zone's slice without reading the rest.
+    
+    Args:
+        book_path: Book file
+        zones: Zone indices to check (default: every zone with a manifest)
+        workers: Worker processes (default: os.cpu_count())
+    
+    Returns:
+        Iterator of (zone, pad_start, pad_stop, ok), one per chunk
+    
+    Raises:
+        ValueError: If the manifests disagree on the book, n, m or pad size,
+            or the book's file size does not match them
+    """
+    if not os.path.exists(zone_manifest_path(book_path, 0)):
+        raise FileNotFoundError(f"No zone manifests found for {book_path}")
+    first = load_manifest(book_path, 0)
+    if zones is None:
+        zones = range(first['m'] // 2)
+    size = os.path.getsize(book_path)
+    workers = workers or os.cpu_count() or 1
+    
+    chunks = []
+    for zone in zones:
+        manifest = first if zone == 0 else load_manifest(book_path, zone)
+        # Manifests left over from another book, or another layout of this one, would report valid data as bad
+        if (manifest['book'] != os.path.basename(book_path) or manifest['zone'] != zone
+                or any(manifest[key] != first[key] for key in ('n', 'm', 'pad_size'))
+                or not 0 <= zone < manifest['m'] // 2):
+            raise ValueError(f"Zone {zone} manifest does not belong to the same book as zone 0")
+        if manifest['n'] * manifest['pad_size'] != size:
+            raise ValueError(f"{book_path} is {size} bytes, the manifests describe "
+                             f"{manifest['n'] * manifest['pad_size']}")
+        pad_size = manifest['pad_size']
+        chunks.extend((zone, start, stop, pad_size, digest) for start, stop, digest in manifest['chunks'])
+    return _verify_chunks(book_path, chunks, workers)
+
+
+def _verify_chunks(book_path, chunks, workers):
+    """Hash (zone, start, stop, pad_size, digest) chunks of a book and yield (zone, start, stop, ok)."""
+    tasks = [(book_path, start * pad_size, (stop - start) * pad_size) for _, start, stop, pad_size, _ in chunks]
+    for (zone, start, stop, _, expected), digest in zip(chunks, _map_ordered(_hash_range, tasks, workers)):
+        yield zone, start, stop, digest == expected
+
+
+def main():
+    """Provision a pad book with per-zone manifests, or verify one."""
+    parser = argparse.ArgumentParser(description='Generate and verify pad books split into protocol zones')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    create = commands.add_parser('create', help='Generate a pad book and its zone manifests')
+    create.add_argument('book', help='Book file to create (replaced if it exists)')
+    create.add_argument('--n', type=int, required=True, help='Number of pads')
+    create.add_argument('--pad-size', type=int, default=1, help='Bytes per pad (default: 1)')
+    create.add_argument('--m', type=int, default=4, help='Number of parties, m/2 zones (default: 4)')
+    create.add_argument('--zone-sizes', type=int, nargs='+', default=None,
+                        help='Zone sizes in pads, summing to n (default: even split)')
+    create.add_argument('--chunk-mb', type=float, default=CHUNK_BYTES / (1 << 20),
+                        help=f'Bytes per checksummed chunk, in MB (default: {CHUNK_BYTES >> 20})')
+    create.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    
+    verify = commands.add_parser('verify', help='Check a book against its zone manifests')
+    verify.add_argument('book', help='Book file')
+    verify.add_argument('--zone', type=int, nargs='+', default=None, help='Zones to check (default: all)')
+    verify.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    verify.add_argument('--keep-going', action='store_true', help='Report every bad chunk instead of stopping at the first')
+    args = parser.parse_args()
+    
+    start = time.perf_counter()
+    if args.command == 'create':
+        manifests = provision(args.book, args.n, args.pad_size, args.m, args.zone_sizes,
+                              int(args.chunk_mb * (1 << 20)), args.workers)
+        elapsed = time.perf_counter() - start
+        size = args.n * args.pad_size
+        print(f"{args.book}: {size:,} bytes in {elapsed:.2f}s ({size / elapsed / 1e9:.2f} GB/s)")
+        for manifest in manifests:
+            parties = ', '.join(f"{p['name']} from {p['start_index']} {'->' if p['direction'] > 0 else '<-'}"
+                                for p in manifest['parties'])
+            print(f"  Zone {manifest['zone']}: pads [{manifest['zone_min']}, {manifest['zone_max']}), "
+                  f"{len(manifest['chunks'])} chunks; {parties} -> {zone_manifest_path(args.book, manifest['zone'])}")
+        return
+    
+    checked = bad = 0
+    size = 0
+    try:
+        results = iter_verify(args.book, args.zone, args.workers)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    for zone, pad_start, pad_stop, ok in results:
+        checked += 1
+        size += pad_stop - pad_start
+        if not ok:
+            bad += 1
+            print(f"Zone {zone}: pads [{pad_start}, {pad_stop}) do not match the manifest")
+            if not args.keep_going:
+                break
+    elapsed = time.perf_counter() - start
+    print(f"{checked} chunks ({size:,} pads) checked in {elapsed:.2f}s: {'OK' if not bad else f'{bad} bad'}")
+    if bad:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
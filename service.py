@@ -0,0 +1,390 @@
+import argparse
+import asyncio
+import os
+import random
+import signal
+import tempfile
+import time
+from bisect import bisect_right
+from collections import deque
+from itertools import accumulate
+
+import numpy as np
+
+from ledger import AUDIT_LEVELS
+from protocol import Protocol, party_names
+
+
+# Wire format: one request or response per line (ASCII, '\n'-terminated)
+#   RESERVE <party> <length>   - party is a name (Alice, P3, ...) or an id
+#   OK <start> <stop>          - pads [start, stop) are reserved for the party
+#   REJECT <capacity>          - the party cannot send that many pads now; capacity is what it could send
+#   ERR <reason>               - malformed request
+# Responses come back in request order on each connection, so clients may pipeline.
+
+READ_SIZE = 1 << 16
+
+LATENCY_PERCENTILES = (50, 99, 99.9)
+
+
+class _Connection:
+    """Per-client response queue: one slot per request, written out in order."""
+    
+    __slots__ = ('writer', 'slots', 'closed')
+    
+    def __init__(self, writer):
+        self.writer = writer
+        self.slots = deque()  # One-item lists holding the response, or None while pending
+        self.closed = False
+    
+    def write_ready(self):
+        """Write the leading run of answered requests."""
+        slots = self.slots
+        out = []
+        while slots and slots[0][0] is not None:
+            out.append(slots.popleft()[0])
+        if out and not self.closed:
+            self.writer.write(b''.join(out))
+
+
+class AllocatorServer:
+    """
+    Asyncio pad-allocation service around a Protocol.
+    
+    Clients send pipelined RESERVE requests (see the wire format above).
+    Requests are queued per party, and once the event loop has read what is
+    ready (or batch_delay seconds later), each party's queue is served with
+    Protocol.attempt_send_batch: one allocation covers the whole accepted
+    prefix. A rejected request is answered with REJECT and the rest of the
+    queue is tried again, so every client sees the same outcome as if its
+    requests had been sent one by one in arrival order.
+    """
+    
+    def __init__(self, protocol, batch_delay=0.0):
+        """
+        Args:
+            protocol: Protocol to allocate from
+            batch_delay: Seconds to wait for more requests before allocating
+                (default: 0, allocate on the next event loop iteration)
+        """
+        self.protocol = protocol
+        self.batch_delay = batch_delay
+        self.requests = 0
+        self.allocations = 0
+        self.flushes = 0
+        self._lengths = [[] for _ in range(protocol.m)]
+        self._slots = [[] for _ in range(protocol.m)]
+        self._dirty = set()
+        self._scheduled = False
+        self._server = None
+    
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        """
+        Start listening on TCP host:port, or on a Unix socket if path is given.
+        
+        Returns:
+            The asyncio.Server (port=0 picks a free port; see its sockets)
+        """
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+    
+    async def close(self):
+        """Stop accepting connections and wait for the server to close."""
+        self._server.close()
+        await self._server.wait_closed()
+    
+    def _party_id(self, token):
+        """Map a party name or id from a request to its id (None if unknown)."""
+        party_id = self.protocol.party_ids.get(token.decode(errors='replace'))
+        if party_id is None and token.isdigit() and int(token) < self.protocol.m:
+            party_id = int(token)
+        return party_id
+    
+    def _request(self, connection, line):
+        """Queue one request line, or answer it at once if it is malformed."""
+        slot = [None]
+        connection.slots.append(slot)
+        self.requests += 1
+        parts = line.split()
+        if len(parts) != 3 or parts[0] != b'RESERVE':
+            slot[0] = b'ERR expected RESERVE <party> <length>\n'
+            return
+        party_id = self._party_id(parts[1])
+        if party_id is None:
+            slot[0] = b'ERR unknown party\n'
+            return
+        try:
+            length = int(parts[2])
+        except ValueError:
+            slot[0] = b'ERR length is not an integer\n'
+            return
+        self._lengths[party_id].append(length)
+        self._slots[party_id].append(slot)
+    
+    async def _handle(self, reader, writer):
+        """Serve one connection: queue its requests until the client closes it."""
+        connection = _Connection(writer)
+        pending = b''
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                lines = (pending + data).split(b'\n')
+                pending = lines.pop()
+                for line in lines:
+                    self._request(connection, line)
+                self._dirty.add(connection)
+                self._schedule()
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            connection.closed = True
+            writer.close()
+    
+    def _schedule(self):
+        """Arrange one _flush() for the requests queued so far."""
+        if self._scheduled:
+            return
+        self._scheduled = True
+        loop = asyncio.get_running_loop()
+        if self.batch_delay > 0:
+            loop.call_later(self.batch_delay, self._flush)
+        else:
+            loop.call_soon(self._flush)
+    
+    def _flush(self):
+        """Serve every party's queued requests, then write the answers in order."""
+        self._scheduled = False
+        self.flushes += 1
+        protocol = self.protocol
+        for party_id in range(protocol.m):
+            lengths = self._lengths[party_id]
+            if not lengths:
+                continue
+            slots = self._slots[party_id]
+            # Prefix sums of the whole queue, built once: after a rejection the next batch is found
+            # by bisecting from where the last one stopped. Lengths below 1 are always rejected, so
+            # they count as longer than any zone
+            too_long = protocol.n + 1
+            prefix = list(accumulate(length if length >= 1 else too_long for length in lengths))
+            i = 0
+            while i < len(lengths):
+                base = prefix[i - 1] if i else 0
+                end = bisect_right(prefix, base + protocol.capacity[party_id], i)
+                # The batch holds the accepted requests and the one that will be rejected
+                accepted, ranges = protocol.attempt_send_batch(party_id, lengths[i:end + 1])
+                self.allocations += 1
+                for slot, (start, stop) in zip(slots[i:i + accepted], ranges):
+                    slot[0] = b'OK %d %d\n' % (start, stop)
+                i += accepted
+                if i < len(lengths):
+                    # attempt_send_batch already counted this attempt
+                    slots[i][0] = b'REJECT %d\n' % protocol.capacity[party_id]
+                    i += 1
+            self._lengths[party_id] = []
+            self._slots[party_id] = []
+        
+        dirty = self._dirty
+        self._dirty = set()
+        for connection in dirty:
+            connection.write_ready()
+    
+    def statistics(self):
+        """Return request, allocation and flush counts plus the protocol's message counters."""
+        return {
+            'requests': self.requests,
+            'allocations': self.allocations,
+            'flushes': self.flushes,
+            'messages_sent': self.protocol.messages_sent,
+            'messages_attempted': self.protocol.messages_attempted,
+        }
+
+
+async def _client(reader, writer, requests, pipeline, parties, min_msg_length, max_msg_length, rng, latencies):
+    """Keep up to `pipeline` requests in flight on one connection; return response counts by kind."""
+    sent_at = deque()
+    sent = 0
+    
+    def send(count):
+        nonlocal sent
+        lines = [b'RESERVE %s %d\n' % (rng.choice(parties), rng.randint(min_msg_length, max_msg_length))
+                 for _ in range(count)]
+        writer.write(b''.join(lines))
+        now = time.perf_counter_ns()
+        sent_at.extend([now] * count)
+        sent += count
+    
+    send(min(pipeline, requests))
+    counts = {b'OK': 0, b'REJECT': 0, b'ERR': 0}
+    received = 0
+    pending = b''
+    while received < requests:
+        data = await reader.read(READ_SIZE)
+        if not data:
+            raise ConnectionError("Server closed the connection")
+        now = time.perf_counter_ns()
+        lines = (pending + data).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            latencies.append(now - sent_at.popleft())
+            counts[line.split(b' ', 1)[0]] += 1
+        received += len(lines)
+        refill = min(len(lines), requests - sent)
+        if refill:
+            send(refill)
+    writer.close()
+    return counts
+
+
+async def run_load(connect, connections=16, pipeline=32, requests=10000, parties=('Alice', 'Bob', 'Charlie', 'Dave'),
+                   min_msg_length=1, max_msg_length=50, seed=0):
+    """
+    Drive a server with concurrent pipelined clients and measure allocation latency.
+    
+    Args:
+        connect: Coroutine function returning a (reader, writer) pair for a new connection
+        connections: Concurrent client connections
+        pipeline: Requests each connection keeps in flight
+        requests: Requests per connection
+        parties: Party names the requests are spread over at random
+        min_msg_length: Minimum requested length
+        max_msg_length: Maximum requested length
+        seed: Seed for parties and lengths (one stream per connection)
+    
+    Returns:
+        Dictionary with requests, ok, rejected, errors, elapsed, requests_per_sec
+        and 'latency_us': {percentile: microseconds} for LATENCY_PERCENTILES
+    """
+    encoded = [party.encode() for party in parties]
+    streams = [await connect() for _ in range(connections)]
+    latencies = [[] for _ in range(connections)]
+    start = time.perf_counter()
+    counts = await asyncio.gather(*(
+        _client(reader, writer, requests, pipeline, encoded, min_msg_length, max_msg_length,
+                random.Random(f"{seed}:{i}"), latencies[i])
+        for i, (reader, writer) in enumerate(streams)))
+    elapsed = time.perf_counter() - start
+    
+    total = connections * requests
+    all_latencies = np.concatenate([np.array(values, np.int64) for values in latencies]) / 1000
+    percentiles = np.percentile(all_latencies, LATENCY_PERCENTILES)
+    return {
+        'requests': total,
+        'ok': sum(c[b'OK'] for c in counts),
+        'rejected': sum(c[b'REJECT'] for c in counts),
+        'errors': sum(c[b'ERR'] for c in counts),
+        'elapsed': elapsed,
+        'requests_per_sec': total / elapsed,
+        'latency_us': dict(zip(LATENCY_PERCENTILES, percentiles.tolist())),
+    }
+
+
+def _add_endpoint_arguments(parser):
+    """Add the --host, --port and --unix options."""
+    parser.add_argument('--host', default='127.0.0.1', help='TCP host (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=None, help='TCP port')
+    parser.add_argument('--unix', default=None, metavar='PATH', help='Unix socket path instead of TCP')
+
+
+def _add_protocol_arguments(parser):
+    """Add the options of the served protocol."""
+    parser.add_argument('--n', type=int, default=10**9, help='Total number of pads (default: 10^9)')
+    parser.add_argument('--d', type=int, default=10, help='Gap parameter (default: 10)')
+    parser.add_argument('--m', type=int, default=4, help='Number of parties (default: 4)')
+    parser.add_argument('--audit', choices=list(AUDIT_LEVELS), default='interval',
+                        help='Collision audit level (default: interval)')
+    parser.add_argument('--batch-delay', type=float, default=0.0,
+                        help='Seconds to wait for more requests before allocating (default: 0)')
+
+
+async def _serve(args):
+    """Run the service until SIGINT or SIGTERM, then print its statistics."""
+    server = AllocatorServer(Protocol(n=args.n, d=args.d, audit=args.audit, m=args.m), args.batch_delay)
+    listener = await server.start(args.host, args.port or 0, args.unix)
+    where = args.unix or ':'.join(str(part) for part in listener.sockets[0].getsockname()[:2])
+    print(f"Allocating {args.n} pads to {args.m} parties (d={args.d}) on {where}", flush=True)
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+    await stopped.wait()
+    await server.close()
+    if args.unix:
+        os.remove(args.unix)
+    print(server.statistics())
+
+
+async def _load(args):
+    """Run the load generator and print throughput and latency."""
+    server = None
+    path = args.unix
+    if args.port is None and args.unix is None:
+        # No server given: run one in this process on a temporary Unix socket
+        protocol = Protocol(n=args.n, d=args.d, audit=args.audit, m=args.m)
+        server = AllocatorServer(protocol, args.batch_delay)
+        path = os.path.join(tempfile.mkdtemp(prefix='otp-service-'), 'service.sock')
+        await server.start(path=path)
+    
+    if path is not None:
+        def connect():
+            return asyncio.open_unix_connection(path)
+    else:
+        def connect():
+            return asyncio.open_connection(args.host, args.port)
+    
+    parties = args.parties or party_names(args.m)
+    try:
+        result = await run_load(connect, args.connections, args.pipeline, args.requests, parties,
+                                args.min_msg_len, args.max_msg_len, args.seed)
+    finally:
+        if server is not None:
+            await server.close()
+            os.remove(path)
+            os.rmdir(os.path.dirname(path))
+    
+    print(f"{result['requests']} requests over {args.connections} connections, pipeline {args.pipeline}: "
+          f"{result['ok']} OK, {result['rejected']} rejected, {result['errors']} errors")
+    print(f"Throughput: {result['requests_per_sec']:,.0f} requests/sec ({result['elapsed']:.2f}s)")
+    print("Latency: " + ", ".join(f"p{p:g} {us:,.0f} us" for p, us in result['latency_us'].items()))
+    if server is not None:
+        stats = server.statistics()
+        print(f"Server: {stats['allocations']} allocations for {stats['requests']} requests "
+              f"({stats['requests'] / max(stats['allocations'], 1):.1f} per allocation)")
+
+
+def main(argv=None):
+    """Run the allocation service, or a load generator against it."""
+    parser = argparse.ArgumentParser(description='Pad-allocation service over the Parallel Pairs protocol')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    serve = commands.add_parser('serve', help='Run the allocation service')
+    _add_endpoint_arguments(serve)
+    _add_protocol_arguments(serve)
+    
+    load = commands.add_parser('load', help='Measure throughput and latency; without --port/--unix, '
+                                            'against a server started in this process')
+    _add_endpoint_arguments(load)
+    _add_protocol_arguments(load)
+    load.add_argument('--connections', type=int, default=16, help='Concurrent connections (default: 16)')
+    load.add_argument('--pipeline', type=int, default=32, help='Requests in flight per connection (default: 32)')
+    load.add_argument('--requests', type=int, default=10000, help='Requests per connection (default: 10000)')
+    load.add_argument('--parties', nargs='+', default=None,
+                      help='Party names to spread requests over (default: all parties of --m)')
+    load.add_argument('--min-msg-len', type=int, default=1, help='Minimum requested length (default: 1)')
+    load.add_argument('--max-msg-len', type=int, default=50, help='Maximum requested length (default: 50)')
+    load.add_argument('--seed', type=int, default=0, help='Seed for parties and lengths (default: 0)')
+    args = parser.parse_args(argv)
+    
+    try:
+        asyncio.run(_serve(args) if args.command == 'serve' else _load(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
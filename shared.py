@@ -0,0 +1,253 @@
+import argparse
+import multiprocessing
+import random
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ledger import AUDIT_LEVELS, check_run
+from parallel import derive_seed
+from protocol import Party, party_names, zone_bounds
+
+
+# Fields of a party's slot in the shared block, one int64 each
+CURRENT = 0    # Party.current_index: the next pad the party would use
+HAS_SENT = 1   # 1 once the party has sent
+SENT = 2       # Accepted messages
+ATTEMPTED = 3  # Send attempts
+START_NS = 4   # time.monotonic_ns() when the party started sending
+STOP_NS = 5    # time.monotonic_ns() when it stopped
+FIELDS = 6
+
+
+class SharedState:
+    """
+    Party positions of a Parallel Pairs protocol in a shared memory block.
+    
+    Layout (native int64):
+        slots   - m x FIELDS, one slot per party (see CURRENT ... STOP_NS)
+        runs    - m x max_messages x 2, the (start, stop) run of every accepted
+                  message, written by its party when it finishes (for the audit)
+    
+    Each party is the only writer of its own slot and runs. A party reads its
+    partner's slot, and publishes its own position, only while holding the
+    pair's lock (see run_shared), so it always checks against the partner's
+    latest position.
+    """
+    
+    def __init__(self, m, max_messages, name=None):
+        """
+        Args:
+            m: Number of parties
+            max_messages: Largest number of messages a party may send
+            name: Name of an existing block to attach to (default: create a new one)
+        """
+        self.m = m
+        self.max_messages = max_messages
+        slot_bytes = 8 * m * FIELDS
+        size = slot_bytes + 16 * m * max_messages
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.shm.buf[:size] = bytes(size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        # Flat memoryview for the hot path: item access is cheaper than on a NumPy array
+        self.slots = self.shm.buf[:slot_bytes].cast('q')
+        self.runs = np.ndarray((m, max_messages, 2), np.int64, self.shm.buf, slot_bytes)
+    
+    def get(self, party_id, field):
+        """Return one field of a party's slot."""
+        return self.slots[party_id * FIELDS + field]
+    
+    def close(self):
+        """Detach from the block (every process calls this)."""
+        self.slots.release()
+        self.runs = None
+        self.shm.close()
+    
+    def unlink(self):
+        """Free the block (the creating process calls this once, after close())."""
+        self.shm.unlink()
+
+
+def _party_start(party_id, zone):
+    """Return (start_index, direction) of a party in its zone."""
+    zone_min, zone_max = zone
+    if party_id % 2 == 0:
+        return zone_min, 1
+    return zone_max - 1, -1
+
+
+def _run_party(state, party_id, zone, d, lengths, lock, barrier):
+    """Send messages of the given lengths from one party until they run out or the party is blocked."""
+    zone_min, zone_max = zone
+    slots = state.slots
+    mine = party_id * FIELDS
+    theirs = (party_id ^ 1) * FIELDS
+    names = party_names(state.m)
+    me = Party(names[party_id], *_party_start(party_id, zone), zone_min, zone_max)
+    partner = Party(names[party_id ^ 1], *_party_start(party_id ^ 1, zone), zone_min, zone_max)
+    runs = []
+    attempted = 0
+    
+    barrier.wait()
+    slots[mine + START_NS] = time.monotonic_ns()
+    for length in lengths:
+        attempted += 1
+        with lock:
+            partner.current_index = slots[theirs + CURRENT]
+            partner.has_sent = slots[theirs + HAS_SENT] == 1
+            # Same bound Protocol keeps in its capacity list (Party.can_send)
+            capacity = me.get_capacity(partner.get_last_used_index(), d)
+            if 1 <= length <= capacity:
+                start, stop = me.consume_range(length)
+                partner_start, partner_stop = partner.get_used_range()
+                check_run(start, stop, zone_min, zone_max, partner_start, partner_stop)
+                slots[mine + CURRENT] = me.current_index
+                slots[mine + HAS_SENT] = 1
+                runs.append((start, stop))
+            elif capacity == 0:
+                # The partner only ever comes closer, so a blocked party stays blocked
+                break
+    slots[mine + STOP_NS] = time.monotonic_ns()
+    
+    if runs:
+        state.runs[party_id, :len(runs)] = runs
+    slots[mine + SENT] = len(runs)
+    slots[mine + ATTEMPTED] = attempted
+
+
+def _party_process(name, m, max_messages, party_id, zone, d, lengths, lock, barrier):
+    """Process entry point: attach to the shared block and run one party."""
+    state = SharedState(m, max_messages, name)
+    try:
+        _run_party(state, party_id, zone, d, lengths, lock, barrier)
+    finally:
+        state.close()
+
+
+def run_shared(n, d, m=4, messages=100000, min_msg_length=1, max_msg_length=50, audit='interval', seed=0):
+    """
+    Run every party of the protocol in its own process, concurrently.
+    
+    Party positions live in a SharedState block. The two parties of a zone
+    share a lock and hold it while they read the partner's position, check
+    the gap rule and publish their new position; parties of different zones
+    never wait for each other. Each party attempts up to `messages` sends of
+    uniformly random length and stops early once it is blocked.
+    
+    After the processes finish, every accepted run is marked in a ledger of
+    the given audit level, which raises on any pad used twice.
+    
+    Args:
+        n: Total number of pads
+        d: Gap parameter
+        m: Number of parties, and of processes (even)
+        messages: Send attempts per party
+        min_msg_length: Minimum message length
+        max_msg_length: Maximum message length
+        audit: Audit level of the final ledger (see ledger.AUDIT_LEVELS)
+        seed: Seed for the message lengths (one derived stream per party)
+    
+    Returns:
+        Dictionary with processes, messages_sent, messages_attempted,
+        used_pads, elapsed (seconds from the first party's start to the last
+        party's stop) and messages_per_sec
+    
+    Raises:
+        RuntimeError: If a party process fails
+        AssertionError: If the audit finds a pad used twice
+    """
+    if m < 2 or m % 2:
+        raise ValueError(f"Number of parties must be a positive even number, got {m}")
+    if audit not in AUDIT_LEVELS:
+        raise ValueError(f"Unknown audit level: {audit}")
+    zones = zone_bounds(n, m // 2)
+    names = party_names(m)
+    context = multiprocessing.get_context()
+    locks = [context.Lock() for _ in zones]
+    barrier = context.Barrier(m)
+    
+    state = SharedState(m, messages)
+    try:
+        for party_id in range(m):
+            state.slots[party_id * FIELDS + CURRENT] = _party_start(party_id, zones[party_id // 2])[0]
+        
+        processes = []
+        for party_id in range(m):
+            rng = random.Random(derive_seed(seed, party_id, 'shared'))
+            lengths = [rng.randint(min_msg_length, max_msg_length) for _ in range(messages)]
+            processes.append(context.Process(
+                target=_party_process, name=names[party_id],
+                args=(state.name, m, messages, party_id, zones[party_id // 2], d, lengths,
+                      locks[party_id // 2], barrier)))
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        failed = [process.name for process in processes if process.exitcode != 0]
+        if failed:
+            raise RuntimeError(f"Party processes failed: {', '.join(failed)}")
+        
+        ledger = AUDIT_LEVELS[audit](n)
+        sent = [state.get(party_id, SENT) for party_id in range(m)]
+        runs = np.concatenate([state.runs[party_id, :count] for party_id, count in enumerate(sent)])
+        for start, stop in runs[np.argsort(runs[:, 0], kind='stable')].tolist():
+            ledger.mark(start, stop)
+        for party_id in range(m):
+            # Each party's runs must add up to the position it published
+            start_index, direction = _party_start(party_id, zones[party_id // 2])
+            party_runs = state.runs[party_id, :sent[party_id]]
+            consumed = int((party_runs[:, 1] - party_runs[:, 0]).sum())
+            assert state.get(party_id, CURRENT) == start_index + direction * consumed, \
+                f"{names[party_id]}: published position does not match its runs"
+        
+        started = min(state.get(party_id, START_NS) for party_id in range(m))
+        stopped = max(state.get(party_id, STOP_NS) for party_id in range(m))
+        elapsed = (stopped - started) / 1e9
+        messages_sent = sum(sent)
+        return {
+            'processes': m,
+            'messages_sent': messages_sent,
+            'messages_attempted': sum(state.get(party_id, ATTEMPTED) for party_id in range(m)),
+            'used_pads': ledger.used,
+            'elapsed': elapsed,
+            'messages_per_sec': messages_sent / elapsed if elapsed > 0 else 0.0,
+        }
+    finally:
+        state.close()
+        state.unlink()
+
+
+def main():
+    """Concurrent load test: aggregate messages/sec as the number of party processes grows."""
+    parser = argparse.ArgumentParser(description='Parties as concurrent processes over shared-memory positions')
+    parser.add_argument('--n', type=int, default=10**8, help='Total number of pads (default: 10^8)')
+    parser.add_argument('--d', type=int, default=10, help='Gap parameter (default: 10)')
+    parser.add_argument('--processes', type=int, nargs='+', default=[2, 4, 8, 16],
+                        help='Numbers of parties to run, one process each (default: 2 4 8 16)')
+    parser.add_argument('--messages', type=int, default=100000, help='Send attempts per party (default: 100000)')
+    parser.add_argument('--min-msg-len', type=int, default=1, help='Minimum message length (default: 1)')
+    parser.add_argument('--max-msg-len', type=int, default=50, help='Maximum message length (default: 50)')
+    parser.add_argument('--audit', choices=list(AUDIT_LEVELS), default='interval',
+                        help='Audit level of the final collision check (default: interval)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the message lengths (default: 0)')
+    args = parser.parse_args()
+    
+    print(f"n={args.n}, d={args.d}, {args.messages} attempts per party, audit={args.audit}, "
+          f"{multiprocessing.cpu_count()} CPUs")
+    print(f"{'Processes':>9} {'Sent':>12} {'Attempted':>12} {'Seconds':>9} {'Msgs/sec':>14} {'Speedup':>8}")
+    baseline = None
+    for m in args.processes:
+        result = run_shared(args.n, args.d, m, args.messages, args.min_msg_len, args.max_msg_len,
+                            args.audit, args.seed)
+        rate = result['messages_per_sec']
+        baseline = baseline or rate
+        print(f"{m:>9} {result['messages_sent']:>12} {result['messages_attempted']:>12} "
+              f"{result['elapsed']:>9.3f} {rate:>14,.0f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
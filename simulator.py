@@ -1,109 +1,199 @@
 import random
-from protocol import Protocol
+from protocol import Protocol, party_names
 
 
-def run_scenario_1(n, d, min_msg_length=1, max_msg_length=50):
+# How a drawn message length that does not fit the sender's capacity is handled:
+#   retry    - redraw lengths for the same sender until one fits
+#   truncate - send as many pads as still fit
+#   drop     - the sender stops sending for the rest of the execution
+REJECTION_POLICIES = ('retry', 'truncate', 'drop')
+
+
+def send_until_exhausted(protocol, active_parties, min_msg_length, max_msg_length, rng, policy='retry',
+                         rebalance=False):
     """
-    Scenario S.1: Only 1 randomly chosen party sends messages.
+    Send messages from randomly chosen active parties until none can send again.
+    
+    A party whose capacity is below min_msg_length (at least 1) can never send again
+    (capacities only shrink), so it is removed from the active set. The loop
+    ends exactly when the active set is empty.
+    
+    With rebalance=True an exhausted party first asks the protocol to move its
+    pair into pads donated by another zone (Protocol.rebalance), and is only
+    removed once no zone can donate. Under 'drop' a rejected length likewise
+    asks for a zone it fits in before the party is dropped.
     
     Args:
-        n: Total number of pads
-        d: Gap parameter
+        protocol: Protocol instance to send through
+        active_parties: Names of the parties that send messages
         min_msg_length: Minimum message length
         max_msg_length: Maximum message length
+        rng: Random number generator
+        policy: Handling of lengths that do not fit (see REJECTION_POLICIES)
+        rebalance: Let exhausted pairs claim free pads from other zones
     
     Returns:
-        Dictionary with simulation results
+        Number of messages sent
     """
-    protocol = Protocol(n=n, d=d)
-    
-    # Randomly select 1 party to be active
-    active_party = random.choice(["Alice", "Bob", "Charlie", "Dave"])
+    if policy not in REJECTION_POLICIES:
+        raise ValueError(f"Unknown rejection policy: {policy}")
     
+    # Lengths below 1 are always rejected, so they can never be sent
+    min_msg_length = max(1, min_msg_length)
+    active = list(active_parties)
     messages_sent = 0
     
-    # Send messages until protocol terminates
-    while not protocol.is_terminated():
+    while active:
+        # Randomly choose which active party sends
+        sender = active[0] if len(active) == 1 else rng.choice(active)
+        capacity = protocol.get_capacity(sender)
+        
+        if capacity < min_msg_length:
+            if rebalance and protocol.rebalance(sender, min_msg_length):
+                continue
+            # No message length can ever fit again
+            active.remove(sender)
+            continue
+        
         # Random message length
-        msg_length = random.randint(min_msg_length, max_msg_length)
+        msg_length = rng.randint(min_msg_length, max_msg_length)
         
-        # Attempt to send from active party
-        success = protocol.attempt_send(active_party, msg_length)
+        if msg_length > capacity:
+            if policy == 'truncate':
+                msg_length = capacity
+            elif policy == 'retry':
+                # Terminates: capacity >= min_msg_length, so some length fits
+                while not protocol.attempt_send(sender, msg_length):
+                    msg_length = rng.randint(min_msg_length, max_msg_length)
+                messages_sent += 1
+                continue
+            elif not (rebalance and protocol.rebalance(sender, msg_length)):
+                protocol.attempt_send(sender, msg_length)  # Recorded as a rejected attempt
+                active.remove(sender)
+                continue
+            # Otherwise the pair moved to a zone where this length fits
         
-        if success:
+        if protocol.attempt_send(sender, msg_length):
             messages_sent += 1
-        else:
-            # If the active party can't send, protocol should terminate
-            break
     
-    return {
-        'scenario': 'S.1',
-        'active_party': active_party,
-        'total_pads': n,
-        'used_pads': protocol.get_used_pads(),
-        'wasted_pads': protocol.get_wasted_pads(),
-        'waste_percentage': protocol.get_waste_percentage(),
-        'messages_sent': messages_sent,
-        'messages_attempted': protocol.messages_attempted
-    }
+    return messages_sent
 
 
-def run_scenario_2(n, d, min_msg_length=1, max_msg_length=50):
+def scenario_name(active, m=4):
     """
-    Scenario S.2: 2 randomly chosen parties send messages.
+    Return the label of the scenario with `active` senders out of m parties.
+    
+    Args:
+        active: Number of active parties (x)
+        m: Number of parties
+    
+    Returns:
+        'S.x' for the classic m=4 layout, 'S.x/m' otherwise
+    """
+    if m == 4:
+        return f"S.{active}"
+    return f"S.{active}/{m}"
+
+
+def run_scenario(n, d, active, m=4, zone_sizes=None, min_msg_length=1, max_msg_length=50, rng=None,
+                 policy='retry', audit='interval', rebalance=False, instrument=False, recorder=None):
+    """
+    Scenario S.x: x randomly chosen parties out of m send messages.
     Who sends each message is randomly selected.
     
     Args:
         n: Total number of pads
         d: Gap parameter
+        active: Number of active parties (x, 1 <= x <= m)
+        m: Number of parties (even)
+        zone_sizes: Optional list of m/2 zone sizes summing to n
         min_msg_length: Minimum message length
         max_msg_length: Maximum message length
+        rng: Random number generator (default: the global random module)
+        policy: Handling of lengths that do not fit (see REJECTION_POLICIES)
+        audit: Collision audit level passed to Protocol ('off', 'interval' or 'full')
+        rebalance: Let exhausted pairs claim free pads from other zones (see Protocol.rebalance)
+        instrument: Count rejected attempts by reason (see instrumentation.Instrumentation)
+        recorder: Optional tracefile.TraceWriter that records every attempt for replay
     
     Returns:
-        Dictionary with simulation results
+        Dictionary with simulation results (plus 'rebalances' if rebalancing is on, and
+        'rejected_zone' and 'rejected_gap' if instrumented)
     """
-    protocol = Protocol(n=n, d=d)
+    if not 1 <= active <= m:
+        raise ValueError(f"Number of active parties must be between 1 and {m}, got {active}")
+    if rng is None:
+        rng = random
     
-    # Randomly select 2 parties to be active
-    all_parties = ["Alice", "Bob", "Charlie", "Dave"]
-    active_parties = random.sample(all_parties, 2)
+    instrumentation = None
+    if instrument or recorder is not None:
+        from instrumentation import Instrumentation
+        instrumentation = Instrumentation(trace=None if recorder is None else recorder.record)
     
-    messages_sent = 0
-    consecutive_failures = 0
-    max_consecutive_failures = 50  # Prevent infinite loops
+    protocol = Protocol(n=n, d=d, audit=audit, m=m, zone_sizes=zone_sizes, instrumentation=instrumentation)
+    all_parties = party_names(m)
     
-    # Send messages until protocol terminates or active parties can't send
-    while not protocol.is_terminated() and consecutive_failures < max_consecutive_failures:
-        # Random message length
-        msg_length = random.randint(min_msg_length, max_msg_length)
-        
-        # Randomly choose which of the 2 active parties sends
-        sender = random.choice(active_parties)
-        
-        # Attempt to send
-        success = protocol.attempt_send(sender, msg_length)
-        
-        if success:
-            messages_sent += 1
-            consecutive_failures = 0  # Reset counter on success
-        else:
-            consecutive_failures += 1
+    # Randomly select the active parties (all of them, in order, if x = m)
+    if active == 1:
+        active_parties = [rng.choice(all_parties)]
+    elif active == m:
+        active_parties = all_parties
+    else:
+        active_parties = rng.sample(all_parties, active)
+    
+    if recorder is not None:
+        recorder.begin_execution(protocol, active, rebalance)
+    
+    # Send messages until no active party can send
+    messages_sent = send_until_exhausted(
+        protocol, active_parties, min_msg_length, max_msg_length, rng, policy, rebalance
+    )
     
-    return {
-        'scenario': 'S.2',
-        'active_parties': active_parties,
+    result = {'scenario': scenario_name(active, m)}
+    if active == 1:
+        result['active_party'] = active_parties[0]
+    else:
+        result['active_parties'] = active_parties
+    result.update({
         'total_pads': n,
         'used_pads': protocol.get_used_pads(),
         'wasted_pads': protocol.get_wasted_pads(),
         'waste_percentage': protocol.get_waste_percentage(),
         'messages_sent': messages_sent,
         'messages_attempted': protocol.messages_attempted
-    }
+    })
+    if rebalance:
+        result['rebalances'] = protocol.rebalances
+    if instrument:
+        totals = instrumentation.totals()
+        result['rejected_zone'] = totals['rejected_zone']
+        result['rejected_gap'] = totals['rejected_gap']
+    return result
 
 
-def run_scenario_4(n, d, min_msg_length=1, max_msg_length=50):
+def run_scenario_1(n, d, min_msg_length=1, max_msg_length=50, rng=None, policy='retry', audit='interval'):
     """
-    Scenario S.4: All 4 parties send messages.
+    Scenario S.1: Only 1 randomly chosen party sends messages.
+    
+    Args:
+        n: Total number of pads
+        d: Gap parameter
+        min_msg_length: Minimum message length
+        max_msg_length: Maximum message length
+        rng: Random number generator (default: the global random module)
+        policy: Handling of lengths that do not fit (see REJECTION_POLICIES)
+        audit: Collision audit level passed to Protocol ('off', 'interval' or 'full')
+    
+    Returns:
+        Dictionary with simulation results
+    """
+    return run_scenario(n, d, 1, min_msg_length=min_msg_length, max_msg_length=max_msg_length,
+                        rng=rng, policy=policy, audit=audit)
+
+
+def run_scenario_2(n, d, min_msg_length=1, max_msg_length=50, rng=None, policy='retry', audit='interval'):
+    """
+    Scenario S.2: 2 randomly chosen parties send messages.
     Who sends each message is randomly selected.
     
     Args:
@@ -111,67 +201,81 @@ def run_scenario_4(n, d, min_msg_length=1, max_msg_length=50):
         d: Gap parameter
         min_msg_length: Minimum message length
         max_msg_length: Maximum message length
+        rng: Random number generator (default: the global random module)
+        policy: Handling of lengths that do not fit (see REJECTION_POLICIES)
+        audit: Collision audit level passed to Protocol ('off', 'interval' or 'full')
     
     Returns:
         Dictionary with simulation results
     """
-    protocol = Protocol(n=n, d=d)
+    return run_scenario(n, d, 2, min_msg_length=min_msg_length, max_msg_length=max_msg_length,
+                        rng=rng, policy=policy, audit=audit)
+
+
+def run_scenario_4(n, d, min_msg_length=1, max_msg_length=50, rng=None, policy='retry', audit='interval'):
+    """
+    Scenario S.4: All 4 parties send messages.
+    Who sends each message is randomly selected.
     
-    # All 4 parties are active
-    active_parties = ["Alice", "Bob", "Charlie", "Dave"]
+    Args:
+        n: Total number of pads
+        d: Gap parameter
+        min_msg_length: Minimum message length
+        max_msg_length: Maximum message length
+        rng: Random number generator (default: the global random module)
+        policy: Handling of lengths that do not fit (see REJECTION_POLICIES)
+        audit: Collision audit level passed to Protocol ('off', 'interval' or 'full')
     
-    messages_sent = 0
-    consecutive_failures = 0
-    max_consecutive_failures = 100  # Prevent infinite loops (4 parties, more attempts needed)
+    Returns:
+        Dictionary with simulation results
+    """
+    return run_scenario(n, d, 4, min_msg_length=min_msg_length, max_msg_length=max_msg_length,
+                        rng=rng, policy=policy, audit=audit)
+
+
+def iter_executions(scenario_func, num_executions, n, d, min_msg_length=1, max_msg_length=50, rng=None,
+                    **scenario_kwargs):
+    """
+    Run a scenario multiple times, yielding each result as it is produced.
     
-    # Send messages until protocol terminates or all active parties can't send
-    while not protocol.is_terminated() and consecutive_failures < max_consecutive_failures:
-        # Random message length
-        msg_length = random.randint(min_msg_length, max_msg_length)
-        
-        # Randomly choose which party sends
-        sender = random.choice(active_parties)
-        
-        # Attempt to send
-        success = protocol.attempt_send(sender, msg_length)
-        
-        if success:
-            messages_sent += 1
-            consecutive_failures = 0  # Reset counter on success
-        else:
-            consecutive_failures += 1
+    Same executions as run_multiple_executions, without holding them all in
+    memory.
     
-    return {
-        'scenario': 'S.4',
-        'active_parties': active_parties,
-        'total_pads': n,
-        'used_pads': protocol.get_used_pads(),
-        'wasted_pads': protocol.get_wasted_pads(),
-        'waste_percentage': protocol.get_waste_percentage(),
-        'messages_sent': messages_sent,
-        'messages_attempted': protocol.messages_attempted
-    }
+    Args:
+        scenario_func: The scenario function to run (run_scenario_1, run_scenario_2, run_scenario_4, or run_scenario)
+        num_executions: Number of times to run the scenario
+        n: Total number of pads
+        d: Gap parameter
+        min_msg_length: Minimum message length
+        max_msg_length: Maximum message length
+        rng: Random number generator shared by all executions (default: the global random module)
+        **scenario_kwargs: Extra keyword arguments for the scenario (e.g. policy, audit, or active and m for run_scenario)
+    
+    Yields:
+        Result dictionary of each execution
+    """
+    for i in range(num_executions):
+        yield scenario_func(n=n, d=d, min_msg_length=min_msg_length, max_msg_length=max_msg_length, rng=rng,
+                            **scenario_kwargs)
 
 
-def run_multiple_executions(scenario_func, num_executions, n, d, min_msg_length=1, max_msg_length=50):
+def run_multiple_executions(scenario_func, num_executions, n, d, min_msg_length=1, max_msg_length=50, rng=None,
+                            **scenario_kwargs):
     """
     Run a scenario multiple times and collect statistics.
     
     Args:
-        scenario_func: The scenario function to run (run_scenario_1, run_scenario_2, or run_scenario_4)
+        scenario_func: The scenario function to run (run_scenario_1, run_scenario_2, run_scenario_4, or run_scenario)
         num_executions: Number of times to run the scenario
         n: Total number of pads
         d: Gap parameter
         min_msg_length: Minimum message length
         max_msg_length: Maximum message length
+        rng: Random number generator shared by all executions (default: the global random module)
+        **scenario_kwargs: Extra keyword arguments for the scenario (e.g. policy, audit, or active and m for run_scenario)
     
     Returns:
         List of results from each execution
     """
-    results = []
-    
-    for i in range(num_executions):
-        result = scenario_func(n=n, d=d, min_msg_length=min_msg_length, max_msg_length=max_msg_length)
-        results.append(result)
-    
-    return results
+    return list(iter_executions(scenario_func, num_executions, n, d, min_msg_length, max_msg_length, rng,
+                                **scenario_kwargs))
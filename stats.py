@@ -0,0 +1,292 @@
+import math
+from statistics import NormalDist
+
+
+class RunningStats:
+    """
+    Online mean, variance, minimum and maximum of a stream of numbers.
+    
+    The variance uses Welford's update, so memory is constant and it stays
+    accurate even when the values are large compared with their spread. The
+    mean comes from a compensated (Neumaier) running sum, which keeps it equal
+    to the exactly rounded mean of the values in practice.
+    """
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.compensation = 0.0  # Low-order bits lost from total
+        self.welford_mean = 0.0
+        self.m2 = 0.0  # Sum of squared deviations from the mean
+        self.min = None
+        self.max = None
+    
+    @property
+    def mean(self):
+        """Mean of the values so far (0 if none)."""
+        return (self.total + self.compensation) / self.count if self.count else 0.0
+    
+    def add(self, value):
+        """Add one value to the stream."""
+        self.count += 1
+        
+        total = self.total + value
+        if abs(self.total) >= abs(value):
+            self.compensation += (self.total - total) + value
+        else:
+            self.compensation += (value - total) + self.total
+        self.total = total
+        
+        delta = value - self.welford_mean
+        self.welford_mean += delta / self.count
+        self.m2 += delta * (value - self.welford_mean)
+        
+        if self.count == 1:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+    
+    def variance(self):
+        """Return the sample variance (0 for fewer than two values)."""
+        if self.count < 2:
+            return 0
+        return self.m2 / (self.count - 1)
+    
+    def stdev(self):
+        """Return the sample standard deviation (0 for fewer than two values)."""
+        return math.sqrt(self.variance()) if self.count > 1 else 0
+    
+    def confidence_half_width(self, confidence=0.95):
+        """
+        Half-width of the normal-approximation confidence interval for the mean.
+        
+        Args:
+            confidence: Confidence level (e.g. 0.95)
+        
+        Returns:
+            z * stdev / sqrt(count), or infinity for fewer than two values
+        """
+        if self.count < 2:
+            return math.inf
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        return z * self.stdev() / math.sqrt(self.count)
+    
+    def __repr__(self):
+        return f"RunningStats(count={self.count}, mean={self.mean:.4g}, stdev={self.stdev():.4g})"
+
+
+class P2Quantile:
+    """
+    Streaming estimate of one quantile using the P-square algorithm.
+    
+    Keeps five markers whose heights track the minimum, the quantile, the
+    maximum and two points in between (Jain & Chlamtac, 1985). Memory is
+    constant; the first five values are kept exactly.
+    """
+    
+    def __init__(self, q):
+        """
+        Args:
+            q: Quantile to estimate, between 0 and 1 (0.5 is the median)
+        """
+        if not 0 < q < 1:
+            raise ValueError(f"Quantile must be between 0 and 1, got {q}")
+        self.q = q
+        self.count = 0
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * q, 4 * q, 2 + 2 * q, 4]
+        self.increments = [0, q / 2, q, (1 + q) / 2, 1]
+    
+    def add(self, value):
+        """Add one value to the stream."""
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:
+            heights.append(value)
+            heights.sort()
+            return
+        
+        # Find the cell holding the value, extending the extremes if needed
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+        
+        positions = self.positions
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        
+        # Move the three middle markers towards their desired positions
+        for i in (1, 2, 3):
+            offset = self.desired[i] - positions[i]
+            if ((offset >= 1 and positions[i + 1] - positions[i] > 1)
+                    or (offset <= -1 and positions[i - 1] - positions[i] < -1)):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+    
+    def _parabolic(self, i, step):
+        """Piecewise-parabolic prediction of marker i's height after moving one step."""
+        h, n = self.heights, self.positions
+        return h[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+    
+    def value(self):
+        """Return the current estimate (None before any value was added)."""
+        if not self.heights:
+            return None
+        if self.count <= 5:
+            # Exact nearest-rank quantile of the few values seen so far
+            rank = max(1, math.ceil(self.q * self.count))
+            return self.heights[rank - 1]
+        return self.heights[2]
+
+
+class Histogram:
+    """Fixed-width histogram over [low, high]; values outside are clamped into the end bins."""
+    
+    def __init__(self, low, high, bins=20):
+        """
+        Args:
+            low: Lower edge of the first bin
+            high: Upper edge of the last bin
+            bins: Number of bins
+        """
+        if not high > low or bins < 1:
+            raise ValueError("Histogram needs high > low and at least one bin")
+        self.low = low
+        self.high = high
+        self.width = (high - low) / bins
+        self.counts = [0] * bins
+    
+    def add(self, value):
+        """Count one value."""
+        index = int((value - self.low) / self.width)
+        self.counts[min(max(index, 0), len(self.counts) - 1)] += 1
+    
+    def edges(self):
+        """Return the bin edges, one more than the number of bins."""
+        return [self.low + i * self.width for i in range(len(self.counts) + 1)]
+    
+    def total(self):
+        """Return the number of values counted."""
+        return sum(self.counts)
+
+
+class ScenarioStatistics:
+    """
+    Constant-memory summary of a stream of scenario results.
+    
+    Feed result dictionaries (as returned by run_scenario and the other
+    engines) to add(); summary() returns the same metrics as a list-based
+    computation, plus streaming quantiles and a histogram of waste percentage.
+    """
+    
+    QUANTILES = (0.5, 0.9, 0.99)
+    
+    def __init__(self, histogram_bins=20):
+        """
+        Args:
+            histogram_bins: Number of bins for the waste percentage histogram over [0, 100]
+        """
+        self.wasted = RunningStats()
+        self.waste_pct = RunningStats()
+        self.messages = RunningStats()
+        self.used = RunningStats()
+        self.quantiles = [P2Quantile(q) for q in self.QUANTILES]
+        self.histogram = Histogram(0, 100, histogram_bins)
+        
+        # Engine-specific fields, set up on the first result that has them
+        self.collisions = None
+        self.collided_pads = None
+        self.max_in_flight = None
+        self.rebalances = None
+        self.rejected_zone = None
+        self.rejected_gap = None
+    
+    def add(self, result):
+        """Add one execution result."""
+        waste_pct = result['waste_percentage']
+        self.wasted.add(result['wasted_pads'])
+        self.waste_pct.add(waste_pct)
+        self.messages.add(result['messages_sent'])
+        self.used.add(result['used_pads'])
+        for quantile in self.quantiles:
+            quantile.add(waste_pct)
+        self.histogram.add(waste_pct)
+        
+        if 'collisions' in result:
+            if self.collisions is None:
+                self.collisions, self.collided_pads, self.max_in_flight = RunningStats(), RunningStats(), 0
+            self.collisions.add(result['collisions'])
+            self.collided_pads.add(result['collided_pads'])
+            self.max_in_flight = max(self.max_in_flight, result['max_in_flight'])
+        if 'rebalances' in result:
+            if self.rebalances is None:
+                self.rebalances = RunningStats()
+            self.rebalances.add(result['rebalances'])
+        if 'rejected_zone' in result:
+            if self.rejected_zone is None:
+                self.rejected_zone, self.rejected_gap = RunningStats(), RunningStats()
+            self.rejected_zone.add(result['rejected_zone'])
+            self.rejected_gap.add(result['rejected_gap'])
+    
+    def summary(self, confidence=0.95):
+        """
+        Return the statistics of all results added so far.
+        
+        Args:
+            confidence: Confidence level for 'ci_waste_pct'
+        
+        Returns:
+            Dictionary with avg/std/min/max of wasted pads, avg/std of waste
+            percentage, average messages and used pads, the execution count,
+            'ci_waste_pct' (confidence interval half-width of the average waste
+            percentage), 'waste_pct_quantiles' ({q: estimate}) and 'histogram',
+            plus collision, handoff and rejection averages when the results carry them
+        """
+        if not self.wasted.count:
+            raise ValueError("No results to summarize")
+        
+        stats = {
+            'avg_wasted': self.wasted.mean,
+            'std_wasted': self.wasted.stdev(),
+            'min_wasted': self.wasted.min,
+            'max_wasted': self.wasted.max,
+            'avg_waste_pct': self.waste_pct.mean,
+            'std_waste_pct': self.waste_pct.stdev(),
+            'avg_messages': self.messages.mean,
+            'avg_used': self.used.mean,
+            'executions': self.wasted.count,
+            'ci_waste_pct': self.waste_pct.confidence_half_width(confidence),
+            'waste_pct_quantiles': {quantile.q: quantile.value() for quantile in self.quantiles},
+            'histogram': self.histogram
+        }
+        
+        if self.collisions is not None:
+            stats['avg_collisions'] = self.collisions.mean
+            stats['avg_collided_pads'] = self.collided_pads.mean
+            stats['max_in_flight'] = self.max_in_flight
+        if self.rebalances is not None:
+            stats['avg_rebalances'] = self.rebalances.mean
+        if self.rejected_zone is not None:
+            stats['avg_rejected_zone'] = self.rejected_zone.mean
+            stats['avg_rejected_gap'] = self.rejected_gap.mean
+        
+        return stats
@@ -0,0 +1,454 @@
+import argparse
+import csv
+import functools
+import hashlib
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+from parallel import iter_parallel_executions
+from simulator import run_scenario, scenario_name, REJECTION_POLICIES
+from stats import ScenarioStatistics
+
+
+# Bump when any engine's results change for the same parameters and seed, so stale cache entries are not reused
+ENGINE_VERSION = 2
+
+# Grid parameters: (type, default values)
+GRID_PARAMETERS = {
+    'n': (int, [1000]),
+    'd': (int, [10]),
+    'min_msg_len': (int, [1]),
+    'max_msg_len': (int, [50]),
+    'm': (int, [4]),
+    'active': (int, [1, 2, 4]),
+    'policy': (str, ['retry']),
+    'distribution': (str, [None]),
+    'executions': (int, [100]),
+}
+
+DEFAULT_CACHE_DIR = '.sweep_cache'
+
+
+def parse_values(key, text):
+    """
+    Parse the values of one grid parameter.
+    
+    Integer parameters accept comma-separated values and inclusive ranges
+    START:STOP[:STEP] (e.g. '1000,5000' or '5:20:5'); '1e6' is read as 1000000.
+    Other parameters take comma-separated strings.
+    
+    Args:
+        key: Grid parameter name
+        text: Value text
+    
+    Returns:
+        List of values
+    """
+    kind = GRID_PARAMETERS[key][0]
+    values = []
+    for item in text.split(','):
+        if kind is str:
+            values.append(item)
+            continue
+        bounds = [_parse_int(part) for part in item.split(':')]
+        if len(bounds) == 1:
+            values.extend(bounds)
+        elif len(bounds) in (2, 3) and (len(bounds) == 2 or bounds[2] > 0):
+            step = bounds[2] if len(bounds) == 3 else 1
+            values.extend(range(bounds[0], bounds[1] + 1, step))
+        else:
+            raise ValueError(f"Invalid range for {key}: {item}")
+    return values
+
+
+def _parse_int(text):
+    """Parse an integer grid value, accepting exponent forms such as 1e6."""
+    value = float(text)
+    if value != int(value):
+        raise ValueError(f"Expected an integer, got {text}")
+    return int(value)
+
+
+def parse_grid(items, grid_file=None):
+    """
+    Build a parameter grid from KEY=VALUES items and an optional JSON file.
+    
+    Args:
+        items: Strings such as 'n=1000,10000' or 'd=5:20:5' (see parse_values)
+        grid_file: Path of a JSON object mapping parameter names to lists of values
+    
+    Returns:
+        Dictionary mapping every grid parameter to its list of values;
+        parameters not given keep their defaults
+    """
+    grid = {key: list(default) for key, (_, default) in GRID_PARAMETERS.items()}
+    if grid_file is not None:
+        with open(grid_file) as f:
+            spec = json.load(f)
+        for key, values in spec.items():
+            if key not in GRID_PARAMETERS:
+                raise ValueError(f"Unknown grid parameter: {key}")
+            grid[key] = values if isinstance(values, list) else [values]
+    for item in items:
+        key, sep, text = item.partition('=')
+        key = key.replace('-', '_')
+        if not sep or key not in GRID_PARAMETERS:
+            raise ValueError(f"Invalid grid item: {item} (expected KEY=VALUES with KEY one of "
+                             f"{', '.join(GRID_PARAMETERS)})")
+        grid[key] = parse_values(key, text)
+    return grid
+
+
+def grid_points(grid, engine='scalar'):
+    """
+    Expand a grid into its valid parameter points.
+    
+    Args:
+        grid: Dictionary from parse_grid()
+        engine: Engine the points will run on
+    
+    Returns:
+        (points, skipped): list of point dictionaries in grid order, and the
+        number of combinations skipped as invalid (e.g. more active parties than m)
+    """
+    points = []
+    skipped = 0
+    keys = list(GRID_PARAMETERS)
+    for values in itertools.product(*(grid[key] for key in keys)):
+        point = dict(zip(keys, values))
+        if validate_point(point, engine) is None:
+            points.append(point)
+        else:
+            skipped += 1
+    return points, skipped
+
+
+def validate_point(point, engine='scalar'):
+    """Return why a point cannot run, or None if it can."""
+    if point['m'] < 2 or point['m'] % 2:
+        return "m must be a positive even number"
+    if not 1 <= point['active'] <= point['m']:
+        return "active must be between 1 and m"
+    if point['n'] < point['m'] // 2 or point['d'] < 0 or point['executions'] < 1:
+        return "n, d or executions out of range"
+    if point['distribution'] is None and not 1 <= point['min_msg_len'] <= point['max_msg_len']:
+        return "invalid message length range"
+    if point['policy'] not in REJECTION_POLICIES:
+        return f"unknown policy {point['policy']}"
+    if engine == 'analytic' and point['active'] not in (1, 2):
+        return "the analytic engine covers S.1 and S.2 only"
+    return None
+
+
+def point_distribution(point):
+    """Return the point's LengthDistribution, or None for the default uniform lengths."""
+    if point['distribution'] is None:
+        return None
+    from workload import make_distribution
+    return make_distribution(point['distribution'], point['min_msg_len'], point['max_msg_len'])
+
+
+def cache_params(point, engine, seed):
+    """
+    Parameters that determine a point's results, in canonical form for hashing.
+    
+    A distribution is identified by its probabilities as well as its spec, so
+    editing an empirical length file invalidates the cached points that used it.
+    The analytic engine is exact, so its entries do not depend on the seed or
+    the execution count.
+    """
+    params = dict(point, engine=engine, engine_version=ENGINE_VERSION)
+    distribution = point_distribution(point)
+    if distribution is not None:
+        params['distribution_digest'] = hashlib.sha256(distribution.probabilities.tobytes()).hexdigest()
+    if engine == 'analytic':
+        del params['executions']
+    else:
+        params['seed'] = seed
+    return params
+
+
+class ResultCache:
+    """
+    Content-addressed store of aggregated per-point results.
+    
+    Each entry is a JSON file named by the SHA-256 of its canonical
+    parameters. Entries are written to a temporary file and renamed into
+    place, so an interrupted sweep never leaves a partial entry. A file's
+    modification time is refreshed on every hit, so eviction by age or size
+    drops the least recently used entries first.
+    """
+    
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        """
+        Args:
+            directory: Cache directory (created on first write)
+        """
+        self.directory = directory
+    
+    @staticmethod
+    def key(params):
+        """Return the hex digest addressing a parameter dictionary."""
+        canonical = json.dumps(params, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+    
+    def path(self, key):
+        """Return the file path of an entry."""
+        return os.path.join(self.directory, f"{key}.json")
+    
+    def get(self, params):
+        """Return the cached statistics for params, or None on a miss."""
+        path = self.path(self.key(params))
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('params') != params:
+            return None
+        os.utime(path)
+        return entry['stats']
+    
+    def put(self, params, stats):
+        """Store the statistics for params."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(self.key(params))
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'params': params, 'stats': stats, 'created': time.time()}, f)
+        os.replace(temp_path, path)
+    
+    def entries(self):
+        """Return (path, size in bytes, last access time) of every entry, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                info = os.stat(os.path.join(self.directory, name))
+                entries.append((os.path.join(self.directory, name), info.st_size, info.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+    
+    def evict(self, max_bytes=None, max_age=None, now=None):
+        """
+        Remove entries older than max_age, then the oldest until at most max_bytes remain.
+        
+        Args:
+            max_bytes: Size limit for all entries together (default: no limit)
+            max_age: Maximum seconds since an entry was last used (default: no limit)
+            now: Current time (default: time.time())
+        
+        Returns:
+            (removed entries, freed bytes)
+        """
+        if now is None:
+            now = time.time()
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = freed = 0
+        for path, size, used in entries:
+            if not ((max_age is not None and now - used > max_age)
+                    or (max_bytes is not None and total > max_bytes)):
+                continue
+            os.remove(path)
+            total -= size
+            removed += 1
+            freed += size
+        return removed, freed
+
+
+def run_point(point, engine='scalar', seed=0, workers=1):
+    """
+    Run one grid point and summarize its executions.
+    
+    Executions are seeded per execution from the seed and the point's
+    parameters (see parallel.derive_seed), so a point's results do not depend
+    on the other points, their order or the number of workers.
+    
+    Args:
+        point: Point dictionary from grid_points()
+        engine: 'scalar', 'numpy' or 'analytic'
+        seed: Base seed of the sweep
+        workers: Worker processes for the scalar engine
+    
+    Returns:
+        JSON-serializable statistics dictionary (see summarize())
+    """
+    distribution = point_distribution(point)
+    low, high = point['min_msg_len'], point['max_msg_len']
+    if distribution is not None:
+        low, high = distribution.low, distribution.high
+    stream = f"sweep:{json.dumps(point, sort_keys=True)}"
+    
+    if engine == 'analytic':
+        from analytic import waste_distribution, distribution_statistics
+        waste, messages = waste_distribution(point['n'], point['d'], point['active'], low, high,
+                                             distribution=distribution, policy=point['policy'], m=point['m'])
+        return distribution_statistics(point['n'], waste, messages)
+    
+    if engine == 'numpy':
+        import vectorized
+        from parallel import derive_seed
+        results = vectorized.iter_executions(point['active'], point['executions'], point['n'], point['d'],
+                                             low, high, seed=derive_seed(seed, 0, stream), policy=point['policy'],
+                                             m=point['m'], distribution=distribution)
+    else:
+        rng_factory = random.Random
+        if distribution is not None:
+            from workload import Workload
+            rng_factory = functools.partial(Workload, distribution, block_size=4096)
+        results = iter_parallel_executions(run_scenario, point['executions'], point['n'], point['d'], low, high,
+                                           seed=seed, workers=workers, stream=stream, rng_factory=rng_factory,
+                                           active=point['active'], m=point['m'], policy=point['policy'],
+                                           audit='off')
+    
+    accumulator = ScenarioStatistics()
+    for result in results:
+        accumulator.add(result)
+    return summarize(accumulator.summary())
+
+
+def summarize(stats):
+    """Make a ScenarioStatistics summary JSON-serializable (histogram counts, string quantile keys)."""
+    stats = dict(stats)
+    stats['histogram'] = stats['histogram'].counts
+    stats['waste_pct_quantiles'] = {f"{q:g}": value for q, value in stats['waste_pct_quantiles'].items()}
+    if stats['ci_waste_pct'] == float('inf'):
+        stats['ci_waste_pct'] = None
+    return stats
+
+
+def run_sweep(points, engine='scalar', seed=0, workers=1, cache=None, on_point=None):
+    """
+    Run every point, reusing cached results and caching new ones as they finish.
+    
+    Args:
+        points: Point dictionaries from grid_points()
+        engine: Engine name (see run_point)
+        seed: Base seed of the sweep
+        workers: Worker processes for the scalar engine
+        cache: ResultCache, or None to always recompute
+        on_point: Optional callback(index, point, stats, cached) after each point
+    
+    Returns:
+        List of (point, stats, cached) in point order
+    """
+    rows = []
+    for index, point in enumerate(points):
+        params = cache_params(point, engine, seed)
+        stats = cache.get(params) if cache is not None else None
+        cached = stats is not None
+        if not cached:
+            stats = run_point(point, engine, seed, workers)
+            if cache is not None:
+                cache.put(params, stats)
+        rows.append((point, stats, cached))
+        if on_point is not None:
+            on_point(index, point, stats, cached)
+    return rows
+
+
+def print_row(index, total, point, stats, cached):
+    """Print one finished point with its headline waste and message statistics."""
+    distribution = point['distribution'] or 'uniform'
+    print(f"[{index + 1:>{len(str(total))}}/{total}] n={point['n']:<10} d={point['d']:<4} "
+          f"len={point['min_msg_len']}-{point['max_msg_len']:<5} {scenario_name(point['active'], point['m']):<5} "
+          f"{point['policy']:<8} {distribution:<12} {stats['avg_waste_pct']:>7.2f}% "
+          f"±{stats['std_waste_pct']:>5.2f}  msgs {stats['avg_messages']:>9.1f}"
+          f"{'  (cached)' if cached else ''}", flush=True)
+
+
+def write_csv(path, rows, engine):
+    """Write one line per point with its parameters and headline statistics."""
+    fields = ['avg_waste_pct', 'std_waste_pct', 'ci_waste_pct', 'avg_wasted', 'std_wasted',
+              'min_wasted', 'max_wasted', 'avg_messages', 'avg_used', 'executions']
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['engine', 'scenario'] + list(GRID_PARAMETERS) + fields)
+        for point, stats, _ in rows:
+            writer.writerow([engine, scenario_name(point['active'], point['m'])]
+                            + [point[key] for key in GRID_PARAMETERS] + [stats.get(field) for field in fields])
+
+
+def main(argv=None):
+    """Run the sweep subcommand (python main.py sweep ...) on the given arguments."""
+    parser = argparse.ArgumentParser(
+        prog='main.py sweep',
+        description='Run a parameter grid with per-point results cached on disk'
+    )
+    parser.add_argument('grid', nargs='*', metavar='KEY=VALUES',
+                        help=f"Grid values, e.g. n=1000,10000 d=5:20:5 active=1,2 "
+                             f"(keys: {', '.join(GRID_PARAMETERS)})")
+    parser.add_argument('--grid-file', default=None,
+                        help='JSON object mapping grid keys to lists of values')
+    parser.add_argument('--engine', choices=['scalar', 'numpy', 'analytic'], default='scalar',
+                        help='Simulation engine (default: scalar)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Base seed; every execution seed is derived from it (default: 0)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for the scalar engine (default: 1)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help=f'Result cache directory (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Recompute every point and leave the cache untouched')
+    parser.add_argument('--max-cache-mb', type=float, default=None,
+                        help='After the sweep, evict least recently used entries beyond this size')
+    parser.add_argument('--max-age-days', type=float, default=None,
+                        help='After the sweep, evict entries unused for this many days')
+    parser.add_argument('--evict-only', action='store_true',
+                        help='Only apply the eviction limits, without running a sweep')
+    parser.add_argument('--csv', default=None,
+                        help='Write the results to a CSV file')
+    args = parser.parse_intermixed_args(argv)
+    
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    cache = None if args.no_cache else ResultCache(args.cache_dir)
+    
+    rows = []
+    if not args.evict_only:
+        try:
+            grid = parse_grid(args.grid, args.grid_file)
+            points, skipped = grid_points(grid, args.engine)
+            for point in points:
+                point_distribution(point)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        if not points:
+            parser.error("the grid has no valid points")
+        
+        print(f"Sweeping {len(points)} points with the {args.engine} engine (seed {args.seed})"
+              + (f", {skipped} invalid combinations skipped" if skipped else ""))
+        start = time.perf_counter()
+        
+        def on_point(index, point, stats, cached):
+            rows.append((point, stats, cached))
+            print_row(index, len(points), point, stats, cached)
+        
+        try:
+            run_sweep(points, args.engine, args.seed, args.workers, cache, on_point)
+        except KeyboardInterrupt:
+            print(f"\nInterrupted after {len(rows)}/{len(points)} points; "
+                  "rerun the same command to resume from the cache")
+            sys.exit(130)
+        cached = sum(1 for _, _, hit in rows if hit)
+        print(f"Done: {len(rows) - cached} computed, {cached} from cache, "
+              f"{time.perf_counter() - start:.2f}s")
+        
+        if args.csv is not None:
+            write_csv(args.csv, rows, args.engine)
+            print(f"Results written to {args.csv}")
+    
+    if cache is not None and (args.max_cache_mb is not None or args.max_age_days is not None):
+        max_bytes = None if args.max_cache_mb is None else args.max_cache_mb * 2**20
+        max_age = None if args.max_age_days is None else args.max_age_days * 86400
+        removed, freed = cache.evict(max_bytes, max_age)
+        print(f"Evicted {removed} cache entries ({freed / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()
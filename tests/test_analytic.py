@@ -0,0 +1,48 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+import analytic
+import simulator
+from workload import Workload, make_distribution
+
+
+N, D, EXECUTIONS, MAX_LENGTH = 200, 5, 3000, 20
+
+
+def _moments(waste):
+    """Mean and variance of a {wasted pads: probability} distribution."""
+    mean = sum(w * p for w, p in waste.items())
+    return mean, sum((w - mean) ** 2 * p for w, p in waste.items())
+
+
+@pytest.mark.parametrize('policy', simulator.REJECTION_POLICIES)
+@pytest.mark.parametrize('active', [1, 2])
+def test_exact_distribution_matches_monte_carlo(active, policy):
+    """Simulated mean waste and messages fall within a 99.99% confidence interval of the exact values."""
+    waste, expected_messages = analytic.waste_distribution(N, D, active, 1, MAX_LENGTH, policy=policy)
+    assert math.isclose(sum(waste.values()), 1.0)
+    mean, variance = _moments(waste)
+    
+    results = list(simulator.iter_executions(simulator.run_scenario, EXECUTIONS, N, D, 1, MAX_LENGTH,
+                                             rng=random.Random(5), active=active, policy=policy, audit='off'))
+    simulated = np.array([r['wasted_pads'] for r in results], dtype=float)
+    assert abs(simulated.mean() - mean) <= 4 * math.sqrt(variance / EXECUTIONS) + 1e-9
+    assert set(simulated.astype(int)) <= {w for w, p in waste.items() if p > 0}
+    
+    messages = np.array([r['messages_sent'] for r in results], dtype=float)
+    assert abs(messages.mean() - expected_messages) <= 4 * messages.std(ddof=1) / math.sqrt(EXECUTIONS) + 1e-9
+
+
+def test_exact_distribution_matches_monte_carlo_for_other_lengths():
+    """The exact engine follows a non-uniform length distribution and uneven zones."""
+    workload = Workload(make_distribution('geometric:0.2', 1, MAX_LENGTH), 9)
+    waste, _ = analytic.waste_distribution(N, D, 2, 1, MAX_LENGTH, distribution=workload.distribution,
+                                           m=6, zone_sizes=[50, 70, 80])
+    mean, variance = _moments(waste)
+    results = simulator.iter_executions(simulator.run_scenario, EXECUTIONS, N, D, 1, MAX_LENGTH, rng=workload,
+                                        active=2, m=6, zone_sizes=[50, 70, 80], audit='off')
+    simulated = np.array([r['wasted_pads'] for r in results], dtype=float)
+    assert abs(simulated.mean() - mean) <= 4 * math.sqrt(variance / EXECUTIONS)
@@ -0,0 +1,48 @@
+from journal import LOG_HEADER, MAGIC, Journal
+from protocol import Protocol
+
+
+def _positions(protocol):
+    """Return every party's current_index."""
+    return [party.current_index for party in protocol.party_list]
+
+
+def test_recover_replays_logged_sends(tmp_path):
+    """A recovered protocol has the positions and message count of the journaled one."""
+    journal = Journal(str(tmp_path), durability='sync', capacity=64)
+    protocol = Protocol(n=1000, d=5, journal=journal)
+    for i in range(150):
+        protocol.attempt_send(i % 4, 1 + i % 3)
+    expected = protocol.get_state()
+    journal.close()
+    
+    recovered = Journal(str(tmp_path)).recover()
+    state = recovered.get_state()
+    assert state['parties'] == expected['parties']
+    assert state['messages_sent'] == expected['messages_sent']
+    recovered.journal.close()
+
+
+def test_recover_twice_after_crash_before_header_update(tmp_path):
+    """Sends made after recovering from a half-finished snapshot survive the next recovery."""
+    journal = Journal(str(tmp_path), durability='sync')
+    protocol = Protocol(n=1000, d=5, journal=journal)
+    for _ in range(50):
+        protocol.attempt_send(0, 1)
+    # Crash after the snapshot rename, before the log header reaches the new generation
+    generation = journal.generation
+    journal.snapshot()
+    LOG_HEADER.pack_into(journal._map, 0, MAGIC, generation, journal.capacity)
+    journal.close()
+    
+    protocol = Journal(str(tmp_path), durability='sync').recover()
+    assert protocol.alice.current_index == 50
+    for _ in range(100):
+        assert protocol.attempt_send(0, 1)
+    expected = _positions(protocol)
+    protocol.journal.close()
+    
+    protocol = Journal(str(tmp_path), durability='sync').recover()
+    assert _positions(protocol) == expected
+    assert protocol.alice.current_index == 150
+    protocol.journal.close()
@@ -0,0 +1,40 @@
+import random
+
+import pytest
+
+from ledger import BitmapLedger, IntervalLedger
+
+
+@pytest.mark.parametrize('ledger_class', [IntervalLedger, BitmapLedger])
+def test_ledger_matches_set_of_used_pads(ledger_class):
+    """Random runs are accepted or rejected exactly as a set of used pads would, reporting the lowest reused pad."""
+    rng = random.Random(7)
+    for _ in range(500):
+        n = rng.randint(1, 90)
+        ledger = ledger_class(n)
+        used = set()
+        for _ in range(12):
+            start = rng.randrange(n)
+            stop = rng.randint(start, n)
+            reused = sorted(used.intersection(range(start, stop)))
+            if reused:
+                with pytest.raises(AssertionError, match=f'COLLISION: Pad {reused[0]} '):
+                    ledger.mark(start, stop)
+            else:
+                ledger.mark(start, stop)
+                used.update(range(start, stop))
+        assert ledger.used == len(used)
+        assert [pad for pad in range(n) if ledger.is_used(pad)] == sorted(used)
+        assert sum(stop - start for start, stop in ledger.intervals()) == len(used)
+
+
+def test_bitmap_ledger_marks_whole_bytes():
+    """Runs spanning several bytes set every bit in between, and a reuse inside them is found."""
+    ledger = BitmapLedger(64)
+    ledger.mark(3, 61)
+    assert ledger.intervals() == [(3, 61)]
+    with pytest.raises(AssertionError, match='COLLISION: Pad 32 '):
+        ledger.mark(32, 33)
+    ledger.mark(61, 64)
+    ledger.mark(0, 3)
+    assert ledger.intervals() == [(0, 64)]
@@ -0,0 +1,19 @@
+from parallel import derive_seed, run_parallel_executions
+from simulator import run_scenario
+
+
+def test_results_do_not_depend_on_worker_count():
+    """Per-execution seeds make the results identical for any number of workers and chunk size."""
+    kwargs = dict(active=2, m=6, policy='drop', audit='off')
+    serial = run_parallel_executions(run_scenario, 60, 500, 5, 1, 30, seed=4, workers=1, **kwargs)
+    assert run_parallel_executions(run_scenario, 60, 500, 5, 1, 30, seed=4, workers=3, chunk_size=7,
+                                   **kwargs) == serial
+    assert run_parallel_executions(run_scenario, 60, 500, 5, 1, 30, seed=4, workers=2, **kwargs) == serial
+    assert run_parallel_executions(run_scenario, 60, 500, 5, 1, 30, seed=5, workers=1, **kwargs) != serial
+
+
+def test_derived_seeds_are_distinct():
+    """Executions and streams get different seeds, and the same ones on every call."""
+    seeds = {derive_seed(0, i, stream) for i in range(1000) for stream in ('a', 'b')}
+    assert len(seeds) == 2000
+    assert derive_seed(3, 7, 'x') == derive_seed(3, 7, 'x')
@@ -0,0 +1,58 @@
+import random
+
+import numpy as np
+import pytest
+
+from ledger import AUDIT_LEVELS
+from protocol import Protocol
+
+
+def _state(protocol):
+    """Return the protocol's positions, counters and capacities."""
+    return protocol.get_state(), list(protocol.capacity)
+
+
+@pytest.mark.parametrize('as_array', [False, True])
+def test_attempt_send_batch_matches_attempt_send_loop(as_array):
+    """A batch accepts the same prefix, with the same ranges, as sending its lengths one by one."""
+    rng = random.Random(1)
+    for _ in range(300):
+        n, d, m = rng.randint(40, 400), rng.randint(0, 8), rng.choice([2, 4, 6])
+        batched = Protocol(n=n, d=d, m=m)
+        looped = Protocol(n=n, d=d, m=m)
+        for _ in range(rng.randint(1, 8)):
+            party = rng.randrange(m)
+            lengths = [rng.randint(-1, 30) for _ in range(rng.randint(0, 12))]
+            
+            expected = []
+            for length in lengths:
+                origin = looped.party_list[party].current_index
+                if not looped.attempt_send(party, length):
+                    break
+                position = looped.party_list[party].current_index
+                expected.append((origin, position) if position > origin else (position + 1, origin + 1))
+            
+            accepted, ranges = batched.attempt_send_batch(party, np.array(lengths) if as_array else lengths)
+            assert accepted == len(expected)
+            assert ranges == expected
+            assert _state(batched) == _state(looped)
+
+
+def test_attempt_send_batch_accepts_names():
+    """Parties may be given by name, as with attempt_send."""
+    protocol = Protocol(n=100, d=2)
+    assert protocol.attempt_send_batch('Bob', [3, 4]) == (2, [(47, 50), (43, 47)])
+    assert protocol.bob.current_index == 42
+
+
+@pytest.mark.parametrize('audit', list(AUDIT_LEVELS))
+def test_every_audit_level_detects_reuse(audit):
+    """A send that overlaps the partner's pads raises the collision error at every audit level."""
+    protocol = Protocol(n=100, d=0, audit=audit)
+    assert protocol.attempt_send('Alice', 10)
+    # Corrupt Bob's position so his next run lands on pads Alice already used
+    protocol.bob.current_index = 5
+    protocol.bob.has_sent = True
+    protocol.capacity[1] = 5
+    with pytest.raises(AssertionError, match='COLLISION'):
+        protocol.attempt_send('Bob', 3)
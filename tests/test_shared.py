@@ -0,0 +1,21 @@
+import pytest
+
+from ledger import AUDIT_LEVELS
+from shared import run_shared
+
+
+@pytest.mark.parametrize('audit', list(AUDIT_LEVELS))
+def test_concurrent_parties_never_reuse_pads(audit):
+    """Parties racing in small zones block each other without any pad being used twice."""
+    result = run_shared(2000, 3, m=4, messages=3000, max_msg_length=20, audit=audit, seed=1)
+    assert result['processes'] == 4
+    # Every party sends until it is blocked, so each zone is left with less than a gap and a message
+    assert 2000 - 2 * (3 + 1 + 20) <= result['used_pads'] <= 2000
+    assert result['messages_sent'] < result['messages_attempted']
+
+
+def test_concurrent_parties_under_load():
+    """Eight processes with the full audit send their whole workload when zones are large."""
+    result = run_shared(10**6, 10, m=8, messages=2000, audit='full', seed=2)
+    assert result['messages_sent'] == result['messages_attempted'] == 8 * 2000
+    assert result['used_pads'] <= 10**6
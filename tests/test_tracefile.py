@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+import simulator
+import tracefile
+
+
+FIELDS = ('scenario', 'total_pads', 'used_pads', 'wasted_pads', 'messages_sent', 'messages_attempted', 'rebalances')
+
+
+def _record(path, executions, **kwargs):
+    """Record scalar executions of every scenario into a trace and return their results."""
+    results = []
+    rng = random.Random(11)
+    with tracefile.TraceWriter(path) as writer:
+        for active in (1, 2, 4):
+            results.extend(simulator.run_scenario(300, 4, active, min_msg_length=1, max_msg_length=25, rng=rng,
+                                                  recorder=writer, **kwargs)
+                           for _ in range(executions))
+    return results
+
+
+@pytest.mark.parametrize('audit', [None, 'interval', 'full'])
+@pytest.mark.parametrize('kwargs', [{}, {'policy': 'drop', 'rebalance': True}, {'policy': 'truncate'}])
+def test_record_replay_round_trip(tmp_path, kwargs, audit):
+    """Replaying a trace, through arrays or Protocol, reproduces every recorded execution."""
+    path = str(tmp_path / 'run.trace')
+    recorded = _record(path, 40, **kwargs)
+    replayed = list(tracefile.replay(path, audit))
+    assert len(replayed) == len(recorded)
+    for expected, result in zip(recorded, replayed):
+        assert {f: result.get(f) for f in FIELDS} == {f: expected.get(f) for f in FIELDS}
+
+
+def test_replay_spans_several_chunks(tmp_path, monkeypatch):
+    """Executions grouped across REPLAY_CHUNK boundaries replay the same way."""
+    path = str(tmp_path / 'run.trace')
+    recorded = _record(path, 20)
+    monkeypatch.setattr(tracefile, 'REPLAY_CHUNK', 37)
+    replayed = list(tracefile.replay(path))
+    assert [r['used_pads'] for r in replayed] == [r['used_pads'] for r in recorded]
+
+
+def test_replay_rejects_altered_outcomes(tmp_path):
+    """A trace whose recorded outcomes disagree with the gap rule fails verification."""
+    path = str(tmp_path / 'run.trace')
+    _record(path, 5)
+    header, records = tracefile.open_trace(path)
+    data = records.copy()
+    del records
+    # Mark the first rejected attempt as accepted
+    flipped = next(i for i, party in enumerate(data['party'])
+                   if party < tracefile.REBALANCE and not party & tracefile.ACCEPTED)
+    data['party'][flipped] |= tracefile.ACCEPTED
+    with open(path, 'r+b') as f:
+        f.seek(header.size)
+        f.write(data.tobytes())
+    with pytest.raises(ValueError, match='accepted'):
+        list(tracefile.replay(path))
@@ -0,0 +1,40 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+import simulator
+import vectorized
+
+
+N, D, EXECUTIONS, MAX_LENGTH = 200, 5, 3000, 20
+
+
+@pytest.mark.parametrize('policy', simulator.REJECTION_POLICIES)
+@pytest.mark.parametrize('active', [1, 2, 4])
+def test_vectorized_agrees_with_scalar(active, policy):
+    """Mean waste and message counts of the two engines agree within a 99.99% confidence interval."""
+    scalar = list(simulator.iter_executions(simulator.run_scenario, EXECUTIONS, N, D, 1, MAX_LENGTH,
+                                            rng=random.Random(3), active=active, policy=policy, audit='off'))
+    batched = list(vectorized.iter_executions(active, EXECUTIONS, N, D, 1, MAX_LENGTH, seed=3, policy=policy))
+    assert {r['scenario'] for r in scalar} == {r['scenario'] for r in batched}
+    for field in ('wasted_pads', 'messages_sent', 'messages_attempted'):
+        a = np.array([r[field] for r in scalar], dtype=float)
+        b = np.array([r[field] for r in batched], dtype=float)
+        standard_error = math.sqrt(a.var(ddof=1) / len(a) + b.var(ddof=1) / len(b))
+        assert abs(a.mean() - b.mean()) <= 4 * standard_error + 1e-9, field
+
+
+def test_vectorized_never_reuses_pads():
+    """Every execution uses at most n pads and wastes what it does not use."""
+    for result in vectorized.iter_executions(4, 500, 120, 3, 1, 30, seed=1, policy='truncate', m=6):
+        assert 0 <= result['used_pads'] <= 120
+        assert result['used_pads'] + result['wasted_pads'] == 120
+
+
+@pytest.mark.parametrize('lengths', [(0, 5), (6, 5)])
+def test_vectorized_rejects_invalid_length_range(lengths):
+    """Length ranges outside 1 <= min <= max raise instead of looping forever."""
+    with pytest.raises(ValueError):
+        vectorized.run_multiple_executions(1, 10, 100, 5, *lengths)
@@ -0,0 +1,284 @@
+import numpy as np
+
+from protocol import party_names, zone_bounds
+from simulator import REJECTION_POLICIES, scenario_name
+
+
+def party_layout(n, m=4, zone_sizes=None):
+    """
+    Build the static party layout used by Protocol as parallel arrays.
+    
+    Args:
+        n: Total number of pads
+        m: Number of parties (even)
+        zone_sizes: Optional list of m/2 zone sizes summing to n
+    
+    Returns:
+        Dictionary of arrays indexed by party id (same ids as Protocol.party_list)
+    """
+    bounds = np.array(zone_bounds(n, m // 2, zone_sizes), dtype=np.int64)
+    zone_min = np.repeat(bounds[:, 0], 2)
+    zone_max = np.repeat(bounds[:, 1], 2)
+    direction = np.tile(np.array([+1, -1], dtype=np.int64), m // 2)
+    return {
+        'start': np.where(direction > 0, zone_min, zone_max - 1),
+        'direction': direction,
+        'zone_min': zone_min,
+        'zone_max': zone_max,
+        'partner': np.arange(m) ^ 1,
+    }
+
+
+def capacities(layout, current, has_sent, d):
+    """
+    Compute the largest message length every party could send right now.
+    
+    This is the array form of Party.can_send: a party can send a message of
+    length L exactly when L <= its capacity.
+    
+    Args:
+        layout: Party layout from party_layout()
+        current: (executions, parties) array of current pad indices
+        has_sent: (executions, parties) boolean array
+        d: Gap parameter
+    
+    Returns:
+        (executions, parties) array of capacities (0 if the party is blocked)
+    """
+    partner = layout['partner']
+    direction = layout['direction']
+    
+    # Last index used by each party's partner (start index if partner hasn't sent)
+    partner_current = current[:, partner]
+    partner_last = np.where(has_sent[:, partner],
+                            partner_current - direction[partner],
+                            layout['start'][partner])
+    
+    # Rightward: next_end < min(zone_max, partner_last - d)
+    right_cap = np.minimum(layout['zone_max'] - 1, partner_last - d - 1) - current + 1
+    # Leftward: next_start > max(zone_min - 1, partner_last + d)
+    left_cap = current - np.maximum(layout['zone_min'], partner_last + d + 1) + 1
+    
+    return np.maximum(np.where(direction > 0, right_cap, left_cap), 0)
+
+
+def sender_capacities(layout, current, has_sent, d, rows, sender):
+    """
+    Compute the capacity of one chosen party per execution.
+    
+    Same as capacities(layout, current, has_sent, d)[rows, sender], but only
+    touches the sender and its partner.
+    
+    Args:
+        layout: Party layout from party_layout()
+        current: (executions, parties) array of current pad indices
+        has_sent: (executions, parties) boolean array
+        d: Gap parameter
+        rows: Execution rows to evaluate
+        sender: Party id per row
+    
+    Returns:
+        Array of capacities, one per row
+    """
+    partner = layout['partner'][sender]
+    direction = layout['direction'][sender]
+    position = current[rows, sender]
+    
+    partner_last = np.where(has_sent[rows, partner],
+                            current[rows, partner] - layout['direction'][partner],
+                            layout['start'][partner])
+    
+    right_cap = np.minimum(layout['zone_max'][sender] - 1, partner_last - d - 1) - position + 1
+    left_cap = position - np.maximum(layout['zone_min'][sender], partner_last + d + 1) + 1
+    
+    return np.maximum(np.where(direction > 0, right_cap, left_cap), 0)
+
+
+def _choose_active(rng, size, num_active, num_parties):
+    """Pick num_active distinct parties per execution, in random order."""
+    if num_active == num_parties:
+        # Matches simulator: all parties active, in fixed order
+        return np.tile(np.arange(num_parties), (size, 1))
+    if num_active == 1:
+        return rng.integers(0, num_parties, size=(size, 1))
+    return np.argsort(rng.random((size, num_parties)), axis=1)[:, :num_active]
+
+
+def _run_batch(rng, layout, num_active, size, d, min_msg_length, max_msg_length, policy, distribution=None):
+    """
+    Simulate one batch of executions of a scenario in lockstep.
+    
+    Follows simulator.send_until_exhausted: each step picks a random sender
+    among the parties still active in each execution, drops it if its capacity
+    is below min_msg_length, and otherwise applies the rejection policy.
+    Lengths are uniform on [min_msg_length, max_msg_length] unless a
+    workload.LengthDistribution is given.
+    
+    Returns:
+        Tuple of (active, used, messages_sent, messages_attempted) arrays
+    """
+    num_parties = len(layout['start'])
+    
+    active = _choose_active(rng, size, num_active, num_parties)
+    
+    used = np.zeros(size, dtype=np.int64)
+    messages_sent = np.zeros(size, dtype=np.int64)
+    messages_attempted = np.zeros(size, dtype=np.int64)
+    
+    # State of the executions still running; `live` maps rows back to executions
+    live = np.arange(size)
+    current = np.tile(layout['start'], (size, 1))
+    has_sent = np.zeros((size, num_parties), dtype=bool)
+    # Which active slots can still send, and the slot to retry (-1 if none)
+    alive = np.ones((size, num_active), dtype=bool)
+    retry_slot = np.full(size, -1)
+    
+    while True:
+        running = alive.any(axis=1)
+        if not running.all():
+            live = live[running]
+            current = current[running]
+            has_sent = has_sent[running]
+            alive = alive[running]
+            retry_slot = retry_slot[running]
+        if not live.size:
+            break
+        
+        rows = np.arange(live.size)
+        
+        # Uniform choice among alive slots, unless a rejected sender is retrying
+        pick = (rng.random(live.size) * alive.sum(axis=1)).astype(np.int64)
+        slot = (alive.cumsum(axis=1) > pick[:, None]).argmax(axis=1)
+        slot = np.where(retry_slot >= 0, retry_slot, slot)
+        sender = active[live, slot]
+        cap = sender_capacities(layout, current, has_sent, d, rows, sender)
+        
+        # Parties that can never send again leave the active set
+        exhausted = cap < min_msg_length
+        alive[rows[exhausted], slot[exhausted]] = False
+        
+        attempt = ~exhausted
+        if distribution is None:
+            msg_length = rng.integers(min_msg_length, max_msg_length + 1, size=live.size)
+        else:
+            msg_length = distribution.sample(rng, live.size)
+        if policy == 'truncate':
+            msg_length = np.minimum(msg_length, cap)
+        messages_attempted[live[attempt]] += 1
+        success = attempt & (msg_length <= cap)
+        rejected = attempt & ~success
+        
+        if policy == 'retry':
+            retry_slot = np.where(rejected, slot, -1)
+        elif policy == 'drop':
+            alive[rows[rejected], slot[rejected]] = False
+        
+        # Advance successful senders
+        ok_rows = rows[success]
+        ok_sender = sender[success]
+        current[ok_rows, ok_sender] += layout['direction'][ok_sender] * msg_length[success]
+        has_sent[ok_rows, ok_sender] = True
+        used[live[success]] += msg_length[success]
+        messages_sent[live[success]] += 1
+    
+    return active, used, messages_sent, messages_attempted
+
+
+def iter_executions(active, num_executions, n, d, min_msg_length=1, max_msg_length=50,
+                    seed=None, batch_size=4096, policy='retry', m=4, zone_sizes=None, distribution=None):
+    """
+    Run a scenario many times as batched NumPy arrays, yielding each result.
+    
+    Same executions as run_multiple_executions; only one batch of results is
+    held in memory at a time.
+    
+    Args:
+        active: Number of active parties (x; 1, 2 and 4 give S.1, S.2 and S.4)
+        num_executions: Number of times to run the scenario
+        n: Total number of pads
+        d: Gap parameter
+        min_msg_length: Minimum message length
+        max_msg_length: Maximum message length
+        seed: Seed for the NumPy generator (default: None)
+        batch_size: Number of executions simulated together
+        policy: Handling of lengths that do not fit ('retry', 'truncate' or 'drop')
+        m: Number of parties (even)
+        zone_sizes: Optional list of m/2 zone sizes summing to n
+        distribution: Optional workload.LengthDistribution on [min_msg_length, max_msg_length]
+            (default: uniform)
+    
+    Yields:
+        Result dictionary of each execution
+    """
+    if not 1 <= active <= m:
+        raise ValueError(f"Number of active parties must be between 1 and {m}, got {active}")
+    if policy not in REJECTION_POLICIES:
+        raise ValueError(f"Unknown rejection policy: {policy}")
+    if not 1 <= min_msg_length <= max_msg_length:
+        # A zero-length send always fits, so a batch would never finish
+        raise ValueError(f"Message lengths must satisfy 1 <= min <= max, got [{min_msg_length}, {max_msg_length}]")
+    if distribution is not None and (distribution.low, distribution.high) != (min_msg_length, max_msg_length):
+        raise ValueError(f"Distribution {distribution} does not match lengths [{min_msg_length}, {max_msg_length}]")
+    
+    rng = np.random.default_rng(seed)
+    layout = party_layout(n, m, zone_sizes)
+    names = party_names(m)
+    scenario = scenario_name(active, m)
+    
+    remaining = num_executions
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        remaining -= size
+        
+        chosen, used, sent, attempted = _run_batch(
+            rng, layout, active, size, d, min_msg_length, max_msg_length, policy, distribution
+        )
+        wasted = n - used
+        
+        for i in range(size):
+            result = {'scenario': scenario}
+            if active == 1:
+                result['active_party'] = names[chosen[i, 0]]
+            else:
+                result['active_parties'] = [names[p] for p in chosen[i]]
+            result.update({
+                'total_pads': n,
+                'used_pads': int(used[i]),
+                'wasted_pads': int(wasted[i]),
+                'waste_percentage': (int(wasted[i]) / n) * 100,
+                'messages_sent': int(sent[i]),
+                'messages_attempted': int(attempted[i])
+            })
+            yield result
+
+
+def run_multiple_executions(active, num_executions, n, d, min_msg_length=1, max_msg_length=50,
+                            seed=None, batch_size=4096, policy='retry', m=4, zone_sizes=None, distribution=None):
+    """
+    Run a scenario many times as batched NumPy arrays.
+    
+    Produces the same result dictionaries as simulator.run_multiple_executions,
+    drawn from the same distributions, but without building a Protocol per
+    execution. Random streams differ from the scalar path, so individual
+    executions do not match one-for-one.
+    
+    Args:
+        active: Number of active parties (x; 1, 2 and 4 give S.1, S.2 and S.4)
+        num_executions: Number of times to run the scenario
+        n: Total number of pads
+        d: Gap parameter
+        min_msg_length: Minimum message length
+        max_msg_length: Maximum message length
+        seed: Seed for the NumPy generator (default: None)
+        batch_size: Number of executions simulated together
+        policy: Handling of lengths that do not fit ('retry', 'truncate' or 'drop')
+        m: Number of parties (even)
+        zone_sizes: Optional list of m/2 zone sizes summing to n
+        distribution: Optional workload.LengthDistribution on [min_msg_length, max_msg_length]
+            (default: uniform)
+    
+    Returns:
+        List of results from each execution
+    """
+    return list(iter_executions(active, num_executions, n, d, min_msg_length, max_msg_length,
+                                seed, batch_size, policy, m, zone_sizes, distribution))
@@ -0,0 +1,226 @@
+import numpy as np
+
+
+class LengthDistribution:
+    """
+    Message-length distribution on the finite support [low, high].
+    
+    Every distribution gives the shortest length `low` a positive probability,
+    so a party whose capacity is at least `low` can always be sent something
+    (the retry policy relies on this).
+    """
+    
+    def __init__(self, name, low, high, weights):
+        """
+        Args:
+            name: Label used in output (e.g. 'zipf:1.2')
+            low: Shortest message length
+            high: Longest message length
+            weights: Non-negative weight of each length low..high (normalized here)
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        if not 1 <= low <= high:
+            raise ValueError(f"Invalid length range [{low}, {high}]")
+        if len(weights) != high - low + 1 or (weights < 0).any() or not weights[0] > 0:
+            raise ValueError(f"Distribution {name} needs {high - low + 1} non-negative weights "
+                             f"with a positive weight on length {low}")
+        self.name = name
+        self.low = low
+        self.high = high
+        self.probabilities = weights / weights.sum()
+    
+    def sample(self, rng, size):
+        """
+        Draw message lengths.
+        
+        Args:
+            rng: numpy.random.Generator
+            size: Number of lengths to draw
+        
+        Returns:
+            int64 array of lengths
+        """
+        return self.low + rng.choice(len(self.probabilities), size=size, p=self.probabilities)
+    
+    def mean(self):
+        """Return the expected message length."""
+        return float(np.dot(np.arange(self.low, self.high + 1), self.probabilities))
+    
+    def __repr__(self):
+        return f"{self.name}[{self.low}, {self.high}]"
+
+
+class UniformDistribution(LengthDistribution):
+    """Every length in [low, high] equally likely (the simulator's default)."""
+    
+    def __init__(self, low, high):
+        super().__init__('uniform', low, high, np.ones(high - low + 1))
+    
+    def sample(self, rng, size):
+        # Same draw as the NumPy engine's built-in uniform lengths
+        return rng.integers(self.low, self.high + 1, size=size)
+
+
+def geometric(low, high, p=0.1):
+    """Length low + k with probability proportional to (1 - p)^k: mostly short messages."""
+    if not 0 < p < 1:
+        raise ValueError(f"Geometric parameter must be between 0 and 1, got {p}")
+    return LengthDistribution(f'geometric:{p:g}', low, high, (1 - p) ** np.arange(high - low + 1))
+
+
+def zipf(low, high, s=1.2):
+    """Length low + k with probability proportional to (k + 1)^-s: heavy-tailed."""
+    if not s > 0:
+        raise ValueError(f"Zipf exponent must be positive, got {s}")
+    return LengthDistribution(f'zipf:{s:g}', low, high, np.arange(1, high - low + 2) ** -s)
+
+
+def bimodal(low, high, weight=0.5):
+    """
+    Short control messages mixed with long bulk messages.
+    
+    With probability `weight` a length is uniform over the shortest tenth of
+    [low, high], otherwise over the longest tenth.
+    """
+    if not 0 < weight <= 1:
+        raise ValueError(f"Bimodal weight must be in (0, 1], got {weight}")
+    size = high - low + 1
+    width = max(1, size // 10)
+    weights = np.zeros(size)
+    weights[:width] += weight / width
+    weights[size - width:] += (1 - weight) / width
+    return LengthDistribution(f'bimodal:{weight:g}', low, high, weights)
+
+
+def empirical(path):
+    """
+    Distribution of message lengths recorded in a text file.
+    
+    Each non-empty line holds a length, optionally followed by a weight
+    (e.g. an observed count); '#' starts a comment. The support runs from
+    the shortest to the longest recorded length.
+    """
+    counts = {}
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            fields = line.split('#', 1)[0].replace(',', ' ').split()
+            if not fields:
+                continue
+            try:
+                length = int(fields[0])
+                weight = float(fields[1]) if len(fields) > 1 else 1.0
+            except ValueError:
+                raise ValueError(f"{path}:{line_number}: expected 'LENGTH [WEIGHT]'")
+            if length < 1 or weight < 0:
+                raise ValueError(f"{path}:{line_number}: lengths must be >= 1 and weights >= 0")
+            counts[length] = counts.get(length, 0.0) + weight
+    
+    lengths = [length for length, weight in counts.items() if weight > 0]
+    if not lengths:
+        raise ValueError(f"{path}: no message lengths with positive weight")
+    low, high = min(lengths), max(lengths)
+    weights = np.zeros(high - low + 1)
+    for length, weight in counts.items():
+        weights[length - low] = weight
+    return LengthDistribution(f'empirical:{path}', low, high, weights)
+
+
+def make_distribution(spec, low, high):
+    """
+    Build a message-length distribution from a textual spec.
+    
+    Supported specs:
+        'uniform'          - every length in [low, high] equally likely
+        'geometric[:P]'    - P(low + k) ~ (1 - P)^k (default P = 0.1)
+        'zipf[:S]'         - P(low + k) ~ (k + 1)^-S (default S = 1.2)
+        'bimodal[:W]'      - shortest tenth with probability W, else longest tenth (default W = 0.5)
+        'empirical:PATH'   - lengths (and optional weights) read from a file; ignores low and high
+    
+    Args:
+        spec: Distribution spec string
+        low: Shortest message length
+        high: Longest message length
+    
+    Returns:
+        LengthDistribution instance
+    """
+    kind, _, param = spec.partition(':')
+    try:
+        if kind == 'uniform' and not param:
+            return UniformDistribution(low, high)
+        if kind == 'empirical' and param:
+            return empirical(param)
+        builders = {'geometric': geometric, 'zipf': zipf, 'bimodal': bimodal}
+        if kind in builders:
+            return builders[kind](low, high, *([float(param)] if param else []))
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Invalid distribution spec: {spec} ({e})")
+    
+    raise ValueError(f"Invalid distribution spec: {spec}")
+
+
+class Workload:
+    """
+    Seeded source of message lengths and random choices, drawn in NumPy blocks.
+    
+    Lengths and uniform variates are pre-drawn `block_size` at a time from a
+    numpy.random.Generator and handed out from plain lists, so each draw in
+    a scenario loop is a list lookup. The object provides the methods of
+    random.Random that the scalar scenarios use (randint, choice, sample and
+    random), so it can be passed as their `rng`.
+    """
+    
+    def __init__(self, distribution, seed=None, block_size=65536):
+        """
+        Args:
+            distribution: LengthDistribution for message lengths
+            seed: Seed for the NumPy generator (default: None)
+            block_size: Number of values drawn per block
+        """
+        self.distribution = distribution
+        self.generator = np.random.default_rng(seed)
+        self.block_size = block_size
+        self._lengths = []
+        self._length_pos = 0
+        self._uniforms = []
+        self._uniform_pos = 0
+    
+    def randint(self, low, high):
+        """
+        Return the next message length.
+        
+        The bounds must match the distribution's support; they are accepted so
+        that a Workload can stand in for random.Random.
+        """
+        if low != self.distribution.low or high != self.distribution.high:
+            raise ValueError(f"Workload draws lengths in [{self.distribution.low}, {self.distribution.high}], "
+                             f"not [{low}, {high}]")
+        pos = self._length_pos
+        if pos == len(self._lengths):
+            self._lengths = self.distribution.sample(self.generator, self.block_size).tolist()
+            pos = 0
+        self._length_pos = pos + 1
+        return self._lengths[pos]
+    
+    def random(self):
+        """Return the next uniform variate in [0, 1)."""
+        pos = self._uniform_pos
+        if pos == len(self._uniforms):
+            self._uniforms = self.generator.random(self.block_size).tolist()
+            pos = 0
+        self._uniform_pos = pos + 1
+        return self._uniforms[pos]
+    
+    def choice(self, seq):
+        """Return a uniformly chosen element of a non-empty sequence (e.g. the next sender)."""
+        return seq[int(self.random() * len(seq))]
+    
+    def sample(self, seq, k):
+        """Return k distinct elements of seq in random order."""
+        pool = list(seq)
+        if not 0 <= k <= len(pool):
+            raise ValueError("Sample larger than population or is negative")
+        for i in range(k):
+            j = i + int(self.random() * (len(pool) - i))
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:k]